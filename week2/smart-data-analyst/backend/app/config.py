@@ -25,9 +25,82 @@ class Settings:
     SESSION_DB_PATH: str = os.getenv(
         "SESSION_DB_PATH", str(BASE_DIR / "app" / "database" / "session.db")
     )
+    # 会话数据库连接池
+    SESSION_DB_POOL_SIZE: int = int(os.getenv("SESSION_DB_POOL_SIZE", "5"))
+    SESSION_DB_MAX_OVERFLOW: int = int(os.getenv("SESSION_DB_MAX_OVERFLOW", "10"))
+
+    # CSV 导入: 每批 executemany 的行数
+    CSV_IMPORT_BATCH_SIZE: int = int(os.getenv("CSV_IMPORT_BATCH_SIZE", "5000"))
+    # 后台导入: 进程池大小与 SSE 进度推送间隔（秒）
+    # SQLite 同一时间只允许一个写事务，多个导入并行没有吞吐收益，默认逐个执行
+    IMPORT_WORKERS: int = int(os.getenv("IMPORT_WORKERS", "1"))
+    # 导入等待其他写事务（另一个导入）结束的最长时间（秒），超时才报 database is locked
+    IMPORT_LOCK_TIMEOUT: float = float(os.getenv("IMPORT_LOCK_TIMEOUT", "600"))
+    IMPORT_PROGRESS_INTERVAL: float = float(os.getenv("IMPORT_PROGRESS_INTERVAL", "0.5"))
+
+    # 业务库读连接等待写锁的超时（秒）。业务库使用 WAL，读一般不会被导入阻塞，
+    # 只有检查点等短暂的排他操作期间需要等待
+    BUSINESS_DB_BUSY_TIMEOUT: float = float(os.getenv("BUSINESS_DB_BUSY_TIMEOUT", "5"))
+
+    # 表目录快速统计: 导入后 ANALYZE，行数先返回 sqlite_stat1 估算值再后台精确计数
+    CATALOG_FAST_STATS: bool = os.getenv("CATALOG_FAST_STATS", "false").lower() == "true"
+
+    # Agent SQL 查询结果缓存: 最大条目数 / 过期时间（秒）
+    QUERY_CACHE_SIZE: int = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+    QUERY_CACHE_TTL: float = float(os.getenv("QUERY_CACHE_TTL", "600"))
+
+    # 问答回放缓存: 开关 / 最大条目数 / 过期时间（秒）
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "128"))
+    ANSWER_CACHE_TTL: float = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+    # 查询结果句柄: SSE 只推送首页，其余分页按需拉取
+    RESULT_STORE_SIZE: int = int(os.getenv("RESULT_STORE_SIZE", "64"))
+    RESULT_STORE_TTL: float = float(os.getenv("RESULT_STORE_TTL", "1800"))
+    RESULT_FIRST_PAGE_ROWS: int = int(os.getenv("RESULT_FIRST_PAGE_ROWS", "100"))
+
+    # 系统提示词中嵌入表结构摘要（关闭时 Agent 先调用 list_tables / schema 工具）
+    SCHEMA_DIGEST_ENABLED: bool = os.getenv("SCHEMA_DIGEST_ENABLED", "true").lower() == "true"
+    SCHEMA_DIGEST_SAMPLE_VALUES: int = int(os.getenv("SCHEMA_DIGEST_SAMPLE_VALUES", "3"))
+    # 表数量超过该值时，每个问题只嵌入 BM25 检索出的 top-k 张相关表
+    SCHEMA_RETRIEVAL_TOP_K: int = int(os.getenv("SCHEMA_RETRIEVAL_TOP_K", "8"))
+
+    # Agent SQL 沙箱: 单条查询超时（秒，0 = 不限）/ 最多读取的行数
+    SQL_QUERY_TIMEOUT: float = float(os.getenv("SQL_QUERY_TIMEOUT", "10"))
+    SQL_MAX_ROWS: int = int(os.getenv("SQL_MAX_ROWS", "10000"))
+    # Agent SQL 执行后端: inprocess = API 进程内执行；process = 工作进程池执行
+    # （每个进程保持只读连接，地址空间上限 SQL_WORKER_MEMORY_MB，0 = 不限）
+    SQL_EXECUTION_BACKEND: str = os.getenv("SQL_EXECUTION_BACKEND", "inprocess")
+    SQL_WORKERS: int = int(os.getenv("SQL_WORKERS", "2"))
+    SQL_WORKER_MEMORY_MB: int = int(os.getenv("SQL_WORKER_MEMORY_MB", "1024"))
+
+    # sql_db_query_checker 使用本地 EXPLAIN 校验（关闭时沿用 SQLDatabaseToolkit 的 LLM 校验）
+    SQL_CHECKER_LOCAL: bool = os.getenv("SQL_CHECKER_LOCAL", "true").lower() == "true"
+
+    # 对话写入: 开启后由后台任务批量提交（group commit），SSE 结束时不等待落库
+    TURN_WRITE_BEHIND: bool = os.getenv("TURN_WRITE_BEHIND", "false").lower() == "true"
+    TURN_WRITE_BATCH_SIZE: int = int(os.getenv("TURN_WRITE_BATCH_SIZE", "64"))
+    TURN_WRITE_MAX_DELAY: float = float(os.getenv("TURN_WRITE_MAX_DELAY", "0.05"))
+    TURN_WRITE_QUEUE_SIZE: int = int(os.getenv("TURN_WRITE_QUEUE_SIZE", "10000"))
+
+    # LLM 调用并发治理: 并发上限 / 等待队列长度 / 排队超时（秒）/ 每分钟 token 上限（0 = 不限）
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    LLM_QUEUE_SIZE: int = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+
+    # 批量问答: 单次最多问题数 / 同时执行的问题数
+    CHAT_BATCH_MAX_QUESTIONS: int = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "50"))
+    CHAT_BATCH_CONCURRENCY: int = int(os.getenv("CHAT_BATCH_CONCURRENCY", "4"))
 
     # 上下文记忆窗口大小
     MEMORY_WINDOW_SIZE: int = int(os.getenv("MEMORY_WINDOW_SIZE", "10"))
+    # 记忆模式: window = 按轮数裁剪；token = 按 token 预算保留最近对话，更早的折叠为滚动摘要
+    MEMORY_MODE: str = os.getenv("MEMORY_MODE", "window")
+    MEMORY_TOKEN_BUDGET: int = int(os.getenv("MEMORY_TOKEN_BUDGET", "2000"))
+    MEMORY_SUMMARY_MAX_TOKENS: int = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "300"))
+    # 缓存最近活跃会话的记忆窗口（LangChain 消息列表）的会话数
+    MEMORY_CACHE_SIZE: int = int(os.getenv("MEMORY_CACHE_SIZE", "256"))
 
     # CORS
     CORS_ORIGINS: list[str] = [
@@ -8,15 +8,27 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.models.database import init_all_databases
-from app.routers import chat, session, data
+from app.models.database import init_all_databases, close_all_databases
+from app.routers import chat, session, data, result
+from app.services import (
+    answer_cache, catalog_service, job_service, llm_governor, memory_service, query_cache,
+    query_pool, result_store, sql_agent, sql_checker, table_index, turn_writer,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """应用生命周期: 启动时初始化数据库"""
-    init_all_databases()
+    """应用生命周期: 启动时初始化数据库，关闭时释放连接池"""
+    await init_all_databases()
+    await turn_writer.start()
+    query_pool.start()
     yield
+    # 先写完排队中的对话，再释放连接池
+    await turn_writer.stop()
+    job_service.shutdown()
+    query_pool.shutdown()
+    catalog_service.close()
+    await close_all_databases()
 
 
 app = FastAPI(
@@ -39,6 +51,7 @@ app.add_middleware(
 app.include_router(session.router)
 app.include_router(chat.router)
 app.include_router(data.router)
+app.include_router(result.router)
 
 
 @app.get("/health")
@@ -51,3 +64,22 @@ async def health():
 async def api_health():
     """API 健康检查（供前端 proxy 调用）"""
     return {"status": "ok", "service": "smart-data-analyst", "version": "0.2.0"}
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """运行指标: 各级缓存命中统计、Agent 首条 SQL 耗时、LLM 排队情况"""
+    return {
+        "agent": sql_agent.get_stats(),
+        "catalog_cache": catalog_service.get_stats(),
+        "query_cache": query_cache.get_stats(),
+        "answer_cache": answer_cache.get_stats(),
+        "memory_cache": memory_service.get_stats(),
+        "turn_writer": turn_writer.get_stats(),
+        "llm_governor": llm_governor.get_stats(),
+        "result_store": result_store.get_stats(),
+        "table_index": table_index.get_stats(),
+        "sql_checker": sql_checker.get_stats(),
+        "query_pool": query_pool.get_stats(),
+        "chat": chat.get_stats(),
+    }
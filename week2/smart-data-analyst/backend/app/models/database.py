@@ -17,10 +17,16 @@ from sqlalchemy import (
     Integer,
     DateTime,
     ForeignKey,
-    create_engine,
+    Index,
     event,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import declarative_base, relationship
 
 from app.config import settings
 
@@ -44,10 +50,18 @@ class SessionModel(Base):
         onupdate=lambda: datetime.now(timezone.utc),
     )
 
+    # 滚动摘要（token 记忆模式）: 摘要覆盖到哪条消息的时间，以及被折叠内容的 token 数
+    memory_summary = Column(Text, nullable=True)
+    memory_summary_until = Column(DateTime, nullable=True)
+    memory_summary_source_tokens = Column(Integer, nullable=False, default=0)
+
     messages = relationship(
         "MessageModel", back_populates="session", cascade="all, delete-orphan"
     )
 
+    # 会话列表按 (updated_at, id) 倒序键集分页
+    __table_args__ = (Index("ix_sessions_updated_id", "updated_at", "id"),)
+
 
 class MessageModel(Base):
     """消息表"""
@@ -60,59 +74,148 @@ class MessageModel(Base):
     content = Column(Text, nullable=False, default="")
     sql_query = Column(Text, nullable=True)
     chart_config = Column(Text, nullable=True)  # JSON 字符串
+    # complete / cancelled（客户端中途断开，只保存了部分回答）
+    status = Column(String(20), nullable=False, default="complete")
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     session = relationship("SessionModel", back_populates="messages")
 
+    # 按会话取最近 N 条 / 按时间分页都走这个索引
+    __table_args__ = (Index("ix_messages_session_created", "session_id", "created_at"),)
+
 
 # ==================== 会话数据库引擎 ====================
 
+# 进程级单例: 整个应用共享一个异步引擎 + 连接池 + AsyncSession 工厂
+_session_engine: AsyncEngine | None = None
+_SessionLocal: async_sessionmaker[AsyncSession] | None = None
+
 
-def get_session_engine():
-    """获取会话数据库引擎"""
+def _create_session_engine() -> AsyncEngine:
+    """创建会话数据库异步引擎（aiosqlite，带连接池与 SQLite 调优 PRAGMA）"""
     db_path = Path(settings.SESSION_DB_PATH)
     db_path.parent.mkdir(parents=True, exist_ok=True)
-    engine = create_engine(f"sqlite:///{db_path}", echo=False)
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_path}",
+        echo=False,
+        connect_args={"timeout": 30},
+        pool_size=settings.SESSION_DB_POOL_SIZE,
+        max_overflow=settings.SESSION_DB_MAX_OVERFLOW,
+    )
 
-    # SQLite 开启外键约束
-    @event.listens_for(engine, "connect")
+    # 每个新建的物理连接只执行一次 PRAGMA
+    @event.listens_for(engine.sync_engine, "connect")
     def set_sqlite_pragma(dbapi_conn, connection_record):
         cursor = dbapi_conn.cursor()
         cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-16000")  # 约 16MB 页缓存
         cursor.close()
 
     return engine
 
 
-def init_session_db():
+def get_session_engine() -> AsyncEngine:
+    """获取会话数据库引擎（进程级单例，首次调用时创建）"""
+    global _session_engine
+    if _session_engine is None:
+        _session_engine = _create_session_engine()
+    return _session_engine
+
+
+async def init_session_db() -> AsyncEngine:
     """初始化会话数据库（创建表）"""
     engine = get_session_engine()
-    Base.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # create_all 不会给已存在的表补列、补建索引（旧库升级）
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
     print("[session.db] 会话数据库初始化完成")
     return engine
 
 
-def get_session_db():
-    """获取会话数据库 Session 工厂"""
-    engine = get_session_engine()
-    SessionLocal = sessionmaker(bind=engine)
-    return SessionLocal
+def _add_missing_columns(sync_conn) -> None:
+    """为已存在的表补加模型中新增的列（新增列均可为空或带默认值）"""
+    for table in Base.metadata.sorted_tables:
+        existing = {
+            row[1] for row in sync_conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')
+        }
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=sync_conn.dialect)
+            constraints = ""
+            if column.default is not None and column.default.is_scalar:
+                constraints = f" DEFAULT {column.default.arg!r}"
+                # SQLite 只允许为带非空默认值的新增列加 NOT NULL
+                if not column.nullable:
+                    constraints = " NOT NULL" + constraints
+            sync_conn.exec_driver_sql(
+                f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}{constraints}'
+            )
+
+
+def _create_missing_indexes(sync_conn) -> None:
+    """为已存在的表补建模型中声明的索引"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+def get_session_db() -> async_sessionmaker[AsyncSession]:
+    """获取会话数据库 AsyncSession 工厂（复用同一个引擎与连接池）"""
+    global _SessionLocal
+    if _SessionLocal is None:
+        # expire_on_commit=False: 关闭会话后仍可安全读取 ORM 属性（异步下不能懒加载）
+        _SessionLocal = async_sessionmaker(
+            bind=get_session_engine(), expire_on_commit=False
+        )
+    return _SessionLocal
+
+
+async def dispose_session_engine() -> None:
+    """释放会话数据库连接池（应用关闭时调用）"""
+    global _session_engine, _SessionLocal
+    if _session_engine is not None:
+        await _session_engine.dispose()
+    _session_engine = None
+    _SessionLocal = None
 
 
 # ==================== 业务数据库初始化 ====================
 
 
+def enable_wal(conn: sqlite3.Connection) -> None:
+    """
+    业务库切换为 WAL 日志模式（写入持久保存在库文件中）
+
+    回滚日志模式下，大批量导入的写事务在页缓存溢出后一直持有排他锁，
+    Agent 查询与表目录读取都会被阻塞；WAL 下读连接始终看到最近一次提交的快照。
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+
+
 def init_business_db():
     """初始化业务数据库 — 创建示例表并插入数据"""
     db_path = Path(settings.BUSINESS_DB_PATH)
     db_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # 如果已存在则跳过
+    # 如果已存在则跳过（旧库切换为 WAL）
     if db_path.exists():
         print(f"[business.db] 业务数据库已存在: {db_path}")
+        conn = sqlite3.connect(str(db_path))
+        try:
+            enable_wal(conn)
+        finally:
+            conn.close()
         return
 
     conn = sqlite3.connect(str(db_path))
+    enable_wal(conn)
     cursor = conn.cursor()
 
     # ---------- products 产品表 ----------
@@ -203,7 +306,12 @@ def init_business_db():
 # ==================== 统一初始化 ====================
 
 
-def init_all_databases():
+async def init_all_databases():
     """初始化所有数据库"""
-    init_session_db()
+    await init_session_db()
     init_business_db()
+
+
+async def close_all_databases():
+    """关闭所有数据库连接池"""
+    await dispose_session_engine()
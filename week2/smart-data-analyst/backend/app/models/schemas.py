@@ -34,6 +34,20 @@ class SessionResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class SessionListItem(SessionResponse):
+    """会话列表项（with_stats 时附带消息数与最后一条消息预览）"""
+
+    message_count: Optional[int] = None
+    last_message: Optional[str] = None
+
+
+class SessionPage(BaseModel):
+    """会话列表分页响应"""
+
+    sessions: list[SessionListItem]
+    next_cursor: Optional[str] = None
+
+
 # ==================== 消息相关 ====================
 
 
@@ -46,11 +60,32 @@ class MessageResponse(BaseModel):
     content: str
     sql_query: Optional[str] = None
     chart_config: Optional[str] = None
+    status: str = "complete"  # cancelled: 客户端中途断开，只保存了部分回答
     created_at: datetime
 
     model_config = {"from_attributes": True}
 
 
+class MessageListItem(MessageResponse):
+    """
+    分页消息项
+
+    轻量模式下响应中没有 sql_query / chart_config 键，只用 has_* 标记是否存在，
+    需要时通过 GET /api/sessions/{id}/messages/{message_id} 获取；
+    include_payload 模式下只有 sql_query / chart_config，没有 has_* 标记
+    """
+
+    has_sql_query: Optional[bool] = None
+    has_chart_config: Optional[bool] = None
+
+
+class MessagePage(BaseModel):
+    """消息历史分页响应"""
+
+    messages: list[MessageListItem]
+    next_cursor: Optional[str] = None
+
+
 # ==================== 聊天相关 ====================
 
 
@@ -61,6 +96,35 @@ class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, description="用户消息内容")
 
 
+class ChatAnswer(BaseModel):
+    """非流式问答结果"""
+
+    content: str = ""
+    sql: Optional[str] = None
+    # 查询结果首页 + 结果句柄，格式同 SSE data 事件的 content
+    data: Optional[dict] = None
+    chart: Optional[dict] = None
+
+
+class BatchChatRequest(BaseModel):
+    """批量问答请求（各问题相互独立，不带会话上下文）"""
+
+    questions: list[str] = Field(..., min_length=1, description="问题列表")
+
+
+class BatchChatItem(ChatAnswer):
+    """批量问答中单个问题的结果"""
+
+    question: str
+    error: Optional[str] = None
+
+
+class BatchChatResponse(BaseModel):
+    """批量问答响应（顺序与请求中的问题一致）"""
+
+    results: list[BatchChatItem]
+
+
 # ==================== 数据管理相关 ====================
 
 
@@ -70,6 +134,7 @@ class TableInfo(BaseModel):
     name: str
     columns: list[dict]
     row_count: int
+    row_count_exact: bool = True
 
 
 class TablesResponse(BaseModel):
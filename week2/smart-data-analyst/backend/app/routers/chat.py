@@ -1,21 +1,48 @@
 """
 聊天问答路由
-- POST /api/chat/stream  SSE 流式聊天接口
+- POST   /api/chat              非流式聊天接口（JSON）
+- POST   /api/chat/batch        批量问答（并发执行，数量受限）
+- POST   /api/chat/stream       SSE 流式聊天接口
+- GET    /api/chat/cache        查看问答回放缓存
+- DELETE /api/chat/cache        清空问答回放缓存
+- DELETE /api/chat/cache/{key}  删除单条缓存
 """
 
+import asyncio
 import json
+import threading
+import uuid
 from typing import AsyncGenerator
 
+import anyio
 from fastapi import APIRouter, HTTPException
 from sse_starlette.sse import EventSourceResponse
 
-from app.models.schemas import ChatRequest
-from app.services import session_service, memory_service
-from app.services.sql_agent import stream_agent_events, get_last_sql
+from app.config import settings
+from app.models.schemas import (
+    BatchChatRequest,
+    BatchChatResponse,
+    ChatAnswer,
+    ChatRequest,
+)
+from app.services import (
+    answer_cache, llm_governor, memory_service, query_pool, result_store, session_service,
+)
+from app.services.sql_agent import run_agent, stream_agent_events, get_last_sql
 from app.services.chart_service import strip_chart_marker
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
+# 流式问答统计（客户端中途断开 = cancelled）
+_stats = {
+    "streams": 0,
+    "completed": 0,
+    "cancelled": 0,
+    "cancelled_partial_chars": 0,
+    # 断开时 SQL 正在执行（查询被中止）
+    "cancelled_during_sql": 0,
+}
+
 
 async def _chat_event_generator(
     session_id: str, user_message: str
@@ -26,26 +53,51 @@ async def _chat_event_generator(
     流程:
     1. 加载上下文记忆
     2. 追加用户消息
-    3. 调用 SQL Agent 流式获取事件
+    3. 命中问答回放缓存则本地回放事件，否则调用 SQL Agent 流式获取事件
     4. 逐事件推送 SSE
-    5. 流结束后持久化消息
+    5. 流结束后持久化消息（并记录到回放缓存），最后推送 done
+
+    客户端断开时 EventSourceResponse 取消本生成器（或在 yield 处关闭它）: 关闭 Agent
+    事件流（取消 LangGraph 运行与 LLM 请求），置位取消标记中止正在执行的 SQL，
+    已生成的部分回答以 cancelled 状态保存。
     """
+    # 本请求内的 LLM 调用按会话排队（公平调度）
+    llm_governor.current_session.set(session_id)
+    # SQL 工具在线程池中执行，通过上下文拿到本请求的取消标记
+    cancel_event = threading.Event()
+    query_pool.current_cancel.set(cancel_event)
+    _stats["streams"] += 1
+
     # 加载历史上下文
-    history = memory_service.load_memory(session_id)
+    history = await memory_service.load_memory(session_id)
 
     # 追加本次用户消息
     from langchain_core.messages import HumanMessage
 
     messages = history + [HumanMessage(content=user_message)]
 
+    # 相同问题 + 相同上下文 + 相同库结构/数据 → 直接回放
+    # （缓存键需要读取库版本与结构指纹，放到线程池中计算）
+    cache_key = await asyncio.to_thread(answer_cache.make_key, user_message, history)
+    cached_events = answer_cache.get(cache_key)
+
     # 收集完整响应用于持久化
     full_text = ""
     collected_sql = None
     chart_config_str = None
     events_history = []
+    done_event = None
 
+    source = (
+        _replay_events(cached_events)
+        if cached_events is not None
+        else stream_agent_events(messages)
+    )
+    # 未正常结束即视为客户端断开: 等待中被取消抛 CancelledError，
+    # 停在 yield 处被关闭抛 GeneratorExit，两种情况都由 finally 清理
+    completed = False
     try:
-        async for event in stream_agent_events(messages):
+        async for event in source:
             events_history.append(event)
             event_type = event.get("type", "")
 
@@ -60,27 +112,175 @@ async def _chat_event_generator(
                     event.get("config", {}), ensure_ascii=False
                 )
 
-            # 推送 SSE 数据
+            elif event_type == "done":
+                # done 留到持久化之后再推送: 客户端收到 done 后断开时，
+                # 生成器不会再被推进，落库必须发生在这之前
+                done_event = event
+                continue
+
+            # 推送 SSE 数据（查询结果只推送首页 + 结果句柄）
+            if event_type == "data":
+                event = result_store.to_data_event(event.get("content", {}))
             yield json.dumps(event, ensure_ascii=False)
+        completed = True
 
     except Exception as e:
+        completed = True
         error_event = {"type": "error", "content": f"处理失败: {str(e)}"}
         yield json.dumps(error_event, ensure_ascii=False)
         yield json.dumps({"type": "done", "content": ""}, ensure_ascii=False)
         return
 
+    finally:
+        if not completed:
+            # 客户端断开: 取消范围内后续的 await 都会再次被取消，清理放在屏蔽范围内完成
+            if query_pool.is_running(cancel_event):
+                _stats["cancelled_during_sql"] += 1
+            cancel_event.set()
+            _stats["cancelled"] += 1
+            _stats["cancelled_partial_chars"] += len(full_text)
+            with anyio.CancelScope(shield=True):
+                await source.aclose()
+                await _persist_turn(
+                    session_id, user_message, full_text, collected_sql,
+                    chart_config_str, events_history, status="cancelled",
+                )
+
+    if cached_events is None:
+        answer_cache.put(cache_key, user_message, events_history)
+
     # 持久化: 保存本轮对话
+    await _persist_turn(
+        session_id, user_message, full_text, collected_sql, chart_config_str, events_history
+    )
+    _stats["completed"] += 1
+
+    if done_event is not None:
+        yield json.dumps(done_event, ensure_ascii=False)
+
+
+async def _persist_turn(
+    session_id: str,
+    user_message: str,
+    full_text: str,
+    collected_sql: str | None,
+    chart_config_str: str | None,
+    events_history: list[dict],
+    status: str = "complete",
+) -> None:
+    """保存本轮对话（status=cancelled 时助手回复为断开前已生成的部分）"""
     clean_text = strip_chart_marker(full_text) if full_text else ""
     if collected_sql is None:
         collected_sql = get_last_sql(events_history)
 
-    memory_service.save_turn(
+    await memory_service.save_turn(
         session_id=session_id,
         user_message=user_message,
         assistant_content=clean_text,
         sql_query=collected_sql,
         chart_config=chart_config_str,
+        status=status,
+    )
+
+
+async def _replay_events(events: list[dict]) -> AsyncGenerator[dict, None]:
+    """按原顺序回放缓存的事件序列"""
+    for event in events:
+        yield event
+
+
+def _ensure_capacity() -> None:
+    """模型调用排队已满时直接返回 503"""
+    if llm_governor.is_saturated():
+        raise HTTPException(
+            status_code=503,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": str(max(1, int(settings.LLM_QUEUE_TIMEOUT)))},
+        )
+
+
+async def _answer(messages: list) -> dict:
+    """调用 Agent 并把查询结果转为首页 + 结果句柄"""
+    answer = await run_agent(messages)
+    if answer["data"] is not None:
+        answer["data"] = result_store.to_data_event(answer["data"])["content"]
+    return answer
+
+
+@router.post("", response_model=ChatAnswer)
+async def chat(body: ChatRequest):
+    """
+    非流式聊天接口: 带会话上下文回答一个问题，并保存本轮对话
+
+    请求体:
+        session_id: 会话 ID
+        message: 用户消息
+
+    返回:
+        {"content": "...", "sql": "SELECT ...", "data": {...} | null, "chart": {...} | null}
+    """
+    session = await session_service.get_session(body.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="会话不存在")
+    _ensure_capacity()
+
+    llm_governor.current_session.set(body.session_id)
+    history = await memory_service.load_memory(body.session_id)
+
+    from langchain_core.messages import HumanMessage
+
+    try:
+        answer = await _answer(history + [HumanMessage(content=body.message)])
+    except llm_governor.GovernorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"处理失败: {str(e)}")
+
+    await memory_service.save_turn(
+        session_id=body.session_id,
+        user_message=body.message,
+        assistant_content=answer["content"],
+        sql_query=answer["sql"],
+        chart_config=json.dumps(answer["chart"], ensure_ascii=False) if answer["chart"] else None,
     )
+    return answer
+
+
+@router.post("/batch", response_model=BatchChatResponse)
+async def chat_batch(body: BatchChatRequest):
+    """
+    批量问答: 各问题独立回答（不带会话上下文、不保存对话），
+    最多 CHAT_BATCH_CONCURRENCY 个问题同时执行
+
+    整批的模型调用在 LLM 排队中算作同一个会话，不会挤占交互式会话。
+    单个问题失败只记录在该问题的 error 中。
+
+    返回:
+        {"results": [{"question": "...", "content": "...", "sql": "...", "data": {...},
+                      "chart": {...}, "error": null}, ...]}
+    """
+    if len(body.questions) > settings.CHAT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多 {settings.CHAT_BATCH_MAX_QUESTIONS} 个问题",
+        )
+    _ensure_capacity()
+
+    from langchain_core.messages import HumanMessage
+
+    llm_governor.current_session.set(f"batch-{uuid.uuid4().hex[:8]}")
+    semaphore = asyncio.Semaphore(settings.CHAT_BATCH_CONCURRENCY)
+
+    async def answer_one(question: str) -> dict:
+        async with semaphore:
+            try:
+                answer = await _answer([HumanMessage(content=question)])
+            except Exception as e:
+                return {"question": question, "error": str(e)}
+        return {"question": question, **answer}
+
+    results = await asyncio.gather(*(answer_one(q) for q in body.questions))
+    return {"results": results}
 
 
 @router.post("/stream")
@@ -95,16 +295,46 @@ async def chat_stream(body: ChatRequest):
     SSE 事件格式:
         data: {"type": "text",  "content": "..."}
         data: {"type": "sql",   "content": "SELECT ..."}
+        data: {"type": "data",  "content": {"columns": [...], "rows": [首页], "row_count": N,
+                                            "result_id": "...", "has_more": true, ...}}
         data: {"type": "chart", "config": {...}}
         data: {"type": "error", "content": "..."}
         data: {"type": "done",  "content": ""}
     """
     # 检查会话是否存在
-    session = session_service.get_session(body.session_id)
+    session = await session_service.get_session(body.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="会话不存在")
 
+    # 模型调用排队已满时直接拒绝，不再开启 SSE 流
+    _ensure_capacity()
+
     return EventSourceResponse(
         _chat_event_generator(body.session_id, body.message),
         media_type="text/event-stream",
     )
+
+
+def get_stats() -> dict:
+    """流式问答统计（含客户端断开后取消的工作量）"""
+    return dict(_stats)
+
+
+@router.get("/cache")
+async def get_answer_cache():
+    """查看问答回放缓存的统计与条目"""
+    return {"stats": answer_cache.get_stats(), "entries": answer_cache.list_entries()}
+
+
+@router.delete("/cache")
+async def purge_answer_cache():
+    """清空问答回放缓存"""
+    return {"detail": "已清空", "purged": answer_cache.purge()}
+
+
+@router.delete("/cache/{key}")
+async def purge_answer_cache_entry(key: str):
+    """删除单条问答回放缓存"""
+    if not answer_cache.purge(key):
+        raise HTTPException(status_code=404, detail="缓存条目不存在")
+    return {"detail": "已删除", "purged": 1}
@@ -1,29 +1,35 @@
 """
 数据管理路由
 - GET  /api/data/tables    获取所有表及其 schema
-- POST /api/data/upload    上传 CSV 创建/追加表数据
+- GET  /api/data/tables/{table_name}         表详情 + 键集分页浏览
+- GET  /api/data/tables/{table_name}/export  流式导出 CSV / NDJSON
+- POST /api/data/upload    上传 CSV 创建/追加表数据（可选后台任务）
+- GET  /api/data/jobs/{job_id}         查询导入任务状态
+- GET  /api/data/jobs/{job_id}/events  SSE 推送导入进度
 """
 
-import csv
-import io
-import sqlite3
+import asyncio
+import json
+import shutil
+import tempfile
+from typing import AsyncGenerator
+from urllib.parse import quote
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
+from sse_starlette.sse import EventSourceResponse
+from starlette.concurrency import run_in_threadpool
 
 from app.config import settings
+from app.services import catalog_service, import_service, job_service, table_service
 
 router = APIRouter(prefix="/api/data", tags=["data"])
 
 
-def _get_conn() -> sqlite3.Connection:
-    """获取业务数据库连接"""
-    return sqlite3.connect(settings.BUSINESS_DB_PATH)
-
-
 @router.get("/tables")
 async def get_tables():
     """
-    获取业务数据库中所有表的信息
+    获取业务数据库中所有表的信息（走目录缓存，数据未变化时不访问表数据）
 
     返回:
         {
@@ -31,110 +37,113 @@ async def get_tables():
                 {
                     "name": "products",
                     "columns": [{"name": "id", "type": "INTEGER"}, ...],
-                    "row_count": 8
+                    "row_count": 8,
+                    "row_count_exact": true
                 },
                 ...
             ]
         }
     """
-    conn = _get_conn()
-    try:
-        cursor = conn.cursor()
-
-        # 获取所有表名
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
-        table_names = [row[0] for row in cursor.fetchall()]
-
-        tables = []
-        for table_name in table_names:
-            # 获取列信息
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = [
-                {"name": col[1], "type": col[2], "notnull": bool(col[3]), "pk": bool(col[5])}
-                for col in cursor.fetchall()
-            ]
-
-            # 获取行数
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-            row_count = cursor.fetchone()[0]
-
-            tables.append(
-                {"name": table_name, "columns": columns, "row_count": row_count}
-            )
-
-        return {"tables": tables}
-    finally:
-        conn.close()
+    tables = await run_in_threadpool(catalog_service.get_tables)
+    return {"tables": tables}
 
 
 @router.get("/tables/{table_name}")
-async def get_table_detail(table_name: str, limit: int = 20):
+async def get_table_detail(
+    table_name: str,
+    limit: int = Query(20, ge=1, le=1000),
+    cursor: str | None = None,
+):
     """
-    获取指定表的详细信息（含示例数据）
+    获取指定表的详细信息（含示例数据），支持键集分页
 
     Args:
         table_name: 表名
-        limit: 返回的示例行数
+        limit: 每页行数
+        cursor: 上一页返回的 next_cursor（不传则返回第一页）
 
     返回:
         {
             "name": "products",
             "columns": [...],
             "row_count": 8,
-            "sample_data": [{"id": 1, "name": "笔记本电脑", ...}, ...]
+            "row_count_exact": true,
+            "sample_data": [{"id": 1, "name": "笔记本电脑", ...}, ...],
+            "next_cursor": "WzIwXQ=="  # 没有下一页时为 null
         }
     """
-    conn = _get_conn()
-    try:
-        cursor = conn.cursor()
+    # 列信息与行数来自目录缓存
+    info = await run_in_threadpool(catalog_service.get_table_info, table_name)
+    if not info:
+        raise HTTPException(status_code=404, detail=f"表 {table_name} 不存在")
 
-        # 检查表是否存在
-        cursor.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-            (table_name,),
+    try:
+        rows, next_cursor = await run_in_threadpool(
+            table_service.read_page, table_name, info["columns"], limit, cursor
         )
-        if not cursor.fetchone():
-            raise HTTPException(status_code=404, detail=f"表 {table_name} 不存在")
-
-        # 列信息
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns_info = cursor.fetchall()
-        columns = [
-            {"name": col[1], "type": col[2], "notnull": bool(col[3]), "pk": bool(col[5])}
-            for col in columns_info
-        ]
-        col_names = [col[1] for col in columns_info]
-
-        # 行数
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-        row_count = cursor.fetchone()[0]
-
-        # 示例数据
-        cursor.execute(f"SELECT * FROM {table_name} LIMIT ?", (limit,))
-        rows = cursor.fetchall()
-        sample_data = [dict(zip(col_names, row)) for row in rows]
+    except table_service.InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        return {
-            "name": table_name,
-            "columns": columns,
-            "row_count": row_count,
-            "sample_data": sample_data,
-        }
-    finally:
-        conn.close()
+    return {
+        "name": table_name,
+        "columns": info["columns"],
+        "row_count": info["row_count"],
+        "row_count_exact": info["row_count_exact"],
+        "sample_data": rows,
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/tables/{table_name}/export")
+async def export_table(table_name: str, format: str = "csv"):
+    """
+    流式导出整张表
+
+    Args:
+        table_name: 表名
+        format: csv / ndjson
+    """
+    if format not in table_service.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format 仅支持 csv / ndjson")
+
+    info = await run_in_threadpool(catalog_service.get_table_info, table_name)
+    if not info:
+        raise HTTPException(status_code=404, detail=f"表 {table_name} 不存在")
+
+    col_names = [col["name"] for col in info["columns"]]
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = quote(f"{table_name}.{format}")
+    return StreamingResponse(
+        # 同步生成器由 Starlette 在线程池中迭代，不阻塞事件循环
+        table_service.iter_export(table_name, col_names, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"},
+    )
 
 
 @router.post("/upload")
-async def upload_csv(file: UploadFile = File(...), table_name: str | None = None):
+async def upload_csv(
+    file: UploadFile = File(...),
+    table_name: str | None = None,
+    background: bool = False,
+):
     """
     上传 CSV 文件，创建或追加到数据库表
 
+    文件按块流式解码并分批写入（单事务），内存占用不随文件大小增长。
+
     Args:
         file: CSV 文件
         table_name: 目标表名（可选，默认使用文件名去掉 .csv 后缀）
+        background: 为 True 时提交到后台进程池导入，立即返回 job_id
 
     返回:
-        {"detail": "...", "table_name": "...", "rows_inserted": N}
+        {
+            "detail": "...", "table_name": "...", "rows_inserted": N,
+            "columns": [...], "elapsed_seconds": 1.23, "rows_per_second": 81234.5
+        }
+        background=True 时:
+        {"detail": "...", "table_name": "...", "job_id": "...", "status": "pending"}
     """
     if not file.filename or not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="请上传 .csv 格式的文件")
@@ -143,102 +152,105 @@ async def upload_csv(file: UploadFile = File(...), table_name: str | None = None
     if not table_name:
         table_name = file.filename.rsplit(".", 1)[0].replace("-", "_").replace(" ", "_")
 
-    # 读取 CSV 内容
-    content = await file.read()
-    try:
-        text = content.decode("utf-8-sig")
-    except UnicodeDecodeError:
-        text = content.decode("gbk")
-
-    reader = csv.DictReader(io.StringIO(text))
-    rows = list(reader)
-
-    if not rows:
-        raise HTTPException(status_code=400, detail="CSV 文件为空")
-
-    columns = list(rows[0].keys())
-
-    conn = _get_conn()
-    try:
-        cursor = conn.cursor()
-
-        # 检查表是否已存在
-        cursor.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-            (table_name,),
-        )
-        table_exists = cursor.fetchone() is not None
-
-        if not table_exists:
-            # 推断列类型并创建表
-            col_defs = []
-            for col in columns:
-                # 尝试推断类型
-                sample_vals = [r[col] for r in rows[:10] if r[col]]
-                col_type = _infer_type(sample_vals)
-                col_defs.append(f'"{col}" {col_type}')
-
-            create_sql = f'CREATE TABLE "{table_name}" ({", ".join(col_defs)})'
-            cursor.execute(create_sql)
-
-        # 插入数据
-        placeholders = ", ".join(["?"] * len(columns))
-        col_names = ", ".join([f'"{c}"' for c in columns])
-        insert_sql = f'INSERT INTO "{table_name}" ({col_names}) VALUES ({placeholders})'
-
-        for row in rows:
-            values = [_cast_value(row[col]) for col in columns]
-            cursor.execute(insert_sql, values)
-
-        conn.commit()
-
+    if background:
+        # 工作进程无法访问 UploadFile，先落盘到临时文件
+        csv_path = await run_in_threadpool(_spool_to_disk, file.file)
+        job_id = job_service.submit_import(csv_path, table_name)
         return {
-            "detail": f"{'创建新表并导入' if not table_exists else '追加'}成功",
+            "detail": "导入任务已提交",
             "table_name": table_name,
-            "rows_inserted": len(rows),
-            "columns": columns,
+            "job_id": job_id,
+            "status": job_service.JOB_PENDING,
         }
+
+    # 导入为同步 I/O，放到线程池执行，避免阻塞事件循环
+    try:
+        result = await run_in_threadpool(import_service.ingest_csv, file.file, table_name)
+    except import_service.EmptyCSVError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"导入失败: {str(e)}")
-    finally:
-        conn.close()
 
+    # 刷新缓存可能等待表目录重新加载，同样放到线程池执行
+    await run_in_threadpool(import_service.after_import, result["table_name"])
 
-def _infer_type(values: list[str]) -> str:
-    """推断列类型"""
-    if not values:
-        return "TEXT"
+    return {
+        "detail": f"{'创建新表并导入' if not result['table_existed'] else '追加'}成功",
+        "table_name": result["table_name"],
+        "rows_inserted": result["rows_inserted"],
+        "columns": result["columns"],
+        "elapsed_seconds": result["elapsed_seconds"],
+        "rows_per_second": result["rows_per_second"],
+    }
 
-    # 尝试 INTEGER
-    try:
-        for v in values:
-            int(v)
-        return "INTEGER"
-    except (ValueError, TypeError):
-        pass
 
-    # 尝试 REAL
-    try:
-        for v in values:
-            float(v)
-        return "REAL"
-    except (ValueError, TypeError):
-        pass
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    查询后台导入任务状态
+
+    返回:
+        {
+            "id": "...", "table_name": "...", "status": "running",
+            "rows_done": 120000, "rows_per_second": 95000.0,
+            "progress": 0.42, "eta_seconds": 3.1, "error": null, "result": null
+        }
+    """
+    job = job_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
 
-    return "TEXT"
 
+async def _job_event_generator(job_id: str) -> AsyncGenerator[str, None]:
+    """
+    导入进度 SSE 事件生成器
 
-def _cast_value(val: str):
-    """尝试将字符串转为合适的 Python 类型"""
-    if not val or val.strip() == "":
-        return None
-    try:
-        return int(val)
-    except (ValueError, TypeError):
-        pass
-    try:
-        return float(val)
-    except (ValueError, TypeError):
-        pass
-    return val
+    事件格式:
+        data: {"type": "progress", "content": {...任务状态...}}
+        data: {"type": "error",    "content": "..."}
+        data: {"type": "done",     "content": {...任务状态...}}
+    """
+    last_rows = None
+    while True:
+        job = job_service.get_job(job_id)
+        if not job:
+            yield json.dumps({"type": "error", "content": "任务不存在"}, ensure_ascii=False)
+            yield json.dumps({"type": "done", "content": ""}, ensure_ascii=False)
+            return
+
+        if job_service.is_finished(job):
+            if job["status"] == job_service.JOB_FAILED:
+                yield json.dumps(
+                    {"type": "error", "content": f"导入失败: {job['error']}"},
+                    ensure_ascii=False,
+                )
+            yield json.dumps({"type": "done", "content": job}, ensure_ascii=False)
+            return
+
+        if job["rows_done"] != last_rows:
+            last_rows = job["rows_done"]
+            yield json.dumps({"type": "progress", "content": job}, ensure_ascii=False)
+
+        await asyncio.sleep(settings.IMPORT_PROGRESS_INTERVAL)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """SSE 推送导入任务进度（rows_done / rows_per_second / eta_seconds）"""
+    if not job_service.get_job(job_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    return EventSourceResponse(
+        _job_event_generator(job_id),
+        media_type="text/event-stream",
+    )
+
+
+def _spool_to_disk(src) -> str:
+    """把上传文件按块复制到临时文件，返回路径"""
+    with tempfile.NamedTemporaryFile(
+        prefix="upload_", suffix=".csv", delete=False
+    ) as dst:
+        shutil.copyfileobj(src, dst, length=1024 * 1024)
+        return dst.name
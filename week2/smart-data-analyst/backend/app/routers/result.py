@@ -0,0 +1,48 @@
+"""
+查询结果路由
+- GET /api/results/{result_id}  按需拉取 Agent 查询结果的分页 / 排序切片
+"""
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.services import result_store
+
+router = APIRouter(prefix="/api/results", tags=["results"])
+
+
+@router.get("/{result_id}")
+async def get_result_page(
+    result_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    sort_by: str | None = None,
+    order: str = "asc",
+):
+    """
+    获取查询结果的一页
+
+    Args:
+        result_id: SSE data 事件中的 result_id
+        offset: 起始行
+        limit: 每页行数
+        sort_by: 排序列名（不传则保持 SQL 原始顺序）
+        order: asc / desc
+
+    返回:
+        {
+            "result_id": "...",
+            "columns": ["name", "total"],
+            "column_types": ["text", "real"],
+            "rows": [...],
+            "row_count": 10000,
+            "offset": 100,
+            "has_more": true,
+            "sql": "SELECT ..."
+        }
+    """
+    try:
+        return result_store.get_page(result_id, offset, limit, sort_by, order)
+    except result_store.ResultNotFoundError:
+        raise HTTPException(status_code=404, detail="查询结果不存在或已过期")
+    except result_store.InvalidSortError as e:
+        raise HTTPException(status_code=400, detail=str(e))
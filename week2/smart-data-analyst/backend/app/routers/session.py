@@ -1,43 +1,71 @@
 """
 会话管理路由
-- GET    /api/sessions                        获取会话列表
+- GET    /api/sessions                        获取会话列表（传 limit 时按游标分页）
 - POST   /api/sessions                        创建新会话
 - PUT    /api/sessions/{session_id}            重命名会话
 - DELETE /api/sessions/{session_id}            删除会话
-- GET    /api/sessions/{session_id}/messages   获取历史消息
+- GET    /api/sessions/{session_id}/messages   获取历史消息（传 limit 时向前翻页）
+- GET    /api/sessions/{session_id}/messages/{message_id}  获取单条完整消息
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
 from app.models.schemas import (
     SessionCreate,
     SessionRename,
     SessionResponse,
+    SessionPage,
     MessageResponse,
+    MessagePage,
 )
-from app.services import session_service
+from app.services import memory_service, session_service
+from app.services.cursor import InvalidCursorError
 
 router = APIRouter(prefix="/api/sessions", tags=["sessions"])
 
 
-@router.get("", response_model=list[SessionResponse])
-async def list_sessions():
-    """获取所有会话列表"""
-    sessions = session_service.list_sessions()
-    return sessions
+@router.get("", response_model=list[SessionResponse] | SessionPage)
+async def list_sessions(
+    limit: int | None = Query(None, ge=1, le=200),
+    cursor: str | None = None,
+    with_stats: bool = False,
+):
+    """
+    获取会话列表（按更新时间倒序）
+
+    不传 limit 时返回全部会话的数组（兼容旧调用）；传 limit 时返回一页:
+        {
+            "sessions": [{"id": "...", "title": "...", ..., "message_count": 12, "last_message": "..."}],
+            "next_cursor": "..."    # 最后一页为 null
+        }
+
+    Args:
+        limit: 每页条数
+        cursor: 上一页返回的 next_cursor
+        with_stats: 是否附带消息数与最后一条消息预览
+    """
+    if limit is None:
+        return await session_service.list_sessions()
+    try:
+        sessions, next_cursor = await session_service.list_sessions_page(
+            limit, cursor, with_stats
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"sessions": sessions, "next_cursor": next_cursor}
 
 
 @router.post("", response_model=SessionResponse, status_code=201)
 async def create_session(body: SessionCreate = SessionCreate()):
     """创建新会话"""
-    session = session_service.create_session(title=body.title)
+    session = await session_service.create_session(title=body.title)
     return session
 
 
 @router.put("/{session_id}", response_model=SessionResponse)
 async def rename_session(session_id: str, body: SessionRename):
     """重命名会话"""
-    session = session_service.rename_session(session_id, body.title)
+    session = await session_service.rename_session(session_id, body.title)
     if not session:
         raise HTTPException(status_code=404, detail="会话不存在")
     return session
@@ -46,19 +74,62 @@ async def rename_session(session_id: str, body: SessionRename):
 @router.delete("/{session_id}")
 async def delete_session(session_id: str):
     """删除会话"""
-    success = session_service.delete_session(session_id)
+    success = await session_service.delete_session(session_id)
+    memory_service.forget(session_id)
     if not success:
         raise HTTPException(status_code=404, detail="会话不存在")
     return {"detail": "已删除"}
 
 
-@router.get("/{session_id}/messages", response_model=list[MessageResponse])
-async def get_messages(session_id: str):
-    """获取会话的消息历史"""
+# exclude_unset: 轻量模式下查询结果里没有 sql_query / chart_config 键，响应中也不输出，
+# 完整模式下则不输出 has_* 标记
+@router.get(
+    "/{session_id}/messages",
+    response_model=list[MessageResponse] | MessagePage,
+    response_model_exclude_unset=True,
+)
+async def get_messages(
+    session_id: str,
+    limit: int | None = Query(None, ge=1, le=500),
+    before: str | None = None,
+    include_payload: bool = False,
+):
+    """
+    获取会话的消息历史
+
+    不传 limit 时返回全部消息的数组（兼容旧调用）；传 limit 时从最新消息向前翻页:
+        {
+            "messages": [...],      # 页内按时间正序
+            "next_cursor": "..."    # 作为 before 获取更早的一页，没有更早消息时为 null
+        }
+    分页时默认不返回 sql_query / chart_config 两个键（只带 has_sql_query / has_chart_config），
+    include_payload=true 时返回这两个键、不带 has_* 标记。
+
+    Args:
+        limit: 每页条数
+        before: 上一页返回的 next_cursor
+        include_payload: 是否返回 sql_query / chart_config
+    """
     # 先检查会话是否存在
-    session = session_service.get_session(session_id)
+    session = await session_service.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="会话不存在")
 
-    messages = session_service.get_messages(session_id)
-    return messages
+    if limit is None:
+        return await session_service.get_messages(session_id)
+    try:
+        messages, next_cursor = await session_service.get_messages_page(
+            session_id, limit, before, include_payload
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"messages": messages, "next_cursor": next_cursor}
+
+
+@router.get("/{session_id}/messages/{message_id}", response_model=MessageResponse)
+async def get_message(session_id: str, message_id: str):
+    """获取单条消息的完整内容（含 sql_query / chart_config）"""
+    message = await session_service.get_message(session_id, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="消息不存在")
+    return message
@@ -0,0 +1,154 @@
+"""
+问答回放缓存
+- 键: (规范化问题, 发送给 Agent 的上下文记忆, 表结构指纹, 业务库数据版本)
+- 值: 一次完整 Agent 运行产出的 SSE 事件序列（text / sql / data / chart / done）
+- 命中时直接本地回放事件，跳过全部 LLM 调用
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import settings
+from app.services import catalog_service
+
+# 问题末尾可忽略的标点
+_TRAILING_PUNCT = "？?。.!！~～ "
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# 只回放这些类型的事件（error 结果不会被缓存）
+_REPLAYABLE_TYPES = ("text", "sql", "data", "chart", "done")
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, dict]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "purges": 0}
+
+
+def normalize_question(question: str) -> str:
+    """规范化问题文本: 折叠空白、去掉末尾标点、英文小写"""
+    text = _WHITESPACE_PATTERN.sub(" ", question).strip().rstrip(_TRAILING_PUNCT)
+    return text.lower()
+
+
+def make_key(question: str, history: list) -> str:
+    """
+    计算缓存键
+
+    Args:
+        question: 用户问题
+        history: 发送给 Agent 的 LangChain 历史消息（上下文不同则答案可能不同）
+    """
+    context = [(m.type, m.content) for m in history]
+    payload = json.dumps(
+        {
+            "q": normalize_question(question),
+            "ctx": context,
+            "schema": catalog_service.get_schema_fingerprint(),
+            "data": repr(catalog_service.get_data_version()),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> list[dict] | None:
+    """查询缓存，返回事件序列副本；未命中或过期返回 None"""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    now = time.time()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry["expires_at"] < now:
+            if entry is not None:
+                del _entries[key]
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        entry["hits"] += 1
+        _stats["hits"] += 1
+        return [dict(e) for e in entry["events"]]
+
+
+def put(key: str, question: str, events: list[dict]) -> bool:
+    """
+    记录一次完整运行的事件序列
+
+    只缓存成功结束（有 done、无 error）的运行。
+
+    Returns:
+        是否已写入缓存
+    """
+    if not settings.ANSWER_CACHE_ENABLED or settings.ANSWER_CACHE_SIZE <= 0:
+        return False
+    types = [e.get("type") for e in events]
+    if "error" in types or "done" not in types:
+        return False
+
+    now = time.time()
+    with _lock:
+        _entries[key] = {
+            "key": key,
+            "question": question,
+            "events": [dict(e) for e in events if e.get("type") in _REPLAYABLE_TYPES],
+            "created_at": now,
+            "expires_at": now + settings.ANSWER_CACHE_TTL,
+            "hits": 0,
+        }
+        _entries.move_to_end(key)
+        _stats["stores"] += 1
+        while len(_entries) > settings.ANSWER_CACHE_SIZE:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+    return True
+
+
+def list_entries() -> list[dict]:
+    """列出缓存条目摘要（最近使用的在前）"""
+    now = time.time()
+    with _lock:
+        return [
+            {
+                "key": e["key"],
+                "question": e["question"],
+                "events": len(e["events"]),
+                "hits": e["hits"],
+                "created_at": e["created_at"],
+                "expires_in": round(max(e["expires_at"] - now, 0.0), 1),
+            }
+            for e in reversed(_entries.values())
+        ]
+
+
+def purge(key: str | None = None) -> int:
+    """
+    清除缓存
+
+    Args:
+        key: 指定条目；None 表示全部清空
+
+    Returns:
+        清除的条目数
+    """
+    with _lock:
+        if key is None:
+            count = len(_entries)
+            _entries.clear()
+        else:
+            count = 1 if _entries.pop(key, None) is not None else 0
+        _stats["purges"] += count
+        return count
+
+
+def get_stats() -> dict:
+    """命中统计"""
+    with _lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "size": len(_entries),
+            "hit_rate": round(_stats["hits"] / total, 4) if total else 0.0,
+        }
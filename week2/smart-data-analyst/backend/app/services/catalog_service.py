@@ -0,0 +1,300 @@
+"""
+业务库表目录缓存
+- 缓存所有表的列信息与行数，避免每次请求都 PRAGMA table_info + COUNT(*)
+- 失效条件: 上传导入后主动 invalidate / PRAGMA data_version 变化 / 文件 mtime 变化
+- invalidate 只递增失效代数、不加锁，重新加载目录期间调用也不会被阻塞
+- 命中时只需一次 PRAGMA data_version + 一次 stat，与表数量、行数无关
+- 数据版本 / 表结构指纹只使用探测连接，由单独的短锁保护，重新加载目录（全表计数）期间也不阻塞
+- 快速统计模式 (CATALOG_FAST_STATS): 行数取自 sqlite_stat1 估算值，
+  并在后台线程中精确重算，row_count_exact 标明当前值是否精确
+"""
+
+import hashlib
+import itertools
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+
+_lock = threading.RLock()
+
+# 保护探测连接与表结构指纹缓存（加锁顺序: _lock → _version_lock）
+_version_lock = threading.Lock()
+
+# 专用于探测 data_version 的长连接（data_version 只反映"其他连接"的提交）
+_probe_conn: sqlite3.Connection | None = None
+_probe_path: str | None = None
+_probe_ino: int | None = None
+
+# 缓存内容与对应的 (数据库版本, 失效代数)
+_tables: dict[str, dict] | None = None
+_version: tuple | None = None
+
+# 失效代数: invalidate 每调用一次加一（next() 在 CPython 中是原子的，无需加锁）
+_invalidations = itertools.count(1)
+_generation = 0
+
+# 表结构指纹缓存: (版本, 失效代数, 指纹)
+_schema_fingerprint: tuple[tuple, int, str] | None = None
+
+# 后台精确计数线程（快速统计模式下使用）
+_recount_executor: ThreadPoolExecutor | None = None
+
+# 命中/未命中统计
+_stats = {"hits": 0, "misses": 0, "recounts": 0}
+
+
+def _file_fingerprint(db_path: str) -> tuple:
+    """文件指纹: 文件被替换或被外部修改时变化"""
+    try:
+        st = os.stat(db_path)
+    except FileNotFoundError:
+        return (0, 0, 0)
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _get_probe_conn(db_path: str, ino: int) -> sqlite3.Connection:
+    """获取（必要时重建）探测连接（调用方持有 _version_lock）"""
+    global _probe_conn, _probe_path, _probe_ino
+    # 文件被替换后旧连接仍指向旧 inode，需要重连
+    if _probe_conn is None or _probe_path != db_path or _probe_ino != ino:
+        _close_probe_conn()
+        _probe_conn = sqlite3.connect(
+            db_path, check_same_thread=False, timeout=settings.BUSINESS_DB_BUSY_TIMEOUT
+        )
+        _probe_path = db_path
+        _probe_ino = _file_fingerprint(db_path)[0]
+    return _probe_conn
+
+
+def _read_version(db_path: str) -> tuple[tuple, sqlite3.Connection]:
+    """读取当前数据库版本，同时返回探测连接（调用方持有 _version_lock）"""
+    fingerprint = _file_fingerprint(db_path)
+    conn = _get_probe_conn(db_path, fingerprint[0])
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    return (fingerprint, data_version), conn
+
+
+def _current_version(db_path: str) -> tuple:
+    """当前数据库版本 = (文件指纹, data_version)"""
+    with _version_lock:
+        return _read_version(db_path)[0]
+
+
+def _close_probe_conn() -> None:
+    global _probe_conn, _probe_path, _probe_ino
+    if _probe_conn is not None:
+        _probe_conn.close()
+    _probe_conn = None
+    _probe_path = None
+    _probe_ino = None
+
+
+def _load_catalog(conn: sqlite3.Connection, fast_stats: bool) -> dict[str, dict]:
+    """读取全部表的列信息与行数（快速统计模式下行数为估算值）"""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT name FROM sqlite_master "
+        "WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )
+    table_names = [row[0] for row in cursor.fetchall()]
+    estimates = _read_stat1(cursor) if fast_stats else {}
+
+    tables = {}
+    for table_name in table_names:
+        # 获取列信息
+        cursor.execute(f'PRAGMA table_info("{table_name}")')
+        columns = [
+            {"name": col[1], "type": col[2], "notnull": bool(col[3]), "pk": bool(col[5])}
+            for col in cursor.fetchall()
+        ]
+
+        # 获取行数
+        if fast_stats:
+            row_count = estimates.get(table_name)
+            if row_count is None:
+                row_count = _estimate_by_rowid(cursor, table_name)
+            row_count_exact = False
+        else:
+            row_count = _exact_count(cursor, table_name)
+            row_count_exact = True
+
+        tables[table_name] = {
+            "name": table_name,
+            "columns": columns,
+            "row_count": row_count,
+            "row_count_exact": row_count_exact,
+        }
+    return tables
+
+
+def _read_stat1(cursor: sqlite3.Cursor) -> dict[str, int]:
+    """从 sqlite_stat1 读取每个表的行数估算（stat 字段首个整数即行数）"""
+    try:
+        cursor.execute("SELECT tbl, stat FROM sqlite_stat1")
+    except sqlite3.OperationalError:
+        # 从未执行过 ANALYZE
+        return {}
+    estimates: dict[str, int] = {}
+    for tbl, stat in cursor.fetchall():
+        try:
+            estimates[tbl] = max(estimates.get(tbl, 0), int(stat.split()[0]))
+        except (AttributeError, IndexError, ValueError):
+            continue
+    return estimates
+
+
+def _estimate_by_rowid(cursor: sqlite3.Cursor, table_name: str) -> int:
+    """无统计信息时用 MAX(rowid) 估算行数（走 B-tree，O(log n)）"""
+    try:
+        cursor.execute(f'SELECT MAX(rowid) FROM "{table_name}"')
+    except sqlite3.OperationalError:
+        # WITHOUT ROWID 表
+        return _exact_count(cursor, table_name)
+    return cursor.fetchone()[0] or 0
+
+
+def _exact_count(cursor: sqlite3.Cursor, table_name: str) -> int:
+    cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"')
+    return cursor.fetchone()[0]
+
+
+def _schedule_recount(tables: dict[str, dict], version: tuple) -> None:
+    """快速统计模式: 提交后台精确计数（调用方持有锁）"""
+    global _recount_executor
+    if _recount_executor is None:
+        _recount_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="catalog-recount"
+        )
+    db_path = settings.BUSINESS_DB_PATH
+    for table_name, info in tables.items():
+        if not info["row_count_exact"]:
+            _recount_executor.submit(_recount, db_path, table_name, version)
+
+
+def _recount(db_path: str, table_name: str, version: tuple) -> None:
+    """后台线程: 精确计数并回填缓存（期间数据库若有变化则丢弃结果）"""
+    conn = sqlite3.connect(
+        f"file:{db_path}?mode=ro", uri=True, timeout=settings.BUSINESS_DB_BUSY_TIMEOUT
+    )
+    try:
+        row_count = _exact_count(conn.cursor(), table_name)
+    except sqlite3.Error:
+        return
+    finally:
+        conn.close()
+
+    with _lock:
+        if _tables is None or _version != version or table_name not in _tables:
+            return
+        _tables[table_name] = {
+            **_tables[table_name],
+            "row_count": row_count,
+            "row_count_exact": True,
+        }
+        _stats["recounts"] += 1
+
+
+def _ensure_fresh() -> dict[str, dict]:
+    """返回最新的目录缓存，版本变化时重新加载（调用方持有锁）"""
+    global _tables, _version
+    db_path = settings.BUSINESS_DB_PATH
+    # 先读取失效代数: 加载期间若被 invalidate，下次请求会重新加载
+    version = (_current_version(db_path), _generation)
+    if _tables is not None and version == _version:
+        _stats["hits"] += 1
+        return _tables
+
+    _stats["misses"] += 1
+    # 用独立连接加载，全表计数期间不占用探测连接
+    conn = sqlite3.connect(db_path, timeout=settings.BUSINESS_DB_BUSY_TIMEOUT)
+    try:
+        _tables = _load_catalog(conn, settings.CATALOG_FAST_STATS)
+    finally:
+        conn.close()
+    # 加载期间若有其他连接提交，版本号会再次变化，下次请求会重新加载
+    _version = version
+    if settings.CATALOG_FAST_STATS:
+        _schedule_recount(_tables, version)
+    return _tables
+
+
+def get_tables() -> list[dict]:
+    """
+    获取所有表的信息（按表名排序）
+
+    Returns:
+        [{"name": "products", "columns": [...], "row_count": 8, "row_count_exact": true}, ...]
+    """
+    with _lock:
+        return list(_ensure_fresh().values())
+
+
+def get_table_info(table_name: str) -> dict | None:
+    """
+    获取单个表的信息
+
+    Returns:
+        {"name": "...", "columns": [...], "row_count": N, "row_count_exact": bool}，
+        表不存在时返回 None
+    """
+    with _lock:
+        return _ensure_fresh().get(table_name)
+
+
+def get_data_version() -> tuple:
+    """
+    业务库当前数据版本（文件指纹 + data_version）
+
+    任何提交都会改变该值，可作为依赖业务数据的缓存键的一部分。
+    不等待目录缓存的锁（重新加载目录时可能持有较长时间）。
+    """
+    return _current_version(settings.BUSINESS_DB_PATH)
+
+
+def get_schema_fingerprint() -> str:
+    """
+    业务库表结构指纹（sqlite_master 中建表/索引语句的哈希）
+
+    只依赖 DDL，不需要统计行数；数据版本不变时直接返回缓存值。
+    与 get_data_version 一样不等待目录缓存的锁。
+    """
+    global _schema_fingerprint
+    with _version_lock:
+        generation = _generation
+        version, conn = _read_version(settings.BUSINESS_DB_PATH)
+        if _schema_fingerprint is not None and _schema_fingerprint[:2] == (version, generation):
+            return _schema_fingerprint[2]
+
+        rows = conn.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE name NOT LIKE 'sqlite_%' ORDER BY type, name"
+        ).fetchall()
+        digest = hashlib.sha256(repr(rows).encode("utf-8")).hexdigest()[:16]
+        _schema_fingerprint = (version, generation, digest)
+        return digest
+
+
+def invalidate() -> None:
+    """主动使目录缓存失效（上传导入后调用；不加锁，不会等待正在进行的目录加载）"""
+    global _generation
+    _generation = next(_invalidations)
+
+
+def get_stats() -> dict:
+    """缓存命中统计"""
+    with _lock:
+        return {**_stats, "invalidations": _generation}
+
+
+def close() -> None:
+    """关闭探测连接与后台计数线程（应用关闭时调用）"""
+    global _recount_executor
+    with _lock:
+        with _version_lock:
+            _close_probe_conn()
+        if _recount_executor is not None:
+            _recount_executor.shutdown(wait=False, cancel_futures=True)
+        _recount_executor = None
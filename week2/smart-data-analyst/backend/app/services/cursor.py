@@ -0,0 +1,35 @@
+"""
+不透明分页游标
+- 把键集分页的"最后一行键值"编码为 URL 安全的字符串
+- 表数据浏览、会话列表、消息历史共用
+"""
+
+import base64
+import json
+
+
+class InvalidCursorError(ValueError):
+    """分页游标无法解析"""
+
+
+def encode_cursor(key: list) -> str:
+    """把分页键值编码为不透明游标"""
+    raw = json.dumps(key, ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, length: int | None = None) -> list:
+    """
+    解析游标，失败时抛出 InvalidCursorError
+
+    Args:
+        cursor: encode_cursor 生成的游标
+        length: 期望的键值个数，None 表示不检查
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursorError("无效的分页游标") from e
+    if not isinstance(key, list) or (length is not None and len(key) != length):
+        raise InvalidCursorError("无效的分页游标")
+    return key
@@ -0,0 +1,248 @@
+"""
+CSV 导入服务
+- 流式读取: 按块解码（utf-8-sig，失败回退 gbk），内存占用与文件大小无关
+- 批量写入: executemany 分批插入，整个导入在同一个事务内完成
+- 统计导入吞吐（rows/s），可选逐批回调进度
+"""
+
+import csv
+import io
+import sqlite3
+import time
+from itertools import islice
+from typing import BinaryIO, Callable, Iterator
+
+from app.config import settings
+from app.models.database import enable_wal
+from app.services import answer_cache, catalog_service, query_cache, schema_digest
+
+# 推断列类型时参考的行数
+_INFER_SAMPLE_ROWS = 10
+
+# 依次尝试的编码
+_ENCODINGS = ("utf-8-sig", "gbk")
+
+
+class EmptyCSVError(ValueError):
+    """CSV 文件没有数据行"""
+
+
+def ingest_csv(
+    fileobj: BinaryIO,
+    table_name: str,
+    db_path: str | None = None,
+    batch_size: int | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> dict:
+    """
+    将 CSV 流式导入业务数据库，表不存在时自动建表。
+
+    先按 utf-8-sig 解码；若中途遇到非法 UTF-8 字节，回滚整个事务后
+    从头以 gbk 重新导入（fileobj 需可 seek，UploadFile 的临时文件满足）。
+
+    Args:
+        fileobj: 二进制文件对象
+        table_name: 目标表名
+        db_path: 业务数据库路径（默认 settings.BUSINESS_DB_PATH）
+        batch_size: 每批 executemany 的行数（默认 settings.CSV_IMPORT_BATCH_SIZE）
+        on_progress: 每写入一批后回调 (rows_done, bytes_read)
+
+    Returns:
+        {
+            "table_name": "...",
+            "columns": [...],
+            "table_existed": bool,
+            "rows_inserted": N,
+            "elapsed_seconds": 1.23,
+            "rows_per_second": 81234.5
+        }
+
+    Raises:
+        EmptyCSVError: CSV 没有数据行
+    """
+    db_path = db_path or settings.BUSINESS_DB_PATH
+    batch_size = batch_size or settings.CSV_IMPORT_BATCH_SIZE
+    start_pos = fileobj.tell()
+
+    for encoding in _ENCODINGS[:-1]:
+        try:
+            return _ingest_with_encoding(
+                fileobj, encoding, table_name, db_path, batch_size, on_progress
+            )
+        except UnicodeDecodeError:
+            fileobj.seek(start_pos)
+
+    return _ingest_with_encoding(
+        fileobj, _ENCODINGS[-1], table_name, db_path, batch_size, on_progress
+    )
+
+
+def after_import(table_name: str) -> None:
+    """导入成功后刷新依赖业务库内容的缓存（在主进程中调用）"""
+    catalog_service.invalidate()
+    schema_digest.invalidate(table_name)
+    query_cache.clear()
+    answer_cache.purge()
+
+
+def _ingest_with_encoding(
+    fileobj: BinaryIO,
+    encoding: str,
+    table_name: str,
+    db_path: str,
+    batch_size: int,
+    on_progress: Callable[[int, int], None] | None,
+) -> dict:
+    """以指定编码执行一次完整导入（单事务，失败即回滚）"""
+    start = time.perf_counter()
+    text_stream = io.TextIOWrapper(fileobj, encoding=encoding, newline="")
+    try:
+        rows = _iter_rows(text_stream)
+        columns = next(rows, None)
+        if not columns:
+            raise EmptyCSVError("CSV 文件为空")
+
+        # 预读少量行用于类型推断
+        head = list(islice(rows, _INFER_SAMPLE_ROWS))
+        if not head:
+            raise EmptyCSVError("CSV 文件为空")
+
+        # 同时有其他导入在写时排队等待其提交，而不是 5 秒后失败
+        conn = sqlite3.connect(db_path, timeout=settings.IMPORT_LOCK_TIMEOUT)
+        try:
+            # 库文件可能不是经 init_business_db 创建的，导入前确保为 WAL，不阻塞读
+            enable_wal(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            table_existed = _table_exists(conn, table_name)
+            if not table_existed:
+                conn.execute(_build_create_sql(table_name, columns, head))
+
+            placeholders = ", ".join(["?"] * len(columns))
+            col_names = ", ".join([f'"{c}"' for c in columns])
+            insert_sql = f'INSERT INTO "{table_name}" ({col_names}) VALUES ({placeholders})'
+
+            rows_inserted = 0
+            for batch in _iter_batches(head, rows, len(columns), batch_size):
+                conn.executemany(insert_sql, batch)
+                rows_inserted += len(batch)
+                if on_progress:
+                    on_progress(rows_inserted, fileobj.tell())
+
+            conn.commit()
+            if settings.CATALOG_FAST_STATS:
+                _analyze(conn, table_name)
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    finally:
+        # 不关闭调用方的文件对象
+        text_stream.detach()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "table_name": table_name,
+        "columns": columns,
+        "table_existed": table_existed,
+        "rows_inserted": rows_inserted,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows_inserted / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def _iter_rows(text_stream: io.TextIOBase) -> Iterator[list[str]]:
+    """逐行产出 CSV 记录，跳过空行（与 csv.DictReader 行为一致）"""
+    for row in csv.reader(text_stream):
+        if row:
+            yield row
+
+
+def _iter_batches(
+    head: list[list[str]],
+    rows: Iterator[list[str]],
+    width: int,
+    batch_size: int,
+) -> Iterator[list[list]]:
+    """把预读行与剩余行拼接，转换类型后按 batch_size 分批产出"""
+    batch: list[list] = []
+    for source in (head, rows):
+        for row in source:
+            batch.append(_normalize_row(row, width))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _normalize_row(row: list[str], width: int) -> list:
+    """补齐/截断到列数并转换类型（缺失字段视为 NULL）"""
+    if len(row) < width:
+        row = row + [""] * (width - len(row))
+    return [_cast_value(v) for v in row[:width]]
+
+
+def _analyze(conn: sqlite3.Connection, table_name: str) -> None:
+    """导入后刷新 sqlite_stat1 统计（失败不影响已提交的导入）"""
+    try:
+        conn.execute(f'ANALYZE "{table_name}"')
+        conn.commit()
+    except sqlite3.Error:
+        pass
+
+
+def _table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
+    cursor = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+        (table_name,),
+    )
+    return cursor.fetchone() is not None
+
+
+def _build_create_sql(table_name: str, columns: list[str], head: list[list[str]]) -> str:
+    """根据预读行推断列类型，生成 CREATE TABLE 语句"""
+    col_defs = []
+    for idx, col in enumerate(columns):
+        sample_vals = [r[idx] for r in head if idx < len(r) and r[idx]]
+        col_defs.append(f'"{col}" {_infer_type(sample_vals)}')
+    return f'CREATE TABLE "{table_name}" ({", ".join(col_defs)})'
+
+
+def _infer_type(values: list[str]) -> str:
+    """推断列类型"""
+    if not values:
+        return "TEXT"
+
+    # 尝试 INTEGER
+    try:
+        for v in values:
+            int(v)
+        return "INTEGER"
+    except (ValueError, TypeError):
+        pass
+
+    # 尝试 REAL
+    try:
+        for v in values:
+            float(v)
+        return "REAL"
+    except (ValueError, TypeError):
+        pass
+
+    return "TEXT"
+
+
+def _cast_value(val: str):
+    """尝试将字符串转为合适的 Python 类型"""
+    if not val or val.strip() == "":
+        return None
+    try:
+        return int(val)
+    except (ValueError, TypeError):
+        pass
+    try:
+        return float(val)
+    except (ValueError, TypeError):
+        pass
+    return val
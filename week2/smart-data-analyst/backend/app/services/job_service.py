@@ -0,0 +1,256 @@
+"""
+后台导入任务服务
+- 大 CSV 导入提交到进程池执行，请求立即返回 job_id
+- 工作进程通过队列回报进度，主进程汇总为任务状态（已导入行数、rows/s、ETA）
+- 导入在单事务内完成，失败时整体回滚，临时文件总会被清理
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.config import settings
+from app.services import import_service
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+_FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# 内存中最多保留的任务数（超出后淘汰最早结束的任务）
+_MAX_JOBS = 200
+
+_jobs: dict[str, dict] = {}
+_lock = threading.Lock()
+
+_executor: ProcessPoolExecutor | None = None
+_progress_queue = None
+_reader_thread: threading.Thread | None = None
+
+# 工作进程内的进度队列（由 initializer 注入）
+_worker_queue = None
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# ==================== 工作进程侧 ====================
+
+
+def _init_worker(queue) -> None:
+    """工作进程初始化: 保存进度队列"""
+    global _worker_queue
+    _worker_queue = queue
+
+
+def _run_import_job(job_id: str, csv_path: str, table_name: str, db_path: str) -> dict:
+    """在工作进程中执行导入，结束后删除临时文件"""
+    def on_progress(rows_done: int, bytes_read: int) -> None:
+        _worker_queue.put((job_id, rows_done, bytes_read))
+
+    _worker_queue.put((job_id, 0, 0))
+    try:
+        with open(csv_path, "rb") as f:
+            return import_service.ingest_csv(
+                f, table_name, db_path=db_path, on_progress=on_progress
+            )
+    finally:
+        _remove_file(csv_path)
+
+
+# ==================== 主进程侧 ====================
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """懒加载进程池与进度读取线程"""
+    global _executor, _progress_queue, _reader_thread
+    if _executor is None:
+        # spawn: 避免在多线程的服务进程中 fork
+        ctx = multiprocessing.get_context("spawn")
+        _progress_queue = ctx.Queue()
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMPORT_WORKERS,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(_progress_queue,),
+        )
+        _reader_thread = threading.Thread(
+            target=_drain_progress, args=(_progress_queue,), daemon=True
+        )
+        _reader_thread.start()
+    return _executor
+
+
+def _drain_progress(queue) -> None:
+    """后台线程: 消费工作进程上报的进度"""
+    while True:
+        item = queue.get()
+        if item is None:
+            return
+        job_id, rows_done, bytes_read = item
+        with _lock:
+            job = _jobs.get(job_id)
+            if not job or job["status"] in _FINISHED_STATES:
+                continue
+            if job["status"] == JOB_PENDING:
+                job["status"] = JOB_RUNNING
+                job["started_at"] = time.time()
+            job["rows_done"] = rows_done
+            job["bytes_read"] = bytes_read
+
+
+def _on_job_done(job_id: str, future: Future) -> None:
+    """进程池回调: 记录最终结果"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return
+        job["finished_at"] = time.time()
+        if job["started_at"] is None:
+            job["started_at"] = job["finished_at"]
+        # 关闭进程池时排队中的任务被取消，此时 future.exception() 会抛出 CancelledError
+        exc = None if future.cancelled() else future.exception()
+        if future.cancelled() or exc is not None:
+            job["status"] = JOB_FAILED
+            job["error"] = "导入任务已取消（服务关闭或进程池重建）" if exc is None else str(exc)
+            # 任务被取消或工作进程异常退出时临时文件可能残留
+            _remove_file(job["csv_path"])
+        else:
+            result = future.result()
+            job["status"] = JOB_SUCCEEDED
+            job["rows_done"] = result["rows_inserted"]
+            job["bytes_read"] = job["total_bytes"]
+            job["result"] = result
+
+    if job["status"] == JOB_SUCCEEDED:
+        import_service.after_import(job["table_name"])
+
+
+def _evict_finished() -> None:
+    """超出上限时淘汰最早结束的任务（调用方持有锁）"""
+    if len(_jobs) <= _MAX_JOBS:
+        return
+    finished = sorted(
+        (j for j in _jobs.values() if j["status"] in _FINISHED_STATES),
+        key=lambda j: j["finished_at"],
+    )
+    for job in finished[: len(_jobs) - _MAX_JOBS]:
+        _jobs.pop(job["id"], None)
+
+
+def submit_import(csv_path: str, table_name: str) -> str:
+    """
+    提交后台导入任务
+
+    Args:
+        csv_path: 已落盘的临时 CSV 路径（任务结束后由工作进程删除）
+        table_name: 目标表名
+
+    Returns:
+        job_id
+    """
+    job_id = uuid.uuid4().hex
+    with _lock:
+        _jobs[job_id] = {
+            "id": job_id,
+            "table_name": table_name,
+            "csv_path": csv_path,
+            "status": JOB_PENDING,
+            "rows_done": 0,
+            "bytes_read": 0,
+            "total_bytes": os.path.getsize(csv_path),
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "result": None,
+        }
+        _evict_finished()
+
+    args = (_run_import_job, job_id, csv_path, table_name, settings.BUSINESS_DB_PATH)
+    try:
+        try:
+            future = _get_executor().submit(*args)
+        except BrokenProcessPool:
+            # 工作进程异常退出后进程池不可再用，重建一次
+            shutdown()
+            future = _get_executor().submit(*args)
+    except Exception:
+        # 没能提交: 任务不会被返回给调用方，直接丢弃并清理临时文件
+        with _lock:
+            _jobs.pop(job_id, None)
+        _remove_file(csv_path)
+        raise
+    future.add_done_callback(lambda f: _on_job_done(job_id, f))
+    return job_id
+
+
+def get_job(job_id: str) -> dict | None:
+    """
+    获取任务状态快照
+
+    Returns:
+        {
+            "id": "...", "table_name": "...", "status": "running",
+            "rows_done": 120000, "rows_per_second": 95000.0,
+            "progress": 0.42, "eta_seconds": 3.1,
+            "error": None, "result": None
+        }
+        任务不存在时返回 None
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return None
+        job = dict(job)
+
+    now = job["finished_at"] or time.time()
+    elapsed = now - job["started_at"] if job["started_at"] else 0.0
+    rows_per_second = job["rows_done"] / elapsed if elapsed > 0 else 0.0
+
+    progress = job["bytes_read"] / job["total_bytes"] if job["total_bytes"] else 0.0
+    progress = min(progress, 1.0)
+    eta = None
+    if job["status"] == JOB_RUNNING and progress > 0:
+        eta = round(elapsed * (1 - progress) / progress, 1)
+    elif job["status"] in _FINISHED_STATES:
+        eta = 0.0
+
+    return {
+        "id": job["id"],
+        "table_name": job["table_name"],
+        "status": job["status"],
+        "rows_done": job["rows_done"],
+        "rows_per_second": round(rows_per_second, 1),
+        "progress": round(progress, 4),
+        "eta_seconds": eta,
+        "error": job["error"],
+        "result": job["result"],
+    }
+
+
+def is_finished(job: dict) -> bool:
+    """任务是否已结束"""
+    return job["status"] in _FINISHED_STATES
+
+
+def shutdown() -> None:
+    """关闭进程池（应用关闭时调用）"""
+    global _executor, _progress_queue, _reader_thread
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _progress_queue.put(None)
+    _executor = None
+    _progress_queue = None
+    _reader_thread = None
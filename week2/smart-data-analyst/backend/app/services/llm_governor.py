@@ -0,0 +1,210 @@
+"""
+大模型调用并发治理
+- 并发上限: 同时进行的 LLM 调用不超过 LLM_MAX_CONCURRENCY
+- 等待队列: 超出并发上限的调用排队，队列长度不超过 LLM_QUEUE_SIZE，
+  队列已满时立即拒绝（聊天接口直接返回 503），排队超过 LLM_QUEUE_TIMEOUT 秒也拒绝
+- 会话公平: 每个会话一条 FIFO 队列，空出的名额在有等待的会话之间轮转分配，
+  单个会话的一连串调用不会挤占其他会话
+- token 速率: LLM_TOKENS_PER_MINUTE > 0 时按令牌桶限速，调用前预扣输入 token 估算值，
+  调用后补扣输出 token
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.config import settings
+
+# 当前请求所属的会话（由聊天接口设置，Agent 中间件等调用方无需逐层传递）
+current_session: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "llm_governor_session", default=None
+)
+
+# 无会话归属的调用（如后台任务）共用的排队键
+_ANONYMOUS = "-"
+
+
+class GovernorBusyError(Exception):
+    """LLM 调用排队已满或等待超时"""
+
+
+# 会话 ID -> 等待中的 Future 队列（有等待者的会话按轮转顺序排列）
+_waiters: "OrderedDict[str, deque[asyncio.Future]]" = OrderedDict()
+_waiting = 0
+_active = 0
+
+# 令牌桶
+_tokens: float | None = None
+_tokens_updated = 0.0
+
+_stats = {
+    "acquired": 0,
+    "queued": 0,
+    "rejected": 0,
+    "timeouts": 0,
+    "max_waiting": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+    "token_waits": 0,
+    "token_wait_seconds_total": 0.0,
+}
+
+
+def is_saturated() -> bool:
+    """等待队列是否已满（新的调用会被立即拒绝）"""
+    return _active >= settings.LLM_MAX_CONCURRENCY and _waiting >= settings.LLM_QUEUE_SIZE
+
+
+async def _acquire_slot(session_id: str) -> None:
+    """获取一个并发名额，必要时按会话排队"""
+    global _active, _waiting
+    if _active < settings.LLM_MAX_CONCURRENCY and not _waiting:
+        _active += 1
+        return
+    if _waiting >= settings.LLM_QUEUE_SIZE:
+        _stats["rejected"] += 1
+        raise GovernorBusyError("模型调用排队已满，请稍后重试")
+
+    future = asyncio.get_running_loop().create_future()
+    _waiters.setdefault(session_id, deque()).append(future)
+    _waiting += 1
+    _stats["queued"] += 1
+    _stats["max_waiting"] = max(_stats["max_waiting"], _waiting)
+    try:
+        await asyncio.wait_for(asyncio.shield(future), settings.LLM_QUEUE_TIMEOUT)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        if future.done() and not future.cancelled():
+            # 名额已分到手但调用方已放弃，转交给下一个等待者
+            _release_slot()
+        else:
+            future.cancel()
+            _remove_waiter(session_id, future)
+        if isinstance(e, asyncio.TimeoutError):
+            _stats["timeouts"] += 1
+            raise GovernorBusyError("模型调用排队超时，请稍后重试") from e
+        raise
+
+
+def _remove_waiter(session_id: str, future: asyncio.Future) -> None:
+    global _waiting
+    queue = _waiters.get(session_id)
+    if queue is None or future not in queue:
+        return
+    queue.remove(future)
+    _waiting -= 1
+    if not queue:
+        del _waiters[session_id]
+
+
+def _release_slot() -> None:
+    """归还名额: 直接交给轮转顺序中下一个会话的最早等待者"""
+    global _active, _waiting
+    while _waiters:
+        session_id, queue = next(iter(_waiters.items()))
+        future = queue.popleft()
+        _waiting -= 1
+        if queue:
+            _waiters.move_to_end(session_id)
+        else:
+            del _waiters[session_id]
+        if not future.done():
+            # 名额直接转移，_active 不变
+            future.set_result(None)
+            return
+    _active -= 1
+
+
+def _refill() -> float:
+    """按时间补充令牌，返回当前可用数量"""
+    global _tokens, _tokens_updated
+    capacity = settings.LLM_TOKENS_PER_MINUTE
+    now = time.monotonic()
+    if _tokens is None:
+        _tokens = float(capacity)
+    else:
+        _tokens = min(capacity, _tokens + (now - _tokens_updated) * capacity / 60)
+    _tokens_updated = now
+    return _tokens
+
+
+async def _acquire_tokens(tokens: int) -> None:
+    """从令牌桶预扣 tokens 个令牌，不足时等待补充"""
+    global _tokens
+    capacity = settings.LLM_TOKENS_PER_MINUTE
+    if capacity <= 0:
+        return
+    # 单次请求超过桶容量时按容量计，避免永远等不到
+    tokens = min(tokens, capacity)
+    start = None
+    while (available := _refill()) < tokens:
+        if start is None:
+            start = time.monotonic()
+            _stats["token_waits"] += 1
+        await asyncio.sleep((tokens - available) * 60 / capacity)
+    _tokens -= tokens
+    if start is not None:
+        _stats["token_wait_seconds_total"] += time.monotonic() - start
+
+
+def record_tokens(tokens: int) -> None:
+    """调用结束后补扣未预扣的 token（如输出 token），桶可暂时为负"""
+    global _tokens
+    if settings.LLM_TOKENS_PER_MINUTE <= 0 or tokens <= 0:
+        return
+    _refill()
+    _tokens -= tokens
+
+
+@asynccontextmanager
+async def slot(tokens: int = 0, session_id: str | None = None) -> AsyncIterator[None]:
+    """
+    在并发与速率限制内执行一次 LLM 调用
+
+        async with llm_governor.slot(estimated_input_tokens):
+            response = await llm.ainvoke(...)
+
+    Args:
+        tokens: 预扣的 token 数（输入 token 估算值）
+        session_id: 排队所属的会话，默认取 current_session
+
+    Raises:
+        GovernorBusyError: 等待队列已满或排队超时
+    """
+    session_id = session_id or current_session.get() or _ANONYMOUS
+    start = time.monotonic()
+    await _acquire_slot(session_id)
+    try:
+        await _acquire_tokens(tokens)
+        waited = time.monotonic() - start
+        _stats["acquired"] += 1
+        _stats["wait_seconds_total"] += waited
+        _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], waited)
+        yield
+    finally:
+        _release_slot()
+
+
+def get_stats() -> dict:
+    """并发、排队与等待时间统计"""
+    acquired = _stats["acquired"]
+    return {
+        "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+        "active": _active,
+        "waiting": _waiting,
+        "waiting_sessions": len(_waiters),
+        "queue_size": settings.LLM_QUEUE_SIZE,
+        "acquired": acquired,
+        "queued": _stats["queued"],
+        "rejected": _stats["rejected"],
+        "timeouts": _stats["timeouts"],
+        "max_waiting": _stats["max_waiting"],
+        "avg_wait_ms": round(_stats["wait_seconds_total"] / acquired * 1000, 1) if acquired else None,
+        "max_wait_ms": round(_stats["wait_seconds_max"] * 1000, 1),
+        "tokens_per_minute": settings.LLM_TOKENS_PER_MINUTE,
+        "tokens_available": round(_refill()) if settings.LLM_TOKENS_PER_MINUTE > 0 else None,
+        "token_waits": _stats["token_waits"],
+        "token_wait_seconds_total": round(_stats["token_wait_seconds_total"], 3),
+    }
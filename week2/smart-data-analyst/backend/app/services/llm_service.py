@@ -2,9 +2,12 @@
 大模型服务封装
 - ChatQwen (deepseek-v3.2 via DashScope) 初始化
 - get_llm() 工厂函数
+- estimate_tokens() 离线估算 token 数
 """
 
+import math
 import os
+import re
 
 from langchain_qwq import ChatQwen
 
@@ -14,6 +17,8 @@ from app.config import settings
 os.environ["DASHSCOPE_API_KEY"] = settings.DASHSCOPE_API_KEY
 os.environ["DASHSCOPE_API_BASE"] = settings.DASHSCOPE_API_BASE
 
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
 # 模块级 LLM 单例（避免重复创建）
 _llm_instance: ChatQwen | None = None
 _llm_streaming_instance: ChatQwen | None = None
@@ -64,3 +69,15 @@ def get_llm_with_tools(tools: list, streaming: bool = False) -> ChatQwen:
     """
     llm = get_llm(streaming=streaming)
     return llm.bind_tools(tools)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数（不依赖分词器文件，可离线使用）
+
+    经验值: 中文字符/全角标点约 1 token/字，其余字符约 4 字符/token。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
@@ -1,66 +1,237 @@
 """
 上下文记忆服务
-- 从数据库加载消息历史
+- window 模式: 只从数据库加载最近 MEMORY_WINDOW_SIZE 轮消息（走 (session_id, created_at) 索引）
+- token 模式: 在 MEMORY_TOKEN_BUDGET 内原样保留最近的对话，更早的对话折叠进
+  保存在会话上的滚动摘要；超出预算时才重新生成摘要
 - 转换为 LangChain Message 格式
-- 裁剪到配置的窗口大小
+- 每个会话的记忆窗口缓存在进程内 LRU 中，save_turn 增量追加，
+  命中时不访问数据库
 """
 
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 
 from app.config import settings
-from app.services import session_service
+from app.services import llm_governor, session_service, turn_writer
+from app.services.llm_service import estimate_tokens, get_llm
+
+logger = logging.getLogger(__name__)
+
+# 重新生成摘要时，最近对话只保留到预算的这个比例，
+# 为后续几轮留出余量，避免每轮都触发摘要
+_FOLD_TARGET_RATIO = 0.5
+
+# 生成摘要时每条消息最多取的字符数
+_SUMMARY_INPUT_MAX_CHARS = 1000
+
+_SUMMARY_PROMPT = """你负责压缩数据分析对话的历史记录。请把【已有摘要】和【新增对话】合并成一段新的摘要：
+- 保留用户关心的指标、涉及的表和字段、筛选条件、时间范围以及得到的关键结论和数字
+- 省略寒暄、图表配置和重复内容
+- 使用中文，不超过 {max_tokens} 字，只输出摘要本身"""
+
+# 会话 ID -> {"messages": 已裁剪好的 LangChain 消息窗口, "prompt_tokens", "history_tokens"}
+# （最近使用的在末尾；token 数只在 token 模式下使用）
+_windows: "OrderedDict[str, dict]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+# token 模式统计
+_token_stats = {
+    "requests": 0,
+    "summaries": 0,
+    "summary_failures": 0,
+    "history_tokens_total": 0,
+    "prompt_tokens_total": 0,
+}
+
+
+def _to_langchain(rows: list[tuple[str, str]]) -> list:
+    """(role, content) 转换为 LangChain 消息"""
+    lc_messages = []
+    for role, content in rows:
+        if role == "user":
+            lc_messages.append(HumanMessage(content=content))
+        elif role == "assistant":
+            lc_messages.append(AIMessage(content=content))
+    return lc_messages
+
+
+def _trim(lc_messages: list, window: int) -> list:
+    """裁剪: 只保留最近 window 轮（从倒数第 window 个 HumanMessage 开始）"""
+    if window <= 0:
+        return []
+    human_indices = [i for i, m in enumerate(lc_messages) if isinstance(m, HumanMessage)]
+    if len(human_indices) <= window:
+        return lc_messages
+    return lc_messages[human_indices[-window]:]
+
 
+def _remember(session_id: str, entry: dict) -> None:
+    """写入 LRU 缓存，超出上限时淘汰最久未使用的会话"""
+    if settings.MEMORY_CACHE_SIZE <= 0:
+        return
+    _windows[session_id] = entry
+    _windows.move_to_end(session_id)
+    while len(_windows) > settings.MEMORY_CACHE_SIZE:
+        _windows.popitem(last=False)
+        _stats["evictions"] += 1
 
-def load_memory(session_id: str) -> list:
+
+async def load_memory(session_id: str) -> list:
     """
     加载会话的消息历史，转换为 LangChain messages 格式。
 
-    只保留最近 MEMORY_WINDOW_SIZE 轮对话（每轮 = 1 条 user + N 条 assistant）。
+    window 模式只保留最近 MEMORY_WINDOW_SIZE 轮对话（每轮 = 1 条 user + N 条 assistant）；
+    token 模式返回 [滚动摘要 SystemMessage] + 预算内的最近对话。
 
     Args:
         session_id: 会话 ID
 
     Returns:
-        LangChain 消息列表 [HumanMessage, AIMessage, ...]
+        LangChain 消息列表 [SystemMessage?, HumanMessage, AIMessage, ...]
     """
-    db_messages = session_service.get_messages(session_id)
-
-    if not db_messages:
+    token_mode = settings.MEMORY_MODE == "token"
+    window = settings.MEMORY_WINDOW_SIZE
+    if not token_mode and window <= 0:
         return []
 
-    # 转换为 LangChain 消息格式
+    entry = _windows.get(session_id)
+    if entry is not None:
+        _windows.move_to_end(session_id)
+        _stats["hits"] += 1
+    else:
+        _stats["misses"] += 1
+        if token_mode:
+            entry = await _load_token_budgeted(session_id)
+        else:
+            rows = await session_service.get_recent_turns(session_id, window)
+            entry = {"messages": _trim(_to_langchain(rows), window)}
+        # 摘要折叠失败的结果不缓存，下次加载时重试
+        if not entry.get("fold_failed"):
+            _remember(session_id, entry)
+
+    if token_mode:
+        _record_tokens(entry["history_tokens"], entry["prompt_tokens"])
+    return list(entry["messages"])
+
+
+def _group_turns(rows: list[tuple[str, str, datetime]]) -> list[list[tuple[str, str, datetime]]]:
+    """按轮分组（每轮从一条 user 消息开始）"""
+    turns: list[list] = []
+    for row in rows:
+        if row[0] == "user" or not turns:
+            turns.append([row])
+        else:
+            turns[-1].append(row)
+    return turns
+
+
+def _fit(turn_tokens: list[int], limit: int) -> int:
+    """从最新一轮往前累加，返回预算内能原样保留的轮数"""
+    used, kept = 0, 0
+    for tokens in reversed(turn_tokens):
+        if used + tokens > limit:
+            break
+        used += tokens
+        kept += 1
+    return kept
+
+
+async def _load_token_budgeted(session_id: str) -> dict:
+    """
+    token 模式: 摘要 + 预算内的最近对话
+
+    只读取摘要覆盖范围之后的消息；最近对话超出预算时，把较早的几轮
+    （直到剩余部分不超过预算的一半）与旧摘要合并为新摘要并写回会话。
+    摘要失败时本次丢弃较早的几轮，并标记 fold_failed（调用方不缓存）。
+    """
+    summary, until, source_tokens = await session_service.get_memory_summary(session_id)
+    fold_failed = False
+    rows = await session_service.get_messages_after(session_id, until)
+    turns = _group_turns(rows)
+    turn_tokens = [sum(estimate_tokens(content) for _, content, _ in turn) for turn in turns]
+    history_tokens = source_tokens + sum(turn_tokens)
+
+    budget = settings.MEMORY_TOKEN_BUDGET
+    keep = _fit(turn_tokens, budget - estimate_tokens(summary or ""))
+    if keep < len(turns):
+        # 摘要已过期: 有对话被挤出预算
+        keep = _fit(turn_tokens, int(budget * _FOLD_TARGET_RATIO))
+        older = turns[: len(turns) - keep]
+        folded_tokens = sum(turn_tokens[: len(turns) - keep])
+        new_summary = await _summarize(summary, older)
+        if new_summary is not None:
+            summary = new_summary
+            source_tokens += folded_tokens
+            await session_service.update_memory_summary(
+                session_id, summary, older[-1][-1][2], source_tokens
+            )
+        else:
+            fold_failed = True
+
+    kept_turns = turns[len(turns) - keep:] if keep else []
     lc_messages = []
-    for msg in db_messages:
-        if msg.role == "user":
-            lc_messages.append(HumanMessage(content=msg.content))
-        elif msg.role == "assistant":
-            lc_messages.append(AIMessage(content=msg.content))
+    if summary:
+        lc_messages.append(SystemMessage(content=f"以下是本会话更早对话的摘要：\n{summary}"))
+    lc_messages.extend(
+        _to_langchain([(role, content) for turn in kept_turns for role, content, _ in turn])
+    )
+    prompt_tokens = sum(estimate_tokens(m.content) for m in lc_messages)
+    return {
+        "messages": lc_messages,
+        "prompt_tokens": prompt_tokens,
+        "history_tokens": history_tokens,
+        "fold_failed": fold_failed,
+    }
 
-    # 裁剪: 只保留最近 N 轮
-    window = settings.MEMORY_WINDOW_SIZE
-    if window <= 0:
-        return []
 
-    # 找到最后 N 个 HumanMessage 的位置
-    human_indices = [i for i, m in enumerate(lc_messages) if isinstance(m, HumanMessage)]
+async def _summarize(
+    previous: str | None, turns: list[list[tuple[str, str, datetime]]]
+) -> str | None:
+    """把旧摘要与若干轮对话合并为新摘要；失败时返回 None（本次只丢弃较早的对话，下次加载时重试）"""
+    lines = []
+    for turn in turns:
+        for role, content, _ in turn:
+            speaker = "用户" if role == "user" else "助手"
+            lines.append(f"{speaker}: {content[:_SUMMARY_INPUT_MAX_CHARS]}")
+    request = [
+        SystemMessage(content=_SUMMARY_PROMPT.format(max_tokens=settings.MEMORY_SUMMARY_MAX_TOKENS)),
+        HumanMessage(content=f"【已有摘要】\n{previous or '（无）'}\n\n【新增对话】\n" + "\n".join(lines)),
+    ]
+    try:
+        tokens = sum(estimate_tokens(m.content) for m in request)
+        async with llm_governor.slot(tokens):
+            response = await get_llm(streaming=False).ainvoke(request)
+            llm_governor.record_tokens(estimate_tokens(str(response.content)))
+    except Exception:
+        logger.exception("生成对话摘要失败")
+        _token_stats["summary_failures"] += 1
+        return None
+    _token_stats["summaries"] += 1
+    return str(response.content).strip()
 
-    if len(human_indices) <= window:
-        return lc_messages
 
-    # 从倒数第 window 个 HumanMessage 开始截取
-    start_idx = human_indices[-window]
-    return lc_messages[start_idx:]
+def _record_tokens(history_tokens: int, prompt_tokens: int) -> None:
+    _token_stats["requests"] += 1
+    _token_stats["history_tokens_total"] += history_tokens
+    _token_stats["prompt_tokens_total"] += prompt_tokens
 
 
-def save_turn(
+async def save_turn(
     session_id: str,
     user_message: str,
     assistant_content: str,
     sql_query: str | None = None,
     chart_config: str | None = None,
+    status: str = "complete",
 ) -> None:
     """
-    保存一轮完整对话（用户消息 + 助手回复）
+    保存一轮完整对话（用户消息 + 助手回复 + 默认标题更新，同一事务）
+
+    开启 TURN_WRITE_BEHIND 时由后台任务批量提交；缓存的记忆窗口立即更新，
+    下一轮问答不必等待写入完成。
 
     Args:
         session_id: 会话 ID
@@ -68,22 +239,58 @@ def save_turn(
         assistant_content: 助手回复文本
         sql_query: 执行的 SQL（可选）
         chart_config: 图表配置 JSON 字符串（可选）
+        status: complete / cancelled（客户端断开时保存的部分回答）
     """
-    # 保存用户消息
-    session_service.save_message(
-        session_id=session_id,
-        role="user",
-        content=user_message,
+    # 时间戳在此确定，延迟写入时顺序不变
+    turn = session_service.make_turn(
+        session_id, user_message, assistant_content, sql_query, chart_config, status
     )
 
-    # 保存助手回复
-    session_service.save_message(
-        session_id=session_id,
-        role="assistant",
-        content=assistant_content,
-        sql_query=sql_query,
-        chart_config=chart_config,
-    )
+    # 增量更新缓存的记忆窗口（未缓存则等下次加载时从数据库读取）
+    entry = _windows.get(session_id)
+    if entry is not None:
+        updated = entry["messages"] + [
+            HumanMessage(content=user_message), AIMessage(content=assistant_content)
+        ]
+        if settings.MEMORY_MODE == "token":
+            turn_tokens = estimate_tokens(user_message) + estimate_tokens(assistant_content)
+            if entry["prompt_tokens"] + turn_tokens > settings.MEMORY_TOKEN_BUDGET:
+                # 超出预算: 下次加载时重新折叠摘要
+                del _windows[session_id]
+            else:
+                entry["messages"] = updated
+                entry["prompt_tokens"] += turn_tokens
+                entry["history_tokens"] += turn_tokens
+        else:
+            entry["messages"] = _trim(updated, settings.MEMORY_WINDOW_SIZE)
 
-    # 自动更新会话标题
-    session_service.update_session_title_if_default(session_id, user_message)
+    # 单事务写入（开启 write-behind 时只入队）。缓存先于写入更新:
+    # 写入期间调用方被取消时，写入仍会完成，缓存也不会漏掉这一轮
+    await turn_writer.submit(turn)
+
+
+def forget(session_id: str) -> None:
+    """丢弃会话的缓存窗口（删除会话时调用）"""
+    _windows.pop(session_id, None)
+
+
+def get_stats() -> dict:
+    """
+    缓存命中统计；token 模式下另含每次请求的历史 token 数、实际送入的 token 数
+    与节省的 token 数
+    """
+    total = _stats["hits"] + _stats["misses"]
+    requests = _token_stats["requests"]
+    saved = _token_stats["history_tokens_total"] - _token_stats["prompt_tokens_total"]
+    return {
+        **_stats,
+        "size": len(_windows),
+        "hit_rate": round(_stats["hits"] / total, 4) if total else 0.0,
+        "mode": settings.MEMORY_MODE,
+        "token_budget": {
+            **_token_stats,
+            "tokens_saved_total": saved,
+            "avg_prompt_tokens": round(_token_stats["prompt_tokens_total"] / requests, 1) if requests else None,
+            "avg_tokens_saved": round(saved / requests, 1) if requests else None,
+        },
+    }
@@ -0,0 +1,85 @@
+"""
+SQL 查询结果缓存
+- LRU + TTL，键为 (规范化 SQL, 业务库数据版本)
+- 数据版本变化（上传导入 / 外部写入）后旧结果自然失效，上传后也会主动清空
+- 命中/未命中计数供 /api/metrics 查看
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from app.config import settings
+
+# 按字符串字面量/引号标识符切分，只规范化引号外的部分
+_QUOTED_PATTERN = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`)""")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple, tuple[float, Any]]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "clears": 0}
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    规范化 SQL 文本: 折叠引号外的空白、去掉结尾分号、关键字统一小写。
+    引号内的内容保持原样，避免改变查询语义。
+    """
+    parts = _QUOTED_PATTERN.split(sql.strip().rstrip(";").strip())
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2 == 1:
+            normalized.append(part)
+        else:
+            normalized.append(_WHITESPACE_PATTERN.sub(" ", part).lower())
+    return "".join(normalized).strip()
+
+
+def get(sql: str, data_version) -> Any | None:
+    """查询缓存，未命中或已过期返回 None"""
+    key = (normalize_sql(sql), data_version)
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry[0] < now:
+            if entry is not None:
+                del _entries[key]
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[1]
+
+
+def put(sql: str, data_version, result: Any) -> None:
+    """写入缓存，超出容量时淘汰最久未使用的条目"""
+    if settings.QUERY_CACHE_SIZE <= 0:
+        return
+    key = (normalize_sql(sql), data_version)
+    expires_at = time.monotonic() + settings.QUERY_CACHE_TTL
+    with _lock:
+        _entries[key] = (expires_at, result)
+        _entries.move_to_end(key)
+        while len(_entries) > settings.QUERY_CACHE_SIZE:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def clear() -> None:
+    """清空缓存（上传导入后调用）"""
+    with _lock:
+        _entries.clear()
+        _stats["clears"] += 1
+
+
+def get_stats() -> dict:
+    """命中统计"""
+    with _lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "size": len(_entries),
+            "hit_rate": round(_stats["hits"] / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,253 @@
+"""
+Agent SQL 执行器
+- 直接在业务库上执行查询，列名取自 cursor.description
+- 沙箱: mode=ro 只读连接 + authorizer 只放行读操作；progress_handler 检查截止时间
+  与取消标记，超时/取消时中止查询；结果超过 SQL_MAX_ROWS 行时停止读取并截断
+- 出错时抛出带错误类别与改写提示的 QueryError，Agent 据此改写 SQL
+- 结果为带列类型的结构化数据，可直接作为 SSE data 事件内容
+- 同时生成给 LLM 阅读的紧凑文本
+"""
+
+import base64
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from app.config import settings
+
+# 推断列类型时最多查看的行数
+_TYPE_SAMPLE_ROWS = 100
+
+# 给 LLM 的文本中单个值的最大长度（与 SQLDatabase 的截断行为一致）
+_LLM_VALUE_MAX_LEN = 100
+
+_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_DATETIME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?")
+
+
+# 允许的授权动作: 读表、SELECT、函数调用、递归 CTE
+_ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+}
+
+# 允许的 PRAGMA（均为只能查询、不能赋值的结构信息类 PRAGMA）
+_ALLOWED_PRAGMAS = {
+    "table_info", "table_xinfo", "table_list", "index_list", "index_info", "foreign_key_list",
+}
+
+# 每执行多少条虚拟机指令检查一次截止时间/取消标记
+_PROGRESS_STEPS = 1000
+
+_HINTS = {
+    "timeout": "查询超时，请缩小数据范围（WHERE 过滤、先聚合再 JOIN）、避免笛卡尔积，或加 LIMIT",
+    "cancelled": "查询已被取消",
+    "denied": "只允许只读查询（SELECT / WITH），不能修改数据或库结构",
+    "memory": "结果或中间数据过大，请先聚合、减少返回的列或加 LIMIT",
+    "busy": "业务库正忙（如正在导入数据），请稍后原样重试该查询",
+    "sql_error": "请根据报错修正 SQL，可先用 sql_db_query_checker 校验",
+}
+
+
+class QueryError(Exception):
+    """
+    SQL 执行失败
+
+    Attributes:
+        code: 错误类别 timeout / cancelled / denied / memory / busy / sql_error
+        hint: 给 Agent 的改写提示
+    """
+
+    def __init__(self, message: str, code: str = "sql_error"):
+        super().__init__(message)
+        self.code = code
+        self.hint = _HINTS.get(code, "")
+
+    def to_llm(self) -> str:
+        """给 LLM 阅读的结构化错误"""
+        return "Error: " + json.dumps(
+            {"error": self.code, "message": str(self), "hint": self.hint}, ensure_ascii=False
+        )
+
+
+def _authorize(action, arg1, arg2, db_name, trigger) -> int:
+    """authorizer: 只放行读操作"""
+    if action in _ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_PRAGMA and (arg1 or "").lower() in _ALLOWED_PRAGMAS:
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+def connect(db_path: str | None = None) -> sqlite3.Connection:
+    """只读连接业务数据库（只读 URI + authorizer）"""
+    conn = sqlite3.connect(
+        f"file:{db_path or settings.BUSINESS_DB_PATH}?mode=ro",
+        uri=True,
+        timeout=settings.BUSINESS_DB_BUSY_TIMEOUT,
+    )
+    conn.set_authorizer(_authorize)
+    return conn
+
+
+def run_query(
+    sql: str,
+    timeout: float | None = None,
+    max_rows: int | None = None,
+    cancel: threading.Event | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> dict:
+    """
+    在沙箱中执行 SQL 并返回结构化结果
+
+    Args:
+        sql: SQL 语句
+        timeout: 超时秒数，默认取 SQL_QUERY_TIMEOUT（<= 0 表示不限）
+        max_rows: 最多读取的行数，默认取 SQL_MAX_ROWS
+        cancel: 取消标记（任何带 is_set() 的对象），置位后查询在下一次进度检查时中止
+        conn: 复用的连接（须由 connect() 创建，调用后不关闭）；None 时临时打开
+
+    Returns:
+        {
+            "columns": ["name", "total"],
+            "column_types": ["text", "real"],
+            "rows": [["笔记本电脑", 59990.0], ...],
+            "row_count": 2,
+            "truncated": false,       # 超过 max_rows 时为 true，rows 只含前 max_rows 行
+            "sql": "SELECT ..."
+        }
+
+    Raises:
+        QueryError: SQL 执行失败 / 被拒绝 / 超时 / 被取消
+    """
+    timeout = settings.SQL_QUERY_TIMEOUT if timeout is None else timeout
+    max_rows = max_rows or settings.SQL_MAX_ROWS
+    deadline = time.monotonic() + timeout if timeout > 0 else None
+    aborted = []
+
+    def _progress() -> int:
+        if cancel is not None and cancel.is_set():
+            aborted.append("cancelled")
+            return 1
+        if deadline is not None and time.monotonic() > deadline:
+            aborted.append("timeout")
+            return 1
+        return 0
+
+    owned = conn is None
+    if owned:
+        conn = connect()
+    conn.set_progress_handler(_progress, _PROGRESS_STEPS)
+    try:
+        cursor = conn.execute(sql)
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+        rows = [list(row) for row in cursor.fetchmany(max_rows + 1)]
+        cursor.close()
+    except sqlite3.Error as e:
+        raise _to_query_error(e, aborted, timeout) from e
+    except MemoryError as e:
+        raise QueryError("查询占用内存超出上限", "memory") from e
+    finally:
+        if owned:
+            conn.close()
+        else:
+            conn.set_progress_handler(None, 0)
+
+    truncated = len(rows) > max_rows
+    if truncated:
+        rows = rows[:max_rows]
+    _encode_blobs(rows)
+    return {
+        "columns": columns,
+        "column_types": _infer_column_types(columns, rows),
+        "rows": rows,
+        "row_count": len(rows),
+        "truncated": truncated,
+        "sql": sql,
+    }
+
+
+def _to_query_error(error: sqlite3.Error, aborted: list[str], timeout: float) -> QueryError:
+    if aborted and aborted[0] == "timeout":
+        return QueryError(f"查询超过 {timeout:g} 秒被中止", "timeout")
+    if aborted:
+        return QueryError("查询已被取消", "cancelled")
+    message = str(error)
+    if "not authorized" in message or "readonly" in message:
+        return QueryError(message, "denied")
+    if "out of memory" in message:
+        return QueryError(message, "memory")
+    if "is locked" in message or "is busy" in message:
+        return QueryError(message, "busy")
+    return QueryError(message)
+
+
+def _encode_blobs(rows: list[list]) -> None:
+    """BLOB 转 base64 字符串，保证结果可 JSON 序列化"""
+    for row in rows:
+        for i, value in enumerate(row):
+            if isinstance(value, bytes):
+                row[i] = base64.b64encode(value).decode("ascii")
+
+
+def _infer_column_types(columns: list[str], rows: list[list]) -> list[str]:
+    """
+    按前若干行推断列类型:
+    integer / real / text / date / datetime / null（全为 NULL）/ mixed
+    """
+    sample = rows[:_TYPE_SAMPLE_ROWS]
+    types = []
+    for i in range(len(columns)):
+        seen = {_value_type(row[i]) for row in sample if row[i] is not None}
+        if not seen:
+            types.append("null")
+        elif len(seen) == 1:
+            types.append(seen.pop())
+        elif seen == {"integer", "real"}:
+            types.append("real")
+        else:
+            types.append("mixed")
+    return types
+
+
+def _value_type(value) -> str:
+    if isinstance(value, bool) or isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "real"
+    if isinstance(value, str):
+        if _DATE_PATTERN.match(value):
+            return "date"
+        if _DATETIME_PATTERN.match(value):
+            return "datetime"
+    return "text"
+
+
+def format_for_llm(result: dict) -> str:
+    """
+    生成给 LLM 阅读的结果文本
+
+    格式:
+        Columns: name, total
+        [('笔记本电脑', 59990.0), ...]
+    """
+    if not result["rows"]:
+        return f"Columns: {', '.join(result['columns'])}\n[]"
+    rows = [
+        tuple(
+            v[:_LLM_VALUE_MAX_LEN] if isinstance(v, str) else v
+            for v in row
+        )
+        for row in result["rows"]
+    ]
+    text = f"Columns: {', '.join(result['columns'])}\n{rows}"
+    if result.get("truncated"):
+        text += (
+            f"\n(结果超过 {result['row_count']} 行，已截断；"
+            "如需完整结果请先聚合或加 WHERE/LIMIT)"
+        )
+    return text
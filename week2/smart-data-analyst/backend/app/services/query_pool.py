@@ -0,0 +1,308 @@
+"""
+Agent SQL 执行后端
+- inprocess: 在 API 进程内直接执行（默认）
+- process:   提交到工作进程池执行，重查询不占用 API 进程的 GIL 和内存
+  - 每个工作进程启动时打开并保持一个到业务库的只读连接（沙箱规则与 query_executor 相同）
+  - 工作进程用 resource.setrlimit 限制地址空间，超出时只影响本次查询（返回 memory 错误）
+  - 结果以列式 marshal 字节串返回，比逐行 pickle 更紧凑、更快
+  - 取消: 主进程把查询编号写入共享数组，工作进程的 progress_handler 发现后中止查询
+- 当前请求的取消标记通过 current_cancel 传给工具（工具在线程池中执行，上下文随之复制）
+"""
+
+import contextvars
+import itertools
+import logging
+import marshal
+import multiprocessing
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from app.config import settings
+from app.services import query_executor
+from app.services.query_executor import QueryError
+
+logger = logging.getLogger(__name__)
+
+# 共享取消数组的槽位数（同时进行的查询数远小于此值）
+_CANCEL_SLOTS = 256
+
+# 等待结果时检查取消标记的间隔（秒）
+_CANCEL_POLL_INTERVAL = 0.1
+
+# 当前请求的取消标记（由聊天接口设置，客户端断开时置位）
+current_cancel: contextvars.ContextVar[threading.Event | None] = contextvars.ContextVar(
+    "query_pool_cancel", default=None
+)
+
+_executor: ProcessPoolExecutor | None = None
+_cancelled = None
+_lock = threading.Lock()
+_query_ids = itertools.count(1)
+
+_stats = {"queries": 0, "errors": 0, "cancelled": 0, "pool_restarts": 0, "bytes_received": 0}
+
+# 取消标记 -> 正在执行的查询数（判断客户端断开时是否有查询在执行）
+_running: dict[int, int] = {}
+_running_lock = threading.Lock()
+
+# ==================== 工作进程侧 ====================
+
+# 工作进程内: 共享取消数组、复用的只读连接及其对应的库路径
+_worker_cancelled = None
+_worker_conn: sqlite3.Connection | None = None
+_worker_db_path: str | None = None
+
+
+class _SharedCancel:
+    """工作进程内的取消标记: 共享数组对应槽位等于本查询编号时视为已取消"""
+
+    def __init__(self, query_id: int):
+        self._query_id = query_id
+
+    def is_set(self) -> bool:
+        return _worker_cancelled[self._query_id % _CANCEL_SLOTS] == self._query_id
+
+
+def _init_worker(cancelled, memory_mb: int, db_path: str) -> None:
+    """工作进程初始化: 保存共享取消数组，设置地址空间上限，预先打开只读连接"""
+    global _worker_cancelled
+    _worker_cancelled = cancelled
+    if memory_mb > 0:
+        try:
+            import resource
+        except ImportError:
+            # Windows 没有 resource 模块，不限制
+            resource = None
+        if resource is not None:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    # 预热失败（如业务库尚未创建）不影响进程启动，第一次查询时再打开
+    try:
+        _get_worker_conn(db_path)
+    except sqlite3.Error as e:
+        logger.warning("工作进程预热连接失败: %s", e)
+
+
+def _get_worker_conn(db_path: str) -> sqlite3.Connection:
+    """工作进程内复用的只读连接（库路径变化时重新打开）"""
+    global _worker_conn, _worker_db_path
+    if _worker_conn is None or _worker_db_path != db_path:
+        if _worker_conn is not None:
+            _worker_conn.close()
+        _worker_conn = query_executor.connect(db_path)
+        _worker_db_path = db_path
+    return _worker_conn
+
+
+def _noop() -> None:
+    """空任务，只用于让进程池拉起工作进程"""
+
+
+def _run_in_worker(query_id: int, sql: str, db_path: str, timeout: float, max_rows: int) -> bytes:
+    """
+    在工作进程中执行查询
+
+    Returns:
+        marshal 字节串:
+            成功 ("ok", columns, column_types, 按列存放的取值, truncated)
+            失败 ("error", message, code)
+    """
+    try:
+        return _execute(query_id, sql, db_path, timeout, max_rows)
+    except QueryError as e:
+        return marshal.dumps(("error", str(e), e.code))
+    except sqlite3.Error as e:
+        return marshal.dumps(("error", str(e), "sql_error"))
+    except MemoryError:
+        # 结果集在 _execute 返回时已释放，这里有足够的内存构造错误信息
+        return marshal.dumps(("error", "查询占用内存超出上限", "memory"))
+
+
+def _execute(query_id: int, sql: str, db_path: str, timeout: float, max_rows: int) -> bytes:
+    result = query_executor.run_query(
+        sql,
+        timeout=timeout,
+        max_rows=max_rows,
+        cancel=_SharedCancel(query_id),
+        conn=_get_worker_conn(db_path),
+    )
+    rows = result["rows"]
+    columnar = [[row[i] for row in rows] for i in range(len(result["columns"]))]
+    return marshal.dumps(
+        ("ok", result["columns"], result["column_types"], columnar, result["truncated"])
+    )
+
+
+# ==================== 主进程侧 ====================
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """懒加载进程池（调用方持有锁）"""
+    global _executor, _cancelled
+    if _executor is None:
+        # spawn: 避免在多线程的服务进程中 fork
+        ctx = multiprocessing.get_context("spawn")
+        _cancelled = ctx.Array("q", _CANCEL_SLOTS, lock=False)
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.SQL_WORKERS,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(_cancelled, settings.SQL_WORKER_MEMORY_MB, settings.BUSINESS_DB_PATH),
+        )
+    return _executor
+
+
+def start() -> None:
+    """
+    启动进程池（应用启动时调用，仅 process 模式）
+
+    连接在 _init_worker 中预热，每个工作进程（包括重建后的）都会执行；这里提交的
+    空任务只是尽量提前拉起工作进程，不保证每个进程都分到一个
+    """
+    if settings.SQL_EXECUTION_BACKEND != "process":
+        return
+    with _lock:
+        executor = _get_executor()
+    for _ in range(settings.SQL_WORKERS):
+        executor.submit(_noop)
+
+
+def _shutdown_locked() -> None:
+    """关闭进程池（调用方持有锁）"""
+    global _executor, _cancelled
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    _cancelled = None
+
+
+def shutdown() -> None:
+    """关闭进程池（应用关闭时调用）"""
+    with _lock:
+        _shutdown_locked()
+
+
+def _restart_locked(broken: ProcessPoolExecutor) -> None:
+    """
+    工作进程异常退出（如超出内存上限被杀）后重建进程池（调用方持有锁）
+
+    只有当前进程池仍是出错的那个时才关闭，多个查询同时发现异常时只重建一次
+    """
+    if _executor is broken:
+        _shutdown_locked()
+        _stats["pool_restarts"] += 1
+
+
+def _track(cancel: threading.Event | None, delta: int) -> None:
+    if cancel is None:
+        return
+    with _running_lock:
+        count = _running.get(id(cancel), 0) + delta
+        if count > 0:
+            _running[id(cancel)] = count
+        else:
+            _running.pop(id(cancel), None)
+
+
+def is_running(cancel: threading.Event) -> bool:
+    """是否有使用该取消标记的查询正在执行"""
+    with _running_lock:
+        return id(cancel) in _running
+
+
+def run_query(sql: str, cancel: threading.Event | None = None) -> dict:
+    """
+    按 SQL_EXECUTION_BACKEND 执行查询，返回值与 query_executor.run_query 相同
+
+    Args:
+        sql: SQL 语句
+        cancel: 取消标记，置位后查询尽快中止
+
+    Raises:
+        QueryError: SQL 执行失败 / 被拒绝 / 超时 / 被取消 / 工作进程异常退出
+    """
+    _track(cancel, 1)
+    try:
+        return _run_query(sql, cancel)
+    finally:
+        _track(cancel, -1)
+
+
+def _run_query(sql: str, cancel: threading.Event | None) -> dict:
+    if settings.SQL_EXECUTION_BACKEND != "process":
+        _stats["queries"] += 1
+        try:
+            return query_executor.run_query(sql, cancel=cancel)
+        except QueryError as e:
+            _stats["errors"] += 1
+            if e.code == "cancelled":
+                _stats["cancelled"] += 1
+            raise
+
+    query_id = next(_query_ids)
+    args = (
+        _run_in_worker, query_id, sql, settings.BUSINESS_DB_PATH,
+        settings.SQL_QUERY_TIMEOUT, settings.SQL_MAX_ROWS,
+    )
+    with _lock:
+        executor = _get_executor()
+        cancelled = _cancelled
+    try:
+        future = executor.submit(*args)
+    except BrokenProcessPool:
+        with _lock:
+            _restart_locked(executor)
+            executor = _get_executor()
+            cancelled = _cancelled
+        future = executor.submit(*args)
+
+    _stats["queries"] += 1
+    while True:
+        try:
+            payload = future.result(timeout=_CANCEL_POLL_INTERVAL)
+            break
+        except FutureTimeoutError:
+            if cancel is not None and cancel.is_set():
+                cancelled[query_id % _CANCEL_SLOTS] = query_id
+                if future.cancel():
+                    # 还在排队，没有开始执行
+                    _stats["cancelled"] += 1
+                    raise QueryError("查询已被取消", "cancelled")
+        except BrokenProcessPool as e:
+            logger.warning("执行查询的工作进程异常退出，重建进程池")
+            with _lock:
+                _restart_locked(executor)
+            _stats["errors"] += 1
+            raise QueryError("执行查询的工作进程异常退出（可能超出内存上限）", "memory") from e
+
+    _stats["bytes_received"] += len(payload)
+    message = marshal.loads(payload)
+    if message[0] == "error":
+        _, text, code = message
+        _stats["errors"] += 1
+        if code == "cancelled":
+            _stats["cancelled"] += 1
+        raise QueryError(text, code)
+
+    _, columns, column_types, columnar, truncated = message
+    rows = [list(row) for row in zip(*columnar)] if columnar else []
+    return {
+        "columns": columns,
+        "column_types": column_types,
+        "rows": rows,
+        "row_count": len(rows),
+        "truncated": truncated,
+        "sql": sql,
+    }
+
+
+def get_stats() -> dict:
+    """执行后端统计"""
+    return {
+        **_stats,
+        "backend": settings.SQL_EXECUTION_BACKEND,
+        "workers": settings.SQL_WORKERS if _executor is not None else 0,
+    }
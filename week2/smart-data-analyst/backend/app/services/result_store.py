@@ -0,0 +1,171 @@
+"""
+查询结果句柄
+- Agent 的完整查询结果保存在服务端，按 result_id 索引，带 TTL 与 LRU 上限
+- SSE data 事件只携带首页行 + result_id，避免大结果变成单个数 MB 的 JSON 帧
+- 其余分页与排序切片由 GET /api/results/{result_id} 按需拉取
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.config import settings
+
+SORT_ORDERS = ("asc", "desc")
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, dict]" = OrderedDict()
+_stats = {"stores": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+
+class ResultNotFoundError(KeyError):
+    """结果句柄不存在或已过期"""
+
+
+class InvalidSortError(ValueError):
+    """排序列或排序方向无效"""
+
+
+def put(result: dict) -> str:
+    """
+    保存一份完整查询结果
+
+    Args:
+        result: query_executor.run_query 的返回值
+
+    Returns:
+        result_id
+    """
+    result_id = uuid.uuid4().hex
+    now = time.time()
+    with _lock:
+        _entries[result_id] = {
+            "result": result,
+            "expires_at": now + settings.RESULT_STORE_TTL,
+            # 排序后的行下标缓存: (列下标, 是否降序) -> [行下标]
+            "orders": {},
+        }
+        _stats["stores"] += 1
+        while len(_entries) > max(settings.RESULT_STORE_SIZE, 1):
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+    return result_id
+
+
+def _get_entry(result_id: str) -> dict:
+    """取出条目并刷新 LRU 顺序（调用方持有锁）"""
+    entry = _entries.get(result_id)
+    if entry is None or entry["expires_at"] < time.time():
+        if entry is not None:
+            del _entries[result_id]
+        _stats["misses"] += 1
+        raise ResultNotFoundError(result_id)
+    _entries.move_to_end(result_id)
+    _stats["hits"] += 1
+    return entry
+
+
+def _sort_key(value) -> tuple:
+    """数值排在文本之前，避免混合类型比较出错（NULL 单独处理）"""
+    if isinstance(value, (int, float)):
+        return (0, value)
+    return (1, str(value))
+
+
+def _sorted_order(entry: dict, col_idx: int, descending: bool) -> list[int]:
+    """按指定列排序后的行下标，NULL 始终排在最后（调用方持有锁）"""
+    key = (col_idx, descending)
+    order = entry["orders"].get(key)
+    if order is None:
+        rows = entry["result"]["rows"]
+        non_null = [i for i, row in enumerate(rows) if row[col_idx] is not None]
+        nulls = [i for i, row in enumerate(rows) if row[col_idx] is None]
+        non_null.sort(key=lambda i: _sort_key(rows[i][col_idx]), reverse=descending)
+        order = non_null + nulls
+        entry["orders"][key] = order
+    return order
+
+
+def get_page(
+    result_id: str,
+    offset: int = 0,
+    limit: int = 100,
+    sort_by: str | None = None,
+    order: str = "asc",
+) -> dict:
+    """
+    读取结果的一页（可按列排序）
+
+    Args:
+        result_id: put 返回的句柄
+        offset: 起始行（排序后）
+        limit: 行数
+        sort_by: 排序列名，None 表示保持 SQL 原始顺序
+        order: "asc" 或 "desc"
+
+    Returns:
+        {
+            "result_id": "...", "columns": [...], "column_types": [...],
+            "rows": [...], "row_count": 10000, "offset": 0, "has_more": true,
+            "sql": "SELECT ..."
+        }
+
+    Raises:
+        ResultNotFoundError: 句柄不存在或已过期
+        InvalidSortError: 排序列或方向无效
+    """
+    if order not in SORT_ORDERS:
+        raise InvalidSortError(f"排序方向只能是 {', '.join(SORT_ORDERS)}")
+
+    with _lock:
+        entry = _get_entry(result_id)
+        result = entry["result"]
+        rows = result["rows"]
+        if sort_by is None:
+            page = rows[offset:offset + limit]
+        else:
+            if sort_by not in result["columns"]:
+                raise InvalidSortError(f"列 '{sort_by}' 不存在")
+            col_idx = result["columns"].index(sort_by)
+            indices = _sorted_order(entry, col_idx, order == "desc")
+            page = [rows[i] for i in indices[offset:offset + limit]]
+
+    return {
+        "result_id": result_id,
+        "columns": result["columns"],
+        "column_types": result.get("column_types", []),
+        "rows": page,
+        "row_count": len(rows),
+        "offset": offset,
+        "has_more": offset + len(page) < len(rows),
+        "sql": result.get("sql", ""),
+    }
+
+
+def to_data_event(result: dict) -> dict:
+    """
+    把完整结果转为 SSE data 事件: 保存到服务端，只携带首页
+
+    事件内容与原 data 事件兼容（columns / rows / sql），另含
+    result_id / row_count / has_more 供前端继续分页。
+    """
+    result_id = put(result)
+    first_rows = result["rows"][: settings.RESULT_FIRST_PAGE_ROWS]
+    return {
+        "type": "data",
+        "content": {
+            **result,
+            "rows": first_rows,
+            "row_count": len(result["rows"]),
+            "result_id": result_id,
+            "offset": 0,
+            "has_more": len(first_rows) < len(result["rows"]),
+        },
+    }
+
+
+def get_stats() -> dict:
+    """命中统计"""
+    with _lock:
+        return {**_stats, "size": len(_entries)}
@@ -0,0 +1,203 @@
+"""
+业务库结构摘要
+- 为每张表生成紧凑的结构描述（列、类型、主键/外键、少量示例值、行数），
+  直接嵌入 Agent 的系统提示词，省去 sql_db_list_tables / sql_db_schema 的往返
+- 按表缓存: 表结构指纹变化时只重建 DDL / 行数有变化的表，
+  上传导入后把对应表标记为待重建
+"""
+
+import sqlite3
+import threading
+
+from app.config import settings
+from app.services import catalog_service
+
+# 示例值只从表头部若干行中取，避免大表全表扫描
+_SAMPLE_SCAN_ROWS = 1000
+
+# 单个示例值的最大长度
+_SAMPLE_VALUE_MAX_LEN = 20
+
+_NUMERIC_TYPES = ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC")
+
+_lock = threading.Lock()
+
+# 缓存对应的表结构指纹，以及每张表的摘要条目:
+# {表名: {"text", "columns", "samples", "refs", "signature"}}
+_fingerprint: str | None = None
+_tables: dict[str, dict] = {}
+
+# 待重建的表（上传导入后标记）
+_dirty: set[str] = set()
+
+# 摘要内容每变化一次加一，供检索索引判断是否需要同步
+_generation = 0
+
+
+def _connect() -> sqlite3.Connection:
+    """只读连接业务数据库"""
+    return sqlite3.connect(
+        f"file:{settings.BUSINESS_DB_PATH}?mode=ro", uri=True,
+        timeout=settings.BUSINESS_DB_BUSY_TIMEOUT,
+    )
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _is_numeric(col_type: str) -> bool:
+    col_type = (col_type or "").upper()
+    return any(t in col_type for t in _NUMERIC_TYPES)
+
+
+def _foreign_keys(conn: sqlite3.Connection, table_name: str) -> dict[str, str]:
+    """列名 -> "目标表.目标列" """
+    rows = conn.execute(f"PRAGMA foreign_key_list({_quote(table_name)})").fetchall()
+    # (id, seq, table, from, to, on_update, on_delete, match)
+    return {row[3]: f"{row[2]}.{row[4] or 'rowid'}" for row in rows}
+
+
+def _column_samples(conn: sqlite3.Connection, table: dict) -> tuple[list[str], list[list[str]]]:
+    """
+    每列的示例描述与示例取值
+
+    Returns:
+        (描述列表, 文本取值列表): 数值列描述为取值范围，其他列为若干不同取值
+    """
+    columns = table["columns"]
+    select_cols = ", ".join(_quote(c["name"]) for c in columns)
+    rows = conn.execute(
+        f"SELECT {select_cols} FROM {_quote(table['name'])} LIMIT ?",
+        (_SAMPLE_SCAN_ROWS,),
+    ).fetchall()
+
+    descriptions, values_by_col = [], []
+    for idx, col in enumerate(columns):
+        values = [row[idx] for row in rows if row[idx] is not None]
+        if not values:
+            descriptions.append("")
+            values_by_col.append([])
+        elif _is_numeric(col["type"]) and all(isinstance(v, (int, float)) for v in values):
+            lo, hi = min(values), max(values)
+            descriptions.append(f"范围 {lo}~{hi}" if lo != hi else f"例 {lo}")
+            values_by_col.append([])
+        else:
+            distinct: list[str] = []
+            for v in values:
+                text = str(v)[:_SAMPLE_VALUE_MAX_LEN]
+                if text not in distinct:
+                    distinct.append(text)
+                if len(distinct) >= settings.SCHEMA_DIGEST_SAMPLE_VALUES:
+                    break
+            descriptions.append("例 " + ", ".join(distinct))
+            values_by_col.append(distinct)
+    return descriptions, values_by_col
+
+
+def _build_entry(conn: sqlite3.Connection, table: dict, signature: tuple) -> dict:
+    """
+    单表摘要条目，text 格式:
+        sales（约 16 行）
+          - id INTEGER PK
+          - product_id INTEGER FK→products.id 范围 1~8
+          - region TEXT 例 华东, 华南, 华北
+    """
+    fks = _foreign_keys(conn, table["name"])
+    descriptions, values_by_col = _column_samples(conn, table)
+    approx = "" if table.get("row_count_exact", True) else "约 "
+    lines = [f"{table['name']}（{approx}{table['row_count']} 行）"]
+    for col, description in zip(table["columns"], descriptions):
+        parts = [col["name"], col["type"] or "ANY"]
+        if col["pk"]:
+            parts.append("PK")
+        if col["name"] in fks:
+            parts.append(f"FK→{fks[col['name']]}")
+        if description:
+            parts.append(description)
+        lines.append("  - " + " ".join(parts))
+    return {
+        "text": "\n".join(lines),
+        "columns": [col["name"] for col in table["columns"]],
+        "samples": [v for values in values_by_col for v in values],
+        "refs": sorted({target.split(".")[0] for target in fks.values()}),
+        "signature": signature,
+    }
+
+
+def _ensure_fresh() -> dict[str, dict]:
+    """返回各表摘要条目；表结构变化时只重建有变化的表（调用方持有锁）"""
+    global _fingerprint, _tables, _generation
+    fingerprint = catalog_service.get_schema_fingerprint()
+    if fingerprint == _fingerprint and not _dirty:
+        return _tables
+
+    catalog = catalog_service.get_tables()
+    conn = _connect()
+    try:
+        ddl = dict(conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='table'"
+        ).fetchall())
+        tables = {}
+        for table in catalog:
+            name = table["name"]
+            signature = (ddl.get(name), table["row_count"])
+            cached = _tables.get(name)
+            if cached is not None and cached["signature"] == signature and name not in _dirty:
+                tables[name] = cached
+            else:
+                tables[name] = _build_entry(conn, table, signature)
+    finally:
+        conn.close()
+
+    if tables.keys() != _tables.keys() or any(
+        tables[name] is not _tables.get(name) for name in tables
+    ):
+        _generation += 1
+    _tables = tables
+    _fingerprint = fingerprint
+    _dirty.clear()
+    return _tables
+
+
+def get_entries() -> tuple[int, dict[str, dict]]:
+    """
+    各表摘要条目（供检索索引使用）
+
+    Returns:
+        (generation, {表名: {"text", "columns", "samples", "refs", ...}})，
+        generation 不变说明条目内容未变化
+    """
+    with _lock:
+        tables = _ensure_fresh()
+        return _generation, dict(tables)
+
+
+def get_digest(table_names: list[str] | None = None) -> str:
+    """
+    结构摘要文本
+
+    Args:
+        table_names: 只包含这些表（按给定顺序）；None 表示全部表
+    """
+    with _lock:
+        tables = _ensure_fresh()
+        if table_names is None:
+            return "\n".join(entry["text"] for entry in tables.values())
+        return "\n".join(tables[name]["text"] for name in table_names if name in tables)
+
+
+def invalidate(table_name: str | None = None) -> None:
+    """
+    主动使摘要失效（上传导入后调用）
+
+    Args:
+        table_name: 只重建该表；None 表示全部重建
+    """
+    global _fingerprint
+    with _lock:
+        if table_name is None:
+            _dirty.update(_tables)
+            _fingerprint = None
+        else:
+            _dirty.add(table_name)
@@ -2,142 +2,376 @@
 会话管理服务
 - 会话 CRUD
 - 消息持久化
+- 基于 AsyncSession (aiosqlite)，不阻塞事件循环
 """
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-from sqlalchemy.orm import Session as DBSession
+from sqlalchemy import case, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.database import SessionModel, MessageModel, get_session_db
+from app.services.cursor import InvalidCursorError, decode_cursor, encode_cursor
 
+# 会话列表中最后一条消息预览的最大字符数
+_PREVIEW_MAX_CHARS = 80
 
-def _get_db() -> DBSession:
-    """获取数据库会话"""
+
+def _get_db() -> AsyncSession:
+    """获取数据库会话（需配合 async with 使用）"""
     SessionLocal = get_session_db()
     return SessionLocal()
 
 
-def list_sessions() -> list[SessionModel]:
+async def _get_session_row(db: AsyncSession, session_id: str) -> Optional[SessionModel]:
+    """在给定数据库会话中按 ID 查询会话"""
+    result = await db.execute(select(SessionModel).where(SessionModel.id == session_id))
+    return result.scalars().first()
+
+
+async def list_sessions() -> list[SessionModel]:
     """获取所有会话，按更新时间倒序"""
-    db = _get_db()
-    try:
-        return (
-            db.query(SessionModel)
-            .order_by(SessionModel.updated_at.desc())
-            .all()
+    async with _get_db() as db:
+        result = await db.execute(
+            select(SessionModel).order_by(SessionModel.updated_at.desc())
+        )
+        return list(result.scalars().all())
+
+
+async def list_sessions_page(
+    limit: int,
+    cursor: Optional[str] = None,
+    with_stats: bool = False,
+) -> tuple[list[dict], Optional[str]]:
+    """
+    按 (updated_at, id) 倒序键集分页获取会话
+
+    Args:
+        limit: 每页条数
+        cursor: 上一页返回的 next_cursor，None 表示第一页
+        with_stats: 是否附带消息数与最后一条消息预览（同一条 SQL 中的关联子查询，
+                    走 (session_id, created_at) 索引，不会 N+1）
+
+    Returns:
+        (会话列表, next_cursor)，已是最后一页时 next_cursor 为 None
+
+    Raises:
+        InvalidCursorError: 游标无法解析
+    """
+    columns = [SessionModel.id, SessionModel.title, SessionModel.created_at, SessionModel.updated_at]
+    if with_stats:
+        message_count = (
+            select(func.count())
+            .where(MessageModel.session_id == SessionModel.id)
+            .correlate(SessionModel)
+            .scalar_subquery()
+        )
+        last_message = (
+            select(func.substr(MessageModel.content, 1, _PREVIEW_MAX_CHARS))
+            .where(MessageModel.session_id == SessionModel.id)
+            .order_by(MessageModel.created_at.desc())
+            .limit(1)
+            .correlate(SessionModel)
+            .scalar_subquery()
+        )
+        columns += [message_count.label("message_count"), last_message.label("last_message")]
+
+    stmt = select(*columns)
+    if cursor:
+        updated_at, session_id = decode_cursor(cursor, 2)
+        try:
+            updated_at = datetime.fromisoformat(updated_at)
+        except (TypeError, ValueError) as e:
+            raise InvalidCursorError("无效的分页游标") from e
+        stmt = stmt.where(
+            tuple_(SessionModel.updated_at, SessionModel.id) < tuple_(updated_at, session_id)
         )
-    finally:
-        db.close()
+    # 多取一条用于判断是否还有下一页
+    stmt = stmt.order_by(SessionModel.updated_at.desc(), SessionModel.id.desc()).limit(limit + 1)
 
+    async with _get_db() as db:
+        rows = [dict(row._mapping) for row in await db.execute(stmt)]
 
-def get_session(session_id: str) -> Optional[SessionModel]:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last["updated_at"].isoformat(), last["id"]])
+    return rows, next_cursor
+
+
+async def get_session(session_id: str) -> Optional[SessionModel]:
     """获取单个会话"""
-    db = _get_db()
-    try:
-        return db.query(SessionModel).filter(SessionModel.id == session_id).first()
-    finally:
-        db.close()
+    async with _get_db() as db:
+        return await _get_session_row(db, session_id)
 
 
-def create_session(title: str = "新对话") -> SessionModel:
+async def create_session(title: str = "新对话") -> SessionModel:
     """创建新会话"""
-    db = _get_db()
-    try:
+    async with _get_db() as db:
         session = SessionModel(title=title)
         db.add(session)
-        db.commit()
-        db.refresh(session)
+        await db.commit()
+        await db.refresh(session)
         return session
-    finally:
-        db.close()
 
 
-def rename_session(session_id: str, title: str) -> Optional[SessionModel]:
+async def rename_session(session_id: str, title: str) -> Optional[SessionModel]:
     """重命名会话"""
-    db = _get_db()
-    try:
-        session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+    async with _get_db() as db:
+        session = await _get_session_row(db, session_id)
         if not session:
             return None
         session.title = title
         session.updated_at = datetime.now(timezone.utc)
-        db.commit()
-        db.refresh(session)
+        await db.commit()
+        await db.refresh(session)
         return session
-    finally:
-        db.close()
 
 
-def delete_session(session_id: str) -> bool:
+async def delete_session(session_id: str) -> bool:
     """删除会话（级联删除消息）"""
-    db = _get_db()
-    try:
-        session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+    async with _get_db() as db:
+        session = await _get_session_row(db, session_id)
         if not session:
             return False
-        db.delete(session)
-        db.commit()
+        await db.delete(session)
+        await db.commit()
         return True
-    finally:
-        db.close()
 
 
-def get_messages(session_id: str) -> list[MessageModel]:
+async def get_messages(session_id: str) -> list[MessageModel]:
     """获取会话的所有消息，按时间正序"""
-    db = _get_db()
-    try:
-        return (
-            db.query(MessageModel)
-            .filter(MessageModel.session_id == session_id)
+    async with _get_db() as db:
+        result = await db.execute(
+            select(MessageModel)
+            .where(MessageModel.session_id == session_id)
             .order_by(MessageModel.created_at.asc())
-            .all()
         )
-    finally:
-        db.close()
+        return list(result.scalars().all())
 
 
-def save_message(
+async def get_messages_page(
     session_id: str,
-    role: str,
-    content: str,
-    sql_query: Optional[str] = None,
-    chart_config: Optional[str] = None,
-) -> MessageModel:
-    """保存一条消息并更新会话时间"""
-    db = _get_db()
-    try:
-        msg = MessageModel(
-            session_id=session_id,
-            role=role,
-            content=content,
-            sql_query=sql_query,
-            chart_config=chart_config,
+    limit: int,
+    before: Optional[str] = None,
+    include_payload: bool = False,
+) -> tuple[list[dict], Optional[str]]:
+    """
+    向前翻页获取会话消息: 每次取 before 游标之前最近的 limit 条，页内按时间正序
+
+    Args:
+        session_id: 会话 ID
+        limit: 每页条数
+        before: 上一页返回的 next_cursor，None 表示从最新一条开始
+        include_payload: 是否带上 sql_query / chart_config；为 False 时只返回
+                         has_sql_query / has_chart_config 标记，需要时再按消息 ID 单独获取
+
+    Returns:
+        (消息列表, next_cursor)，没有更早的消息时 next_cursor 为 None
+
+    Raises:
+        InvalidCursorError: 游标无法解析
+    """
+    columns = [
+        MessageModel.id,
+        MessageModel.session_id,
+        MessageModel.role,
+        MessageModel.content,
+        MessageModel.status,
+        MessageModel.created_at,
+    ]
+    if include_payload:
+        columns += [MessageModel.sql_query, MessageModel.chart_config]
+    else:
+        columns += [
+            MessageModel.sql_query.is_not(None).label("has_sql_query"),
+            MessageModel.chart_config.is_not(None).label("has_chart_config"),
+        ]
+
+    stmt = select(*columns).where(MessageModel.session_id == session_id)
+    if before:
+        created_at, message_id = decode_cursor(before, 2)
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except (TypeError, ValueError) as e:
+            raise InvalidCursorError("无效的分页游标") from e
+        stmt = stmt.where(
+            tuple_(MessageModel.created_at, MessageModel.id) < tuple_(created_at, message_id)
         )
-        db.add(msg)
+    # 走 (session_id, created_at) 索引倒序取，多取一条用于判断是否还有更早的消息
+    stmt = stmt.order_by(MessageModel.created_at.desc(), MessageModel.id.desc()).limit(limit + 1)
 
-        # 更新会话的 updated_at
-        session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
-        if session:
-            session.updated_at = datetime.now(timezone.utc)
+    async with _get_db() as db:
+        rows = [dict(row._mapping) for row in await db.execute(stmt)]
 
-        db.commit()
-        db.refresh(msg)
-        return msg
-    finally:
-        db.close()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        oldest = rows[-1]
+        next_cursor = encode_cursor([oldest["created_at"].isoformat(), oldest["id"]])
+    rows.reverse()
+    return rows, next_cursor
 
 
-def update_session_title_if_default(session_id: str, user_message: str) -> None:
+async def get_message(session_id: str, message_id: str) -> Optional[MessageModel]:
+    """获取单条消息（含 sql_query / chart_config）"""
+    async with _get_db() as db:
+        result = await db.execute(
+            select(MessageModel).where(
+                MessageModel.id == message_id, MessageModel.session_id == session_id
+            )
+        )
+        return result.scalar_one_or_none()
+
+
+async def get_recent_turns(session_id: str, turns: int) -> list[tuple[str, str]]:
     """
-    如果会话标题仍为默认值 "新对话"，则用用户首条消息的前 30 个字符作为标题
+    获取会话最近 N 轮对话的 (role, content)，按时间正序
+
+    先定位倒数第 N 条用户消息的时间，再取该时间之后的消息，
+    两步都走 (session_id, created_at) 索引，代价与会话总长度无关。
     """
-    db = _get_db()
-    try:
-        session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
-        if session and session.title == "新对话":
-            session.title = user_message[:30] + ("..." if len(user_message) > 30 else "")
-            session.updated_at = datetime.now(timezone.utc)
-            db.commit()
-    finally:
-        db.close()
+    if turns <= 0:
+        return []
+    async with _get_db() as db:
+        cutoff = await db.scalar(
+            select(MessageModel.created_at)
+            .where(MessageModel.session_id == session_id, MessageModel.role == "user")
+            .order_by(MessageModel.created_at.desc())
+            .offset(turns - 1)
+            .limit(1)
+        )
+        stmt = select(MessageModel.role, MessageModel.content).where(
+            MessageModel.session_id == session_id
+        )
+        if cutoff is not None:
+            stmt = stmt.where(MessageModel.created_at >= cutoff)
+        result = await db.execute(stmt.order_by(MessageModel.created_at.asc()))
+        return [(row.role, row.content) for row in result]
+
+
+async def get_messages_after(
+    session_id: str, after: Optional[datetime]
+) -> list[tuple[str, str, datetime]]:
+    """获取某时间之后的 (role, content, created_at)，按时间正序；after 为 None 时取全部"""
+    async with _get_db() as db:
+        stmt = select(
+            MessageModel.role, MessageModel.content, MessageModel.created_at
+        ).where(MessageModel.session_id == session_id)
+        if after is not None:
+            stmt = stmt.where(MessageModel.created_at > after)
+        result = await db.execute(stmt.order_by(MessageModel.created_at.asc()))
+        return [(row.role, row.content, row.created_at) for row in result]
+
+
+async def get_memory_summary(session_id: str) -> tuple[Optional[str], Optional[datetime], int]:
+    """获取会话的滚动摘要: (摘要, 覆盖到的消息时间, 被折叠内容的 token 数)"""
+    async with _get_db() as db:
+        row = (await db.execute(
+            select(
+                SessionModel.memory_summary,
+                SessionModel.memory_summary_until,
+                SessionModel.memory_summary_source_tokens,
+            ).where(SessionModel.id == session_id)
+        )).first()
+        if row is None:
+            return None, None, 0
+        return row[0], row[1], row[2] or 0
+
+
+async def update_memory_summary(
+    session_id: str, summary: str, until: datetime, source_tokens: int
+) -> None:
+    """保存会话的滚动摘要（不改变会话的 updated_at）"""
+    async with _get_db() as db:
+        await db.execute(
+            update(SessionModel)
+            .where(SessionModel.id == session_id)
+            .values(
+                memory_summary=summary,
+                memory_summary_until=until,
+                memory_summary_source_tokens=source_tokens,
+                updated_at=SessionModel.updated_at,
+            )
+        )
+        await db.commit()
+
+
+def _title_from_message(user_message: str) -> str:
+    """用用户消息的前 30 个字符作为会话标题"""
+    return user_message[:30] + ("..." if len(user_message) > 30 else "")
+
+
+def make_turn(
+    session_id: str,
+    user_message: str,
+    assistant_content: str,
+    sql_query: Optional[str] = None,
+    chart_config: Optional[str] = None,
+    status: str = "complete",
+) -> dict:
+    """
+    构造一轮对话的写入记录
+
+    时间戳在构造时确定，延迟写入时消息顺序仍与对话发生的顺序一致。
+    status 为 cancelled 表示助手回复在客户端断开时被中止，只有部分内容。
+    """
+    return {
+        "session_id": session_id,
+        "user_message": user_message,
+        "assistant_content": assistant_content,
+        "sql_query": sql_query,
+        "chart_config": chart_config,
+        "status": status,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+async def save_turns(turns: list[dict]) -> None:
+    """
+    在一个事务内写入若干轮对话（用户消息 + 助手回复 + 会话时间/默认标题）
+
+    任一轮写入失败时整体回滚。
+
+    Args:
+        turns: make_turn 构造的记录
+    """
+    async with _get_db() as db:
+        for turn in turns:
+            created_at = turn["created_at"]
+            db.add(MessageModel(
+                session_id=turn["session_id"],
+                role="user",
+                content=turn["user_message"],
+                created_at=created_at,
+            ))
+            # 助手回复排在用户消息之后
+            db.add(MessageModel(
+                session_id=turn["session_id"],
+                role="assistant",
+                content=turn["assistant_content"],
+                sql_query=turn["sql_query"],
+                chart_config=turn["chart_config"],
+                status=turn.get("status", "complete"),
+                created_at=created_at + timedelta(microseconds=1),
+            ))
+            # 更新会话时间；标题仍为默认值时一并改为首条消息
+            await db.execute(
+                update(SessionModel)
+                .where(SessionModel.id == turn["session_id"])
+                .values(
+                    updated_at=created_at,
+                    title=case(
+                        (SessionModel.title == "新对话", _title_from_message(turn["user_message"])),
+                        else_=SessionModel.title,
+                    ),
+                )
+            )
+        await db.commit()
+
+
+async def save_turn(turn: dict) -> None:
+    """原子写入一轮对话（单事务）"""
+    await save_turns([turn])
@@ -1,29 +1,56 @@
 """
 SQL Agent 服务
 - 基于 SQLDatabase + SQLDatabaseToolkit + create_agent 构建
+- sql_db_query 直接返回带列名/类型的结构化结果，按 (SQL, 数据版本) 缓存，
+  见 sql_tools / query_executor / query_cache
+- 系统提示词嵌入表结构摘要（schema_digest），Agent 无需先调用
+  sql_db_list_tables / sql_db_schema
+- 提示词按问题动态生成: 表很多时只嵌入 BM25 检索出的相关表（table_index）
 - 支持非流式 invoke 和流式 astream_events
 """
 
+import asyncio
+import threading
+import time
 from typing import AsyncGenerator
 
 from langchain_community.utilities import SQLDatabase
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
 from langchain.agents import create_agent
+from langchain.agents.middleware import ModelRequest, dynamic_prompt, wrap_model_call
 
 from app.config import settings
-from app.services.llm_service import get_llm
+from app.services import catalog_service, llm_governor, schema_digest, table_index
+from app.services.llm_service import estimate_tokens, get_llm
+from app.services.sql_tools import build_sql_tools
 
-# 模块级缓存
+# 检索相关表时参考的最近用户消息条数（追问往往省略表名）
+_RETRIEVAL_RECENT_MESSAGES = 2
+
+# 模块级缓存（_agent_schema: 构建 Agent 时的表结构指纹）
 _agent = None
+_agent_schema: str | None = None
 _db = None
+# get_agent 在线程池中执行，避免并发请求重复构建
+_agent_lock = threading.Lock()
+
+# 首条 SQL 耗时统计（从开始流式调用到 Agent 发起第一次 sql_db_query）
+_stats_lock = threading.Lock()
+_stats = {
+    "runs": 0,
+    "runs_with_sql": 0,
+    "time_to_first_sql_total": 0.0,
+    "tool_calls_before_sql_total": 0,
+    "checker_calls": 0,
+}
+
+_CHECKER_TOOL = "sql_db_query_checker"
 
 SYSTEM_PROMPT = """你是一个专业的数据分析助手，负责与 SQLite 数据库交互并回答用户的数据分析问题。
 
 工作流程：
-1. 首先使用 sql_db_list_tables 查看数据库中有哪些可用的表
-2. 使用 sql_db_schema 查看相关表的结构和示例数据
+{schema_steps}
 3. 根据用户问题生成正确的 {dialect} SQL 查询
-4. 使用 sql_db_query_checker 检查 SQL 语法正确性
+4. 使用 sql_db_query_checker 检查 SQL（报错时按提示的相近列名/表名修正）
 5. 使用 sql_db_query 执行查询
 6. 用中文自然语言总结查询结果
 7. 如果结果适合可视化，**必须**在回答末尾附上图表配置
@@ -68,21 +95,116 @@ SYSTEM_PROMPT = """你是一个专业的数据分析助手，负责与 SQLite 
 - tooltip.formatter 示例: "{{b}}: ¥{{c}}" 或 "{{b}}: {{c}} ({{d}}%)"
 - label.formatter 示例: "¥{{c}}" 或 "{{c}}"
 - 不要使用 :,.0f / :.2f / :d 等格式说明符
+{schema_section}"""
+
+# 未嵌入结构摘要时的前两步
+_SCHEMA_STEPS_TOOLS = """1. 首先使用 sql_db_list_tables 查看数据库中有哪些可用的表
+2. 使用 sql_db_schema 查看相关表的结构和示例数据"""
+
+# 嵌入结构摘要时的前两步（工具仍可作为兜底）
+_SCHEMA_STEPS_DIGEST = """1. 直接根据下方【数据库结构摘要】确定相关的表和列，不要再调用 sql_db_list_tables
+2. 仅当摘要不足以确定（如需要更多示例数据）时，才使用 sql_db_schema 查看表结构"""
+
+_SCHEMA_SECTION = """
+【数据库结构摘要】{note}
+{digest}
 """
 
+# 只嵌入了部分表时的说明
+_PARTIAL_NOTE = "（仅列出与问题最相关的表，如需其他表请使用 sql_db_list_tables）"
+
+# 没有检索到相关表时的说明
+_NO_MATCH_DIGEST = "（未检索到与问题相关的表，请使用 sql_db_list_tables 查看）"
+
 
 def reset_agent():
     """重置 Agent 缓存（用于配置变更后重新创建）"""
-    global _agent, _db
-    _agent = None
-    _db = None
+    global _agent, _agent_schema, _db
+    with _agent_lock:
+        _agent = None
+        _agent_schema = None
+        _db = None
+
+
+def build_system_prompt(dialect: str, digest: str | None, partial: bool = False) -> str:
+    """
+    生成系统提示词
+
+    Args:
+        dialect: SQL 方言
+        digest: 表结构摘要，None 表示不嵌入（Agent 通过工具查看结构）
+        partial: 摘要是否只包含部分表
+    """
+    if digest is None:
+        return SYSTEM_PROMPT.format(
+            dialect=dialect, top_k=10,
+            schema_steps=_SCHEMA_STEPS_TOOLS, schema_section="",
+        )
+    return SYSTEM_PROMPT.format(
+        dialect=dialect, top_k=10,
+        schema_steps=_SCHEMA_STEPS_DIGEST,
+        schema_section=_SCHEMA_SECTION.format(
+            note=_PARTIAL_NOTE if partial else "",
+            digest=digest or _NO_MATCH_DIGEST,
+        ),
+    )
+
+
+def _select_digest(messages: list) -> tuple[str | None, bool]:
+    """
+    按最近的用户消息检索相关表，返回 (结构摘要, 是否只包含部分表)
+    """
+    if not settings.SCHEMA_DIGEST_ENABLED:
+        return None, False
+    recent = [m.content for m in messages if m.type == "human"][-_RETRIEVAL_RECENT_MESSAGES:]
+    tables, total = table_index.select_tables("\n".join(str(c) for c in recent))
+    return schema_digest.get_digest(tables), len(tables) < total
+
+
+def _build_prompt(messages: list) -> str:
+    digest, partial = _select_digest(messages)
+    return build_system_prompt(_get_business_db().dialect, digest, partial)
+
+
+@dynamic_prompt
+async def _schema_prompt(request: ModelRequest) -> str:
+    """
+    每次调用模型前生成系统提示词（只嵌入与当前问题相关的表）
+
+    选表与生成摘要可能读业务库（表结构变化后重新采样），放到线程池中执行，不阻塞事件循环
+    """
+    return await asyncio.to_thread(_build_prompt, request.state["messages"])
+
+
+@wrap_model_call
+async def _governed_model_call(request: ModelRequest, handler):
+    """每次模型调用都经过并发/速率治理（流式输出期间一直占用名额）"""
+    prompt = request.system_prompt or ""
+    tokens = estimate_tokens(prompt) + sum(
+        estimate_tokens(str(m.content)) for m in request.messages
+    )
+    async with llm_governor.slot(tokens):
+        response = await handler(request)
+        for message in response.result:
+            usage = getattr(message, "usage_metadata", None) or {}
+            llm_governor.record_tokens(
+                usage.get("output_tokens") or estimate_tokens(str(message.content))
+            )
+        return response
 
 
 def _get_business_db() -> SQLDatabase:
-    """获取业务数据库连接"""
+    """
+    获取业务数据库连接（表结构按需反射，表很多时避免启动时全量反射）
+
+    以只读 URI 打开: list_tables / schema 工具只需读取，查询由 query_executor 在沙箱中执行
+    """
     global _db
     if _db is None:
-        _db = SQLDatabase.from_uri(f"sqlite:///{settings.BUSINESS_DB_PATH}")
+        _db = SQLDatabase.from_uri(
+            f"sqlite:///file:{settings.BUSINESS_DB_PATH}?mode=ro&uri=true",
+            lazy_table_reflection=True,
+        )
     return _db
 
 
@@ -90,35 +212,82 @@ def get_agent():
     """
     获取 SQL Agent 实例（单例）
 
+    系统提示词由 _schema_prompt 按问题动态生成；表结构变化（如上传了新表）时
+    重建 SQLDatabase 与 Agent，使工具看到的表与摘要一致。
+
+    计算表结构指纹、重建时反射业务库都是同步 I/O，异步调用方应通过
+    asyncio.to_thread 调用。
+
     Returns:
         CompiledStateGraph (LangGraph agent)
     """
-    global _agent
-    if _agent is None:
-        db = _get_business_db()
-        llm = get_llm(streaming=True)
-        toolkit = SQLDatabaseToolkit(db=db, llm=get_llm(streaming=False))
-        tools = toolkit.get_tools()
+    global _agent, _agent_schema, _db
+    schema = catalog_service.get_schema_fingerprint()
+    with _agent_lock:
+        if _agent is not None and schema != _agent_schema:
+            _agent = None
+            _db = None
+
+        if _agent is None:
+            db = _get_business_db()
+            llm = get_llm(streaming=True)
+            tools = build_sql_tools(db, llm=get_llm(streaming=False))
 
-        prompt = SYSTEM_PROMPT.format(dialect=db.dialect, top_k=10)
-        _agent = create_agent(llm, tools, system_prompt=prompt)
+            _agent = create_agent(llm, tools, middleware=[_schema_prompt, _governed_model_call])
+            _agent_schema = schema
 
-    return _agent
+        return _agent
 
 
 async def run_agent(messages: list) -> dict:
     """
-    非流式调用 Agent
+    非流式调用 Agent（ainvoke，不阻塞事件循环）
 
     Args:
         messages: LangChain 消息列表
 
     Returns:
-        Agent 完整返回 {"messages": [...]}
+        {
+            "content": "...",       # 回答文本（已去掉图表标记）
+            "sql": "SELECT ...",    # data 对应的 SQL；没有数据时为最后一条执行的 SQL，未查询时为 None
+            "data": {...},          # 最后一次查询的结构化结果（query_pool.run_query 的返回值），无则 None
+            "chart": {...}          # 图表配置，无则 None
+        }
     """
-    agent = get_agent()
-    result = agent.invoke({"messages": messages})
-    return result
+    from app.services.chart_service import extract_chart_config, strip_chart_marker
+
+    agent = await asyncio.to_thread(get_agent)
+    try:
+        result = await agent.ainvoke({"messages": messages})
+    finally:
+        with _stats_lock:
+            _stats["runs"] += 1
+
+    full_text, sql, data, checker_calls = "", None, None, 0
+    for message in result["messages"][len(messages):]:
+        if message.type == "ai":
+            if isinstance(message.content, str):
+                full_text += message.content
+            for call in message.tool_calls:
+                if call["name"] == "sql_db_query":
+                    sql = call["args"].get("query") or sql
+                elif call["name"] == _CHECKER_TOOL:
+                    checker_calls += 1
+        elif message.type == "tool" and message.name == "sql_db_query":
+            artifact = getattr(message, "artifact", None)
+            if artifact and artifact.get("rows"):
+                data = artifact
+
+    with _stats_lock:
+        _stats["checker_calls"] += checker_calls
+
+    return {
+        "content": strip_chart_marker(full_text) if full_text else "",
+        # 有数据时返回产生这份数据的 SQL（之后的查询可能出错或没有结果）
+        "sql": data["sql"] if data else sql,
+        "data": data,
+        "chart": extract_chart_config(full_text),
+    }
 
 
 async def stream_agent_events(messages: list) -> AsyncGenerator[dict, None]:
@@ -129,6 +298,7 @@ async def stream_agent_events(messages: list) -> AsyncGenerator[dict, None]:
     事件格式:
         {"type": "text",  "content": "..."}
         {"type": "sql",   "content": "SELECT ..."}
+        {"type": "data",  "content": {"columns": [...], "column_types": [...], "rows": [...], "sql": "..."}}
         {"type": "chart", "config": {...}}
         {"type": "error", "content": "..."}
         {"type": "done",  "content": ""}
@@ -141,18 +311,23 @@ async def stream_agent_events(messages: list) -> AsyncGenerator[dict, None]:
     """
     from app.services.chart_service import extract_chart_config
 
-    agent = get_agent()
+    agent = await asyncio.to_thread(get_agent)
     full_text = ""
     collected_sql = []
+    start = time.perf_counter()
+    tool_calls_before_sql = 0
+    checker_calls = 0
 
+    stream = agent.astream_events({"messages": messages}, version="v2")
     try:
-        async for event in agent.astream_events(
-            {"messages": messages}, version="v2"
-        ):
+        async for event in stream:
             evt = event.get("event", "")
             name = event.get("name", "")
             data = event.get("data", {})
 
+            if evt == "on_tool_start" and name == _CHECKER_TOOL:
+                checker_calls += 1
+
             # 1. LLM 流式 chunk → text 事件
             if evt == "on_chat_model_stream" and name == "ChatQwen":
                 chunk = data.get("chunk")
@@ -164,17 +339,20 @@ async def stream_agent_events(messages: list) -> AsyncGenerator[dict, None]:
             elif evt == "on_tool_start" and name == "sql_db_query":
                 sql = data.get("input", {}).get("query", "")
                 if sql:
+                    if not collected_sql:
+                        _record_first_sql(time.perf_counter() - start, tool_calls_before_sql)
                     collected_sql.append(sql)
                     yield {"type": "sql", "content": sql}
 
-            # 3. 工具结束 → data 事件（sql_db_query 的查询结果）
+            elif evt == "on_tool_start" and not collected_sql:
+                tool_calls_before_sql += 1
+
+            # 3. 工具结束 → data 事件（sql_db_query 的结构化结果，无需再解析文本）
             elif evt == "on_tool_end" and name == "sql_db_query":
-                output = data.get("output")
-                if output:
-                    raw_result = output.content if hasattr(output, "content") else str(output)
-                    parsed = _parse_query_result(raw_result, collected_sql[-1] if collected_sql else "")
-                    if parsed:
-                        yield {"type": "data", "content": parsed}
+                result = getattr(data.get("output"), "artifact", None)
+                if result and result.get("rows"):
+                    sql = collected_sql[-1] if collected_sql else result.get("sql", "")
+                    yield {"type": "data", "content": {**result, "sql": sql}}
 
         # 4. 流结束后，检查是否有图表配置
         chart = extract_chart_config(full_text)
@@ -188,113 +366,52 @@ async def stream_agent_events(messages: list) -> AsyncGenerator[dict, None]:
         yield {"type": "error", "content": str(e)}
         yield {"type": "done", "content": ""}
 
+    finally:
+        # 调用方提前关闭本生成器（客户端断开）时，显式关闭事件流:
+        # 取消正在执行的 LangGraph 运行及其中的 LLM 流式请求
+        await stream.aclose()
+        with _stats_lock:
+            _stats["runs"] += 1
+            _stats["checker_calls"] += checker_calls
 
-def get_last_sql(events_history: list[dict]) -> str | None:
-    """从事件历史中提取最后一条 SQL"""
-    for event in reversed(events_history):
-        if event.get("type") == "sql":
-            return event.get("content")
-    return None
 
+def _record_first_sql(elapsed: float, tool_calls: int) -> None:
+    with _stats_lock:
+        _stats["runs_with_sql"] += 1
+        _stats["time_to_first_sql_total"] += elapsed
+        _stats["tool_calls_before_sql_total"] += tool_calls
 
-def _parse_query_result(raw_result: str, sql: str) -> dict | None:
-    """
-    解析 sql_db_query 工具返回的原始结果字符串为结构化数据。
 
-    工具返回格式通常为: "[('笔记本电脑', 5999.0), ('智能手机', 3999.0)]"
-    或 include_columns 时: "[{'name': '笔记本电脑', 'price': 5999.0}]"
+def get_stats() -> dict:
+    """
+    Agent 运行统计
 
     Returns:
         {
-            "columns": ["col1", "col2"],
-            "rows": [["val1", "val2"], ...],
-            "sql": "SELECT ..."
+            "runs": 10, "runs_with_sql": 8,
+            "avg_time_to_first_sql": 2.31,        # 秒
+            "avg_tool_calls_before_sql": 0.5,
+            "avg_checker_calls_per_run": 1.2,     # 每个问题调用 sql_db_query_checker 的次数
+            "schema_digest": true
         }
     """
-    import ast
-    import re as _re
-
-    if not raw_result or raw_result.strip() in ("", "[]", "None"):
-        return None
+    with _stats_lock:
+        n = _stats["runs_with_sql"]
+        return {
+            "runs": _stats["runs"],
+            "runs_with_sql": n,
+            "avg_time_to_first_sql": round(_stats["time_to_first_sql_total"] / n, 3) if n else None,
+            "avg_tool_calls_before_sql": round(_stats["tool_calls_before_sql_total"] / n, 2) if n else None,
+            "avg_checker_calls_per_run": (
+                round(_stats["checker_calls"] / _stats["runs"], 2) if _stats["runs"] else None
+            ),
+            "schema_digest": settings.SCHEMA_DIGEST_ENABLED,
+        }
 
-    try:
-        # 尝试解析为 Python 字面量
-        parsed = ast.literal_eval(raw_result.strip())
-    except (ValueError, SyntaxError):
-        return None
-
-    if not isinstance(parsed, list) or len(parsed) == 0:
-        return None
-
-    # 情况 1: 字典列表 [{"col": "val"}, ...]
-    if isinstance(parsed[0], dict):
-        columns = list(parsed[0].keys())
-        rows = [[row.get(c) for c in columns] for row in parsed]
-        return {"columns": columns, "rows": rows, "sql": sql}
-
-    # 情况 2: 元组列表 [("val1", "val2"), ...]
-    if isinstance(parsed[0], (tuple, list)):
-        # 尝试从 SQL 中提取列名
-        columns = _extract_columns_from_sql(sql) or [
-            f"col_{i}" for i in range(len(parsed[0]))
-        ]
-        # 确保列数匹配
-        if len(columns) != len(parsed[0]):
-            columns = [f"col_{i}" for i in range(len(parsed[0]))]
-        rows = [list(row) for row in parsed]
-        return {"columns": columns, "rows": rows, "sql": sql}
 
+def get_last_sql(events_history: list[dict]) -> str | None:
+    """从事件历史中提取最后一条 SQL"""
+    for event in reversed(events_history):
+        if event.get("type") == "sql":
+            return event.get("content")
     return None
-
-
-def _extract_columns_from_sql(sql: str) -> list[str] | None:
-    """从 SELECT 语句中提取列名/别名"""
-    import re as _re
-
-    if not sql:
-        return None
-
-    # 匹配 SELECT ... FROM
-    m = _re.search(r'SELECT\s+(.+?)\s+FROM', sql, _re.IGNORECASE | _re.DOTALL)
-    if not m:
-        return None
-
-    select_part = m.group(1).strip()
-    if select_part == '*':
-        return None
-
-    columns = []
-    # 按逗号分割（注意函数中的逗号）
-    depth = 0
-    current = ""
-    for ch in select_part:
-        if ch == '(':
-            depth += 1
-        elif ch == ')':
-            depth -= 1
-        elif ch == ',' and depth == 0:
-            columns.append(current.strip())
-            current = ""
-            continue
-        current += ch
-    columns.append(current.strip())
-
-    # 提取别名
-    result = []
-    for col in columns:
-        # 匹配 AS alias 或 as alias
-        alias_match = _re.search(r'\bAS\s+["\']?(\w+)["\']?\s*$', col, _re.IGNORECASE)
-        if alias_match:
-            result.append(alias_match.group(1))
-        else:
-            # 取最后一个 . 之后的部分
-            parts = col.strip().split('.')
-            name = parts[-1].strip().strip('"').strip("'").strip('`')
-            # 如果是函数如 SUM(x)，简化
-            func_match = _re.match(r'(\w+)\s*\(', name)
-            if func_match:
-                result.append(name)
-            else:
-                result.append(name)
-
-    return result if result else None
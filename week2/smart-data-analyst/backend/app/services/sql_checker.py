@@ -0,0 +1,136 @@
+"""
+本地 SQL 校验
+- 在只读连接上执行 EXPLAIN QUERY PLAN: SQLite 会完整编译语句，语法错误、
+  不存在的表/列都会在这一步报出，但不会真正执行查询
+- 连接带 query_executor 的 authorizer: 编译时即拒绝写操作（如 WITH ... DELETE）
+- 报错时根据业务库目录给出相近的表名/列名
+- 通过时返回查询计划，便于 Agent 发现全表扫描等问题
+- 不调用 LLM，取代 SQLDatabaseToolkit 中基于 LLM 的 sql_db_query_checker
+"""
+
+import difflib
+import re
+import sqlite3
+import time
+
+from app.services import catalog_service, query_executor
+
+_NO_SUCH_COLUMN = re.compile(r"no such column: (\S+)")
+_NO_SUCH_TABLE = re.compile(r"no such table: (\S+)")
+_LEADING_COMMENTS = re.compile(r"^(\s*(--[^\n]*\n|/\*.*?\*/))*\s*", re.S)
+
+# 只允许只读语句
+_READ_PREFIXES = ("SELECT", "WITH", "VALUES")
+_READ_ONLY_ERROR = "只允许只读查询（SELECT / WITH），不能修改数据或库结构"
+
+# 相近名称的最多条数与相似度阈值
+_MAX_SUGGESTIONS = 3
+_SUGGESTION_CUTOFF = 0.6
+
+_stats = {"checks": 0, "errors": 0, "seconds_total": 0.0}
+
+
+def check_query(sql: str) -> dict:
+    """
+    校验 SQL（不执行）
+
+    Args:
+        sql: SQL 语句
+
+    Returns:
+        通过: {"ok": True, "plan": ["SCAN sales", ...]}
+        失败: {"ok": False, "error": "no such column: regin", "suggestions": ["sales.region"]}
+    """
+    start = time.perf_counter()
+    try:
+        result = _check(sql)
+    finally:
+        _stats["checks"] += 1
+        _stats["seconds_total"] += time.perf_counter() - start
+    if not result["ok"]:
+        _stats["errors"] += 1
+    return result
+
+
+def _check(sql: str) -> dict:
+    statement = sql.strip().rstrip(";").strip()
+    if not _LEADING_COMMENTS.sub("", statement).upper().startswith(_READ_PREFIXES):
+        return {"ok": False, "error": _READ_ONLY_ERROR, "suggestions": []}
+
+    conn = query_executor.connect()
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+    except sqlite3.Error as e:
+        error = str(e)
+        if "not authorized" in error:
+            return {"ok": False, "error": _READ_ONLY_ERROR, "suggestions": []}
+        return {"ok": False, "error": error, "suggestions": _suggest(error)}
+    finally:
+        conn.close()
+
+    # (id, parent, notused, detail)，按 parent 缩进成树
+    depth = {0: -1}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append("  " * depth[node_id] + detail)
+    return {"ok": True, "plan": plan}
+
+
+def _suggest(error: str) -> list[str]:
+    """根据报错给出相近的表名或列名"""
+    tables = catalog_service.get_tables()
+    match = _NO_SUCH_COLUMN.search(error)
+    if match:
+        name = match.group(1).split(".")[-1]
+        candidates = {
+            col["name"].lower(): col["name"]
+            for table in tables for col in table["columns"]
+        }
+        close = difflib.get_close_matches(
+            name.lower(), candidates, n=_MAX_SUGGESTIONS, cutoff=_SUGGESTION_CUTOFF
+        )
+        return [
+            f"{table['name']}.{col['name']}"
+            for key in close
+            for table in tables
+            for col in table["columns"]
+            if col["name"] == candidates[key]
+        ]
+    match = _NO_SUCH_TABLE.search(error)
+    if match:
+        names = [table["name"] for table in tables]
+        return difflib.get_close_matches(
+            match.group(1).split(".")[-1], names, n=_MAX_SUGGESTIONS, cutoff=_SUGGESTION_CUTOFF
+        )
+    return []
+
+
+def format_for_llm(result: dict) -> str:
+    """
+    生成给 LLM 阅读的校验结果
+
+    格式:
+        OK
+        Query plan:
+        SCAN sales
+        或
+        Error: no such column: regin
+        Did you mean: sales.region
+    """
+    if result["ok"]:
+        return "OK\nQuery plan:\n" + "\n".join(result["plan"])
+    text = f"Error: {result['error']}"
+    if result["suggestions"]:
+        text += "\nDid you mean: " + ", ".join(result["suggestions"])
+    return text
+
+
+def get_stats() -> dict:
+    """校验统计（每个问题的平均校验次数见 sql_agent.get_stats 的 avg_checker_calls_per_run）"""
+    checks = _stats["checks"]
+    return {
+        "checks": checks,
+        "errors": _stats["errors"],
+        "avg_check_ms": round(_stats["seconds_total"] / checks * 1000, 2) if checks else None,
+    }
@@ -0,0 +1,104 @@
+"""
+SQL Agent 工具集
+- 基于 SQLDatabaseToolkit 的默认工具
+- sql_db_query 替换为自定义实现: 直接执行并返回带列名/类型的结构化结果（artifact），
+  结果按 (SQL, 数据版本) 缓存
+- sql_db_query_checker 替换为本地 EXPLAIN 校验（SQL_CHECKER_LOCAL），不再调用 LLM
+"""
+
+from typing import Optional, Type
+
+from langchain_community.agent_toolkits import SQLDatabaseToolkit
+from langchain_community.utilities import SQLDatabase
+from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from app.config import settings
+from app.services import catalog_service, query_cache, query_executor, query_pool, sql_checker
+
+
+class _QueryInput(BaseModel):
+    query: str = Field(..., description="A detailed and correct SQL query.")
+
+
+class BusinessQueryTool(BaseTool):
+    """
+    sql_db_query: 在业务库上执行 SQL
+
+    返回 (content, artifact):
+    - content: 给 LLM 阅读的文本（列名 + 行）
+    - artifact: query_pool.run_query 的结构化结果，出错时为 None
+    """
+
+    name: str = "sql_db_query"
+    description: str = ""
+    args_schema: Type[BaseModel] = _QueryInput
+    response_format: str = "content_and_artifact"
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> tuple[str, dict | None]:
+        data_version = catalog_service.get_data_version()
+        cached = query_cache.get(query, data_version)
+        if cached is not None:
+            return cached
+
+        try:
+            result = query_pool.run_query(query, cancel=query_pool.current_cancel.get())
+        except query_executor.QueryError as e:
+            # 报错结果不缓存，让 Agent 改写后重试
+            return e.to_llm(), None
+
+        output = (query_executor.format_for_llm(result), result)
+        query_cache.put(query, data_version, output)
+        return output
+
+
+class LocalQueryCheckerTool(BaseTool):
+    """
+    sql_db_query_checker: 在只读连接上 EXPLAIN 校验 SQL
+
+    返回 SQLite 的原始报错与相近的表名/列名，通过时返回查询计划
+    """
+
+    name: str = "sql_db_query_checker"
+    description: str = (
+        "Use this tool to double check if your query is correct before executing it. "
+        "It compiles the query against the database without running it and returns "
+        "either the exact SQLite error (with similar table/column names) or the query plan. "
+        "Always use this tool before executing a query with sql_db_query!"
+    )
+    args_schema: Type[BaseModel] = _QueryInput
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        return sql_checker.format_for_llm(sql_checker.check_query(query))
+
+
+def build_sql_tools(db: SQLDatabase, llm) -> list[BaseTool]:
+    """
+    构建 Agent 使用的 SQL 工具列表
+
+    Args:
+        db: 业务数据库
+        llm: SQLDatabaseToolkit 要求的非流式 LLM（仅 SQL_CHECKER_LOCAL 关闭时由
+             sql_db_query_checker 使用）
+
+    Returns:
+        工具列表（名称与 SQLDatabaseToolkit 保持一致）
+    """
+    tools = SQLDatabaseToolkit(db=db, llm=llm).get_tools()
+    result = []
+    for tool in tools:
+        if tool.name == "sql_db_query":
+            tool = BusinessQueryTool(description=tool.description)
+        elif tool.name == "sql_db_query_checker" and settings.SQL_CHECKER_LOCAL:
+            tool = LocalQueryCheckerTool()
+        result.append(tool)
+    return result
@@ -0,0 +1,177 @@
+"""
+相关表检索索引
+- 本地 BM25 词法索引，文档 = 表名 + 列名 + 示例值（取自 schema_digest），无需联网
+- 每个问题只选出 top-k 张相关表（及其外键引用的表），只把这些表的结构交给 Agent
+- 增量更新: 只对内容有变化的表重新分词并调整倒排表/文档频率
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+
+from app.config import settings
+from app.services import schema_digest
+
+# BM25 参数
+_K1 = 1.2
+_B = 0.75
+
+# 字段权重: 表名、列名比示例值更能说明表的用途
+_NAME_WEIGHT = 3
+_COLUMN_WEIGHT = 2
+
+_CAMEL_PATTERN = re.compile(r"([a-z0-9])([A-Z])")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]+")
+_CJK_PATTERN = re.compile(r"[\u4e00-\u9fff]")
+
+_lock = threading.Lock()
+
+# 已索引内容: 表名 -> 摘要文本（用于判断条目是否变化）
+_indexed: dict[str, str] = {}
+# 倒排表: 词 -> {表名: 词频}；每张表的词集合用于增量删除
+_postings: dict[str, dict[str, int]] = {}
+_doc_terms: dict[str, list[str]] = {}
+_doc_len: dict[str, int] = {}
+_total_len = 0
+_generation: int | None = None
+
+_stats = {"queries": 0, "updates": 0, "tables_selected": 0}
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    分词: 英文/数字按单词切分（含 snake_case、camelCase），
+    中文按单字 + 相邻二字切分
+    """
+    text = _CAMEL_PATTERN.sub(r"\1 \2", text).lower()
+    tokens = []
+    for piece in _TOKEN_PATTERN.findall(text):
+        if _CJK_PATTERN.match(piece):
+            tokens.extend(piece)
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece)
+    return tokens
+
+
+def _document_terms(name: str, entry: dict) -> Counter:
+    terms = Counter()
+    for token in tokenize(name):
+        terms[token] += _NAME_WEIGHT
+    for column in entry["columns"]:
+        for token in tokenize(column):
+            terms[token] += _COLUMN_WEIGHT
+    for sample in entry["samples"]:
+        terms.update(tokenize(sample))
+    return terms
+
+
+def _remove(name: str) -> None:
+    """从索引中移除一张表（调用方持有锁）"""
+    global _total_len
+    for term in _doc_terms.pop(name, []):
+        postings = _postings[term]
+        postings.pop(name, None)
+        if not postings:
+            del _postings[term]
+    _total_len -= _doc_len.pop(name, 0)
+    _indexed.pop(name, None)
+
+
+def _add(name: str, entry: dict) -> None:
+    """把一张表加入索引（调用方持有锁）"""
+    global _total_len
+    terms = _document_terms(name, entry)
+    for term, tf in terms.items():
+        _postings.setdefault(term, {})[name] = tf
+    _doc_terms[name] = list(terms)
+    _doc_len[name] = sum(terms.values())
+    _total_len += _doc_len[name]
+    _indexed[name] = entry["text"]
+
+
+def _sync() -> dict[str, dict]:
+    """与 schema_digest 同步，只处理新增/变化/删除的表（调用方持有锁）"""
+    global _generation
+    generation, entries = schema_digest.get_entries()
+    if generation == _generation:
+        return entries
+
+    for name in [n for n in _indexed if n not in entries]:
+        _remove(name)
+        _stats["updates"] += 1
+    for name, entry in entries.items():
+        if _indexed.get(name) == entry["text"]:
+            continue
+        if name in _indexed:
+            _remove(name)
+        _add(name, entry)
+        _stats["updates"] += 1
+    _generation = generation
+    return entries
+
+
+def _score(query: str) -> dict[str, float]:
+    """BM25 打分（调用方持有锁）"""
+    n_docs = len(_doc_len)
+    if not n_docs:
+        return {}
+    avg_len = _total_len / n_docs
+    scores: dict[str, float] = {}
+    for term in set(tokenize(query)):
+        postings = _postings.get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+        for name, tf in postings.items():
+            norm = tf + _K1 * (1 - _B + _B * _doc_len[name] / avg_len)
+            scores[name] = scores.get(name, 0.0) + idf * tf * (_K1 + 1) / norm
+    return scores
+
+
+def select_tables(query: str, top_k: int | None = None) -> tuple[list[str], int]:
+    """
+    为问题选出相关表
+
+    表总数不超过 top_k 时直接返回全部表；否则返回 BM25 得分最高的 top_k 张表，
+    并补上它们外键引用的表（JOIN 时需要）。没有任何词命中时返回空列表，
+    由 Agent 通过 sql_db_list_tables 兜底。
+
+    Args:
+        query: 问题文本（可拼接最近几轮用户消息）
+        top_k: 最多选出的表数，默认取 SCHEMA_RETRIEVAL_TOP_K
+
+    Returns:
+        (表名列表（按相关度排序）, 已索引的表总数)
+    """
+    top_k = top_k or settings.SCHEMA_RETRIEVAL_TOP_K
+    with _lock:
+        entries = _sync()
+        _stats["queries"] += 1
+        if len(entries) <= top_k:
+            selected = list(entries)
+        else:
+            scores = _score(query)
+            ranked = sorted(scores, key=lambda name: (-scores[name], name))[:top_k]
+            selected = list(ranked)
+            for name in ranked:
+                selected.extend(
+                    ref for ref in entries[name]["refs"]
+                    if ref in entries and ref not in selected
+                )
+        _stats["tables_selected"] += len(selected)
+        return selected, len(entries)
+
+
+def get_stats() -> dict:
+    """索引统计"""
+    with _lock:
+        queries = _stats["queries"]
+        return {
+            "tables": len(_doc_len),
+            "terms": len(_postings),
+            "queries": queries,
+            "updates": _stats["updates"],
+            "avg_tables_selected": round(_stats["tables_selected"] / queries, 2) if queries else None,
+        }
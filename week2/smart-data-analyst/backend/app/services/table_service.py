@@ -0,0 +1,138 @@
+"""
+业务表数据浏览服务
+- 键集分页: 按 rowid（WITHOUT ROWID 表按主键）翻页，翻到第 N 页的代价与 N 无关
+- 流式导出: CSV / NDJSON 由生成器按批产出，服务端内存占用与表大小无关
+"""
+
+import csv
+import io
+import json
+import sqlite3
+from typing import Iterator
+
+from app.config import settings
+from app.services.cursor import InvalidCursorError, decode_cursor, encode_cursor
+
+# 导出时每批从游标读取的行数
+_EXPORT_BATCH_ROWS = 1000
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+
+def _connect(check_same_thread: bool = True) -> sqlite3.Connection:
+    """只读连接业务数据库"""
+    return sqlite3.connect(
+        f"file:{settings.BUSINESS_DB_PATH}?mode=ro",
+        uri=True,
+        check_same_thread=check_same_thread,
+        timeout=settings.BUSINESS_DB_BUSY_TIMEOUT,
+    )
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _key_columns(conn: sqlite3.Connection, table_name: str, columns: list[dict]) -> list[str]:
+    """
+    分页键: 普通表用 rowid（INTEGER PRIMARY KEY 即 rowid 别名），
+    WITHOUT ROWID 表用主键列
+    """
+    try:
+        conn.execute(f"SELECT rowid FROM {_quote(table_name)} LIMIT 0")
+        return ["rowid"]
+    except sqlite3.OperationalError:
+        return [col["name"] for col in columns if col["pk"]]
+
+
+def read_page(
+    table_name: str,
+    columns: list[dict],
+    limit: int,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """
+    读取一页数据
+
+    Args:
+        table_name: 表名（调用方需确认表存在）
+        columns: 表的列信息（来自目录缓存）
+        limit: 每页行数
+        cursor: 上一页返回的 next_cursor，None 表示第一页
+
+    Returns:
+        (rows, next_cursor)，已是最后一页时 next_cursor 为 None
+    """
+    col_names = [col["name"] for col in columns]
+    conn = _connect()
+    try:
+        key_cols = _key_columns(conn, table_name, columns)
+        key_expr = ", ".join(k if k == "rowid" else _quote(k) for k in key_cols)
+        select_cols = ", ".join(_quote(c) for c in col_names)
+        sql = f"SELECT {key_expr}, {select_cols} FROM {_quote(table_name)}"
+
+        params: list = []
+        if cursor:
+            after = decode_cursor(cursor, len(key_cols))
+            placeholders = ", ".join(["?"] * len(key_cols))
+            # 行值比较，单列/多列主键通用
+            sql += f" WHERE ({key_expr}) > ({placeholders})"
+            params.extend(after)
+
+        # 多取一行用于判断是否还有下一页
+        sql += f" ORDER BY {key_expr} LIMIT ?"
+        params.append(limit + 1)
+
+        fetched = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+    has_more = len(fetched) > limit
+    fetched = fetched[:limit]
+    n_keys = len(key_cols)
+    rows = [dict(zip(col_names, row[n_keys:])) for row in fetched]
+    next_cursor = encode_cursor(list(fetched[-1][:n_keys])) if has_more else None
+    return rows, next_cursor
+
+
+def iter_export(table_name: str, col_names: list[str], fmt: str) -> Iterator[bytes]:
+    """
+    流式导出整张表
+
+    Args:
+        table_name: 表名（调用方需确认表存在）
+        col_names: 列名列表
+        fmt: "csv" 或 "ndjson"
+
+    Yields:
+        bytes: 每批编码后的数据块
+    """
+    select_cols = ", ".join(_quote(c) for c in col_names)
+    # 生成器的每次迭代可能落在线程池的不同线程上
+    conn = _connect(check_same_thread=False)
+    try:
+        cur = conn.execute(f"SELECT {select_cols} FROM {_quote(table_name)}")
+
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            # 带 BOM，Excel 打开中文不乱码
+            buf.write("\ufeff")
+            writer.writerow(col_names)
+            while batch := cur.fetchmany(_EXPORT_BATCH_ROWS):
+                writer.writerows(batch)
+                yield buf.getvalue().encode("utf-8")
+                buf.seek(0)
+                buf.truncate()
+            if buf.tell():
+                yield buf.getvalue().encode("utf-8")
+        else:
+            while batch := cur.fetchmany(_EXPORT_BATCH_ROWS):
+                chunk = "".join(
+                    json.dumps(dict(zip(col_names, row)), ensure_ascii=False, default=str)
+                    + "\n"
+                    for row in batch
+                )
+                yield chunk.encode("utf-8")
+    finally:
+        conn.close()
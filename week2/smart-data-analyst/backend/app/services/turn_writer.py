@@ -0,0 +1,110 @@
+"""
+对话写入队列（write-behind）
+- TURN_WRITE_BEHIND 开启时，save_turn 只把记录放入队列即返回，不占用 SSE 生成器
+- 后台任务把多个会话的写入攒成一批，在一个事务内提交（group commit）
+- 批量提交失败时逐条重试，只丢弃本身写不进去的记录（如会话已被删除）
+- 应用关闭时把队列中剩余的记录全部写完
+"""
+
+import asyncio
+import logging
+
+from app.config import settings
+from app.services import session_service
+
+logger = logging.getLogger(__name__)
+
+_queue: asyncio.Queue | None = None
+_worker: asyncio.Task | None = None
+
+_stats = {"queued": 0, "written": 0, "batches": 0, "failed": 0, "direct": 0}
+
+
+async def start() -> None:
+    """启动后台写入任务（应用启动时调用）"""
+    global _queue, _worker
+    if not settings.TURN_WRITE_BEHIND or _worker is not None:
+        return
+    _queue = asyncio.Queue(maxsize=settings.TURN_WRITE_QUEUE_SIZE)
+    _worker = asyncio.create_task(_run(_queue), name="turn-writer")
+
+
+async def stop() -> None:
+    """写完队列中剩余的记录并停止后台任务（应用关闭时调用）"""
+    global _queue, _worker
+    if _worker is None:
+        return
+    # None 作为结束标记，排在所有已提交的记录之后
+    await _queue.put(None)
+    await _worker
+    _queue = None
+    _worker = None
+
+
+async def submit(turn: dict) -> None:
+    """
+    提交一轮对话的写入
+
+    后台任务运行中时放入队列立即返回；否则（未开启 / 队列已满）直接写入。
+    直接写入放在独立任务中并 shield，调用方（SSE 生成器）被取消时写入仍会完成。
+    """
+    if _queue is not None:
+        try:
+            _queue.put_nowait(turn)
+            _stats["queued"] += 1
+            return
+        except asyncio.QueueFull:
+            pass
+    _stats["direct"] += 1
+    await asyncio.shield(asyncio.create_task(_write_batch([turn])))
+
+
+async def _run(queue: asyncio.Queue) -> None:
+    """后台任务: 攒批并提交，收到结束标记后退出"""
+    stopping = False
+    while not stopping:
+        first = await queue.get()
+        if first is None:
+            break
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + settings.TURN_WRITE_MAX_DELAY
+        while len(batch) < settings.TURN_WRITE_BATCH_SIZE:
+            timeout = deadline - asyncio.get_running_loop().time()
+            try:
+                item = queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(
+                    queue.get(), timeout
+                )
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+        await _write_batch(batch)
+
+
+async def _write_batch(batch: list[dict]) -> None:
+    """一个事务提交整批；失败时逐条重试"""
+    try:
+        await session_service.save_turns(batch)
+        _stats["written"] += len(batch)
+        _stats["batches"] += 1
+        return
+    except Exception:
+        if len(batch) == 1:
+            _stats["failed"] += 1
+            logger.exception("写入对话失败: session_id=%s", batch[0]["session_id"])
+            return
+        logger.warning("批量写入 %d 轮对话失败，改为逐条写入", len(batch))
+
+    for turn in batch:
+        await _write_batch([turn])
+
+
+def get_stats() -> dict:
+    """写入统计"""
+    return {
+        **_stats,
+        "enabled": _worker is not None,
+        "pending": _queue.qsize() if _queue is not None else 0,
+    }
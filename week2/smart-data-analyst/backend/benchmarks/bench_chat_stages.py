@@ -0,0 +1,408 @@
+"""
+聊天链路分阶段耗时基准
+
+端到端驱动 routers.chat._chat_event_generator（真实 Agent 图、工具、记忆、持久化），
+LLM 换成本地确定性替身（固定首 token 延迟与逐 token 延迟），业务库为合成的大库
+（默认 sales 100 万行，固定随机种子）。每个问题走与真实 Agent 相同的三次模型调用:
+sql_db_query_checker → sql_db_query → 流式回答（末尾带图表标记）。
+
+分阶段统计（每个请求内同一阶段多次调用的耗时相加）:
+- memory_load     加载上下文记忆
+- schema_prompt   选表 + 生成系统提示词（每次模型调用前）
+- llm             模型调用（替身的模拟延迟 + LangChain 开销）
+- tool            工具执行（含 SQL）；sql 为其中 SQL 执行部分
+- chart           图表配置提取 / 去除图表标记
+- result_handle   查询结果存入结果句柄、生成首页
+- persist         保存本轮对话
+- other           总耗时减去以上各阶段（Agent 图调度、事件流转换等）
+- first_token     从请求开始到第一条 text 事件
+- total           整个请求
+
+输出各阶段 p50 / p95 / p99 / mean。--json 保存本次结果，--baseline 与之前的结果对比，
+p50 或 p95 变慢超过 --tolerance（且绝对值超过 --min-delta-ms）时以退出码 1 结束，可用于 CI。
+
+用法 (在 backend 目录下):
+    python -m benchmarks.bench_chat_stages --rows 1000000 --iterations 20 --json stages.json
+    python -m benchmarks.bench_chat_stages --baseline stages.json
+"""
+
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# 问题 -> 替身 LLM 生成的 SQL（覆盖全表聚合、JOIN、范围过滤、小表、明细）
+SCENARIOS = {
+    "各地区的总销售额是多少？":
+        "SELECT region, SUM(total_amount) AS total FROM sales GROUP BY region ORDER BY total DESC",
+    "销量最高的 5 个产品是什么？":
+        "SELECT p.name, SUM(s.quantity) AS qty FROM sales s JOIN products p ON p.id = s.product_id "
+        "GROUP BY p.name ORDER BY qty DESC LIMIT 5",
+    "2026 年 1 月每天的销售额趋势":
+        "SELECT sale_date, SUM(total_amount) AS total FROM sales "
+        "WHERE sale_date BETWEEN '2026-01-01' AND '2026-01-31' GROUP BY sale_date ORDER BY sale_date",
+    "每个部门的平均工资是多少？":
+        "SELECT department, AVG(salary) AS avg_salary FROM employees GROUP BY department",
+    "列出华南地区最近的 500 笔销售明细":
+        "SELECT id, product_id, quantity, total_amount, sale_date FROM sales "
+        "WHERE region = '华南' ORDER BY sale_date DESC, id DESC LIMIT 500",
+}
+
+STAGES = [
+    "memory_load", "schema_prompt", "llm", "tool", "sql", "chart",
+    "result_handle", "persist", "other", "first_token", "total",
+]
+
+# 计入 other 时需要扣除的阶段（sql 包含在 tool 内，不重复扣除）
+_EXCLUSIVE_STAGES = ["memory_load", "schema_prompt", "llm", "tool", "chart", "result_handle", "persist"]
+
+_ANSWER_TOKENS = 40
+
+_REGIONS = ["华东", "华南", "华北", "西南", "华中"]
+
+
+# ==================== 合成业务库 ====================
+
+
+def _build_db(db_path: str, rows: int, seed: int) -> None:
+    """示例库（products / employees）+ 合成 sales 表，固定随机种子"""
+    from app.config import settings
+    from app.models.database import init_business_db
+
+    settings.BUSINESS_DB_PATH = db_path
+    init_business_db()
+
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    existing = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sales").fetchone()[0]
+
+    def generate():
+        for i in range(existing + 1, rows + 1):
+            quantity = rnd.randint(1, 50)
+            yield (
+                i, rnd.randint(1, 8), quantity, round(quantity * rnd.uniform(50, 6000), 2),
+                f"2026-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}", rnd.choice(_REGIONS),
+            )
+
+    conn.executemany("INSERT INTO sales VALUES (?, ?, ?, ?, ?, ?)", generate())
+    conn.commit()
+    conn.close()
+
+
+def _prepare_db(args) -> str:
+    """复用 --db 指定且行数一致的库，否则重新生成"""
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_chat_"), "business.db")
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        count = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+        conn.close()
+        if count == args.rows:
+            return db_path
+        os.remove(db_path)
+    start = time.perf_counter()
+    _build_db(db_path, args.rows, args.seed)
+    print(f"合成业务库: {db_path} sales={args.rows} 行 ({time.perf_counter() - start:.1f}s)")
+    return db_path
+
+
+# ==================== 确定性 LLM 替身 ====================
+
+
+class ChatQwen(BaseChatModel):
+    """
+    确定性 LLM 替身（类名与真实模型一致，sql_agent 按名称识别流式文本事件）
+
+    按对话进度固定回复: 校验 SQL → 执行 SQL → 流式回答 + 图表标记
+    """
+
+    ttft: float = 0.05
+    token_delay: float = 0.002
+
+    @property
+    def _llm_type(self) -> str:
+        return "bench-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _reply(self, messages) -> AIMessage:
+        question = next(m.content for m in reversed(messages) if m.type == "human")
+        sql = SCENARIOS[question]
+        tool_messages = [m for m in messages if m.type == "tool"]
+        if not tool_messages:
+            return AIMessage(content="", tool_calls=[
+                {"name": "sql_db_query_checker", "args": {"query": sql}, "id": "call_check"},
+            ])
+        if tool_messages[-1].name == "sql_db_query_checker":
+            return AIMessage(content="", tool_calls=[
+                {"name": "sql_db_query", "args": {"query": sql}, "id": "call_query"},
+            ])
+        chart = {
+            "type": "bar",
+            "title": question,
+            "option": {"xAxis": {"type": "category"}, "yAxis": {"type": "value"}, "series": []},
+        }
+        text = "根据查询结果，" + "数据显示" * (_ANSWER_TOKENS // 2)
+        return AIMessage(content=f"{text}\n<<CHART_JSON>>{json.dumps(chart, ensure_ascii=False)}<<CHART_JSON>>")
+
+    def _chunks(self, message: AIMessage) -> Iterator[AIMessageChunk]:
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            yield AIMessageChunk(content="", tool_call_chunks=[{
+                "name": call["name"], "args": json.dumps(call["args"], ensure_ascii=False),
+                "id": call["id"], "index": 0,
+            }])
+            return
+        text = message.content
+        step = max(1, len(text) // _ANSWER_TOKENS)
+        for i in range(0, len(text), step):
+            yield AIMessageChunk(content=text[i:i + step])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.ttft)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.ttft)
+        for index, chunk in enumerate(self._chunks(self._reply(messages))):
+            if index:
+                await asyncio.sleep(self.token_delay)
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+
+# ==================== 分阶段计时 ====================
+
+
+class _Recorder:
+    """按请求累计各阶段耗时（请求串行执行，同一时间只有一个当前请求）"""
+
+    def __init__(self):
+        self.current: dict[str, float] | None = None
+        self.samples: list[dict[str, float]] = []
+
+    def add(self, stage: str, seconds: float) -> None:
+        if self.current is not None:
+            self.current[stage] = self.current.get(stage, 0.0) + seconds
+
+    def wrap(self, owner: Any, name: str, stage: str) -> None:
+        """把 owner.name 替换为计时版本（同步 / 异步函数都支持）"""
+        original = getattr(owner, name)
+
+        if inspect.iscoroutinefunction(original):
+            @functools.wraps(original)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    self.add(stage, time.perf_counter() - start)
+        else:
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self.add(stage, time.perf_counter() - start)
+
+        setattr(owner, name, timed)
+
+    def wrap_stream(self, owner: Any, name: str, stage: str) -> None:
+        """计时异步生成器方法（从开始迭代到迭代结束）"""
+        original = getattr(owner, name)
+        recorder = self
+
+        @functools.wraps(original)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                async for item in original(*args, **kwargs):
+                    yield item
+            finally:
+                recorder.add(stage, time.perf_counter() - start)
+
+        setattr(owner, name, timed)
+
+
+def _instrument(recorder: _Recorder) -> None:
+    from app.routers import chat
+    from app.services import chart_service, memory_service, query_pool, result_store, sql_agent
+    from app.services.sql_tools import BusinessQueryTool, LocalQueryCheckerTool
+
+    recorder.wrap(memory_service, "load_memory", "memory_load")
+    recorder.wrap(memory_service, "save_turn", "persist")
+    recorder.wrap(sql_agent, "_select_digest", "schema_prompt")
+    recorder.wrap(sql_agent, "build_system_prompt", "schema_prompt")
+    recorder.wrap_stream(ChatQwen, "_astream", "llm")
+    recorder.wrap(BusinessQueryTool, "_run", "tool")
+    recorder.wrap(LocalQueryCheckerTool, "_run", "tool")
+    recorder.wrap(query_pool, "run_query", "sql")
+    recorder.wrap(chart_service, "extract_chart_config", "chart")
+    recorder.wrap(chat, "strip_chart_marker", "chart")
+    recorder.wrap(result_store, "to_data_event", "result_handle")
+
+
+# ==================== 运行 ====================
+
+
+async def _run_once(recorder: _Recorder, question: str) -> dict[str, float]:
+    from app.routers import chat
+    from app.services import session_service
+
+    # 每个请求一个新会话，上下文长度不随迭代增长
+    session = await session_service.create_session()
+    recorder.current = sample = {}
+    start = time.perf_counter()
+    async for raw in chat._chat_event_generator(session.id, question):
+        event = json.loads(raw)
+        if event["type"] == "text" and "first_token" not in sample:
+            sample["first_token"] = time.perf_counter() - start
+        elif event["type"] == "error":
+            raise RuntimeError(f"{question}: {event['content']}")
+    sample["total"] = time.perf_counter() - start
+    sample["other"] = max(0.0, sample["total"] - sum(sample.get(s, 0.0) for s in _EXCLUSIVE_STAGES))
+    recorder.current = None
+    return sample
+
+
+async def _run(args, recorder: _Recorder) -> None:
+    from app.models.database import close_all_databases, init_all_databases
+
+    await init_all_databases()
+    try:
+        questions = list(SCENARIOS)
+        for _ in range(args.warmup):
+            for question in questions:
+                await _run_once(recorder, question)
+        for _ in range(args.iterations):
+            for question in questions:
+                recorder.samples.append(await _run_once(recorder, question))
+    finally:
+        await close_all_databases()
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """最近秩百分位"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+
+
+def _summarize(samples: list[dict[str, float]]) -> dict[str, dict[str, float]]:
+    summary = {}
+    for stage in STAGES:
+        values = [s.get(stage, 0.0) * 1000 for s in samples]
+        summary[stage] = {
+            "p50": round(_percentile(values, 0.50), 3),
+            "p95": round(_percentile(values, 0.95), 3),
+            "p99": round(_percentile(values, 0.99), 3),
+            "mean": round(sum(values) / len(values), 3),
+        }
+    return summary
+
+
+def _print_summary(summary: dict[str, dict[str, float]], requests: int) -> None:
+    print(f"\n{'stage':<14}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'mean(ms)':>10}   requests={requests}")
+    for stage, stats in summary.items():
+        print(
+            f"{stage:<14}{stats['p50']:>10.2f}{stats['p95']:>10.2f}"
+            f"{stats['p99']:>10.2f}{stats['mean']:>10.2f}"
+        )
+
+
+def _compare(summary: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    """p50 / p95 变慢超过 tolerance 且绝对值超过 min_delta_ms 的阶段"""
+    regressions = []
+    for stage, stats in summary.items():
+        base = baseline.get(stage)
+        if not base:
+            continue
+        for key in ("p50", "p95"):
+            delta = stats[key] - base[key]
+            if delta > min_delta_ms and delta > base[key] * tolerance:
+                regressions.append(
+                    f"{stage} {key}: {base[key]:.2f}ms -> {stats[key]:.2f}ms (+{delta / max(base[key], 1e-9):.0%})"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="sales 表行数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="合成业务库路径（行数一致时复用）")
+    parser.add_argument("--iterations", type=int, default=10, help="每个问题的计时轮数")
+    parser.add_argument("--warmup", type=int, default=1, help="每个问题的预热轮数（不计入统计）")
+    parser.add_argument("--ttft", type=float, default=0.05, help="替身 LLM 每次调用的首 token 延迟（秒）")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="替身 LLM 逐 token 延迟（秒）")
+    parser.add_argument("--query-cache", action="store_true", help="保留 SQL 结果缓存（默认关闭以测量真实执行）")
+    parser.add_argument("--json", help="把本次结果写入该文件")
+    parser.add_argument("--baseline", help="与之前 --json 保存的结果对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对变慢比例")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="忽略小于该值的绝对变化")
+    args = parser.parse_args()
+
+    from app.config import settings
+
+    db_path = _prepare_db(args)
+    settings.BUSINESS_DB_PATH = db_path
+    settings.SESSION_DB_PATH = os.path.join(
+        tempfile.mkdtemp(prefix="bench_chat_session_"), f"session-{uuid.uuid4().hex[:8]}.db"
+    )
+    settings.ANSWER_CACHE_ENABLED = False
+    if not args.query_cache:
+        settings.QUERY_CACHE_SIZE = 0
+
+    from app.services import sql_agent
+
+    llm = ChatQwen(ttft=args.ttft, token_delay=args.token_delay)
+    sql_agent.get_llm = lambda streaming=False: llm
+    sql_agent.reset_agent()
+
+    recorder = _Recorder()
+    _instrument(recorder)
+    asyncio.run(_run(args, recorder))
+
+    summary = _summarize(recorder.samples)
+    _print_summary(summary, len(recorder.samples))
+
+    if args.json:
+        config = {
+            "rows": args.rows, "seed": args.seed, "iterations": args.iterations,
+            "ttft": args.ttft, "token_delay": args.token_delay, "query_cache": args.query_cache,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "stages": summary}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+        regressions = _compare(summary, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\n性能回退:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n与基线相比没有超出容差的回退")
+
+
+if __name__ == "__main__":
+    main()
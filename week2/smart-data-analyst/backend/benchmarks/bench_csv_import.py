@@ -0,0 +1,103 @@
+"""
+CSV 导入基准: 整文件读入 + 逐行 execute vs 流式解码 + 分批 executemany
+
+生成一个合成 CSV，分别用旧实现和 import_service.ingest_csv 导入到临时库，
+报告耗时、吞吐 (rows/s) 与 Python 堆内存峰值 (tracemalloc)。
+
+用法 (在 backend 目录下):
+    python -m benchmarks.bench_csv_import --rows 500000
+"""
+
+import argparse
+import csv
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+
+def _write_csv(path: str, rows: int) -> None:
+    regions = ["华东", "华南", "华北", "西南"]
+    rnd = random.Random(42)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "product_id", "quantity", "total_amount", "sale_date", "region"])
+        for i in range(1, rows + 1):
+            qty = rnd.randint(1, 200)
+            writer.writerow([
+                i, rnd.randint(1, 8), qty, round(qty * rnd.uniform(50, 6000), 2),
+                f"2026-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+                rnd.choice(regions),
+            ])
+
+
+def _legacy_import(csv_path: str, db_path: str, table_name: str) -> int:
+    """旧实现: 整文件读入内存，list(DictReader)，逐行 execute"""
+    from app.services.import_service import _infer_type, _cast_value
+
+    with open(csv_path, "rb") as f:
+        content = f.read()
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = content.decode("gbk")
+    rows = list(csv.DictReader(io.StringIO(text)))
+    columns = list(rows[0].keys())
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    col_defs = []
+    for col in columns:
+        sample_vals = [r[col] for r in rows[:10] if r[col]]
+        col_defs.append(f'"{col}" {_infer_type(sample_vals)}')
+    cursor.execute(f'CREATE TABLE "{table_name}" ({", ".join(col_defs)})')
+    placeholders = ", ".join(["?"] * len(columns))
+    col_names = ", ".join([f'"{c}"' for c in columns])
+    insert_sql = f'INSERT INTO "{table_name}" ({col_names}) VALUES ({placeholders})'
+    for row in rows:
+        cursor.execute(insert_sql, [_cast_value(row[col]) for col in columns])
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def _streaming_import(csv_path: str, db_path: str, table_name: str) -> int:
+    from app.services.import_service import ingest_csv
+
+    with open(csv_path, "rb") as f:
+        return ingest_csv(f, table_name, db_path=db_path)["rows_inserted"]
+
+
+def _measure(label: str, fn, csv_path: str, db_path: str) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = fn(csv_path, db_path, f"bench_{label}")
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<10} rows={rows:<9} time={elapsed:7.2f}s "
+        f"throughput={rows / elapsed:10.0f} rows/s peak_mem={peak / 1024 / 1024:8.1f}MB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_csv_")
+    csv_path = os.path.join(tmp_dir, "sales.csv")
+    db_path = os.path.join(tmp_dir, "business.db")
+    _write_csv(csv_path, args.rows)
+    print(f"csv size: {os.path.getsize(csv_path) / 1024 / 1024:.1f}MB")
+
+    _measure("legacy", _legacy_import, csv_path, db_path)
+    _measure("streaming", _streaming_import, csv_path, db_path)
+
+
+if __name__ == "__main__":
+    main()
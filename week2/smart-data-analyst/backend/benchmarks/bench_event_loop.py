@@ -0,0 +1,107 @@
+"""
+事件循环阻塞基准: 并发会话读写期间的事件循环延迟
+
+启动一个心跳任务，每 1ms 醒来一次并记录实际唤醒延迟；同时并发执行
+大量会话/消息读写。对比两种方式:
+- blocking: 在 async 函数里直接做同步 sqlite3 I/O（旧实现的行为）
+- async:    走 AsyncSession 版 session_service
+
+事件循环未被阻塞时，心跳的最大延迟应保持在个位数毫秒。
+
+用法 (在 backend 目录下):
+    python -m benchmarks.bench_event_loop --workers 50 --ops 20
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+
+async def _heartbeat(stop: asyncio.Event, lags: list[float]) -> None:
+    """每 1ms 醒来一次，记录超出预期的唤醒延迟"""
+    interval = 0.001
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def _blocking_worker(db_path: str, session_id: str, ops: int) -> None:
+    """旧行为: async 函数内执行同步 I/O"""
+    for _ in range(ops):
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "INSERT INTO messages (id, session_id, role, content, status) "
+            "VALUES (lower(hex(randomblob(16))), ?, 'user', 'bench', 'complete')",
+            (session_id,),
+        )
+        conn.commit()
+        conn.execute(
+            "SELECT * FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchall()
+        conn.close()
+        await asyncio.sleep(0)
+
+
+async def _async_worker(session_id: str, ops: int) -> None:
+    """新行为: 全程 await AsyncSession"""
+    from app.services import session_service
+
+    for _ in range(ops):
+        await session_service.save_turn(session_service.make_turn(session_id, "bench", "bench"))
+        await session_service.get_messages(session_id)
+
+
+async def _measure(label: str, make_workers) -> None:
+    stop = asyncio.Event()
+    lags: list[float] = []
+    beat = asyncio.create_task(_heartbeat(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*make_workers())
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    print(
+        f"{label:<9} elapsed={elapsed:6.2f}s heartbeats={len(lags):<6} "
+        f"lag p99={p99:7.2f}ms max={max(lags or [0]):7.2f}ms"
+    )
+
+
+async def _run(workers: int, ops: int) -> None:
+    from app.models.database import init_session_db, dispose_session_engine
+    from app.services import session_service
+
+    await init_session_db()
+    session_id = (await session_service.create_session()).id
+    db_path = os.environ["SESSION_DB_PATH"]
+
+    await _measure(
+        "blocking",
+        lambda: [_blocking_worker(db_path, session_id, ops) for _ in range(workers)],
+    )
+    await _measure(
+        "async",
+        lambda: [_async_worker(session_id, ops) for _ in range(workers)],
+    )
+    await dispose_session_engine()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_loop_")
+    os.environ["SESSION_DB_PATH"] = os.path.join(tmp_dir, "session.db")
+    asyncio.run(_run(args.workers, args.ops))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+首条 SQL 耗时基准: 工具探查表结构 vs 系统提示词内嵌结构摘要
+
+对一组问题分别以两种模式调用真实 Agent（需要配置 DASHSCOPE_API_KEY），记录:
+- 从开始流式调用到 Agent 发起第一次 sql_db_query 的耗时 (time-to-first-SQL)
+- 在此之前的工具调用次数（list_tables / schema / checker，每次都是一轮 LLM 往返）
+
+- tools:  SCHEMA_DIGEST_ENABLED=false，Agent 先调用 sql_db_list_tables / sql_db_schema
+- digest: SCHEMA_DIGEST_ENABLED=true，结构摘要直接写在系统提示词里
+
+用法 (在 backend 目录下):
+    python -m benchmarks.bench_first_sql --repeat 3
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from langchain_core.messages import HumanMessage
+
+QUESTIONS = [
+    "各产品的总销售额是多少？",
+    "华东地区销量最高的三个产品是什么？",
+    "每个部门的平均工资是多少？",
+    "2026 年 1 月每天的销售额趋势",
+    "库存低于 200 的产品有哪些？",
+]
+
+
+async def _first_sql(question: str) -> tuple[float | None, int]:
+    """运行一次 Agent，返回 (首条 SQL 耗时, 之前的工具调用次数)"""
+    from app.services.sql_agent import get_agent
+
+    agent = get_agent()
+    start = time.perf_counter()
+    tool_calls = 0
+    async for event in agent.astream_events(
+        {"messages": [HumanMessage(content=question)]}, version="v2"
+    ):
+        if event.get("event") != "on_tool_start":
+            continue
+        if event.get("name") == "sql_db_query":
+            return time.perf_counter() - start, tool_calls
+        tool_calls += 1
+    return None, tool_calls
+
+
+async def _run_mode(label: str, digest: bool, repeat: int) -> None:
+    from app.config import settings
+    from app.services import sql_agent
+
+    settings.SCHEMA_DIGEST_ENABLED = digest
+    sql_agent.reset_agent()
+
+    timings, calls, missing = [], [], 0
+    for _ in range(repeat):
+        for question in QUESTIONS:
+            elapsed, tool_calls = await _first_sql(question)
+            calls.append(tool_calls)
+            if elapsed is None:
+                missing += 1
+            else:
+                timings.append(elapsed)
+
+    if not timings:
+        print(f"{label:<7} 没有任何运行发起 sql_db_query")
+        return
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(
+        f"{label:<7} runs={len(calls):<3} p50={statistics.median(timings):6.2f}s "
+        f"p95={p95:6.2f}s mean={statistics.mean(timings):6.2f}s "
+        f"tool_calls_before_sql={statistics.mean(calls):4.2f} no_sql={missing}"
+    )
+
+
+async def _main(repeat: int) -> None:
+    await _run_mode("tools", False, repeat)
+    await _run_mode("digest", True, repeat)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.models.database import init_business_db
+
+    if not settings.DASHSCOPE_API_KEY:
+        sys.exit("需要设置 DASHSCOPE_API_KEY 才能调用真实 Agent")
+    init_business_db()
+    asyncio.run(_main(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Agent SQL 执行后端基准与进程池恢复检查
+
+- 延迟: 同一批查询分别走 inprocess 与 process 后端，报告 p50 / p95
+- 恢复: process 后端下杀掉工作进程（查询执行中 / 空闲时各一次），
+  确认当次查询返回 memory 错误、之后的查询能在重建的进程池上正常执行，
+  任一步骤超时或失败时以退出码 1 结束
+
+用法 (在 backend 目录下):
+    python -m benchmarks.bench_query_pool --rows 200000 --repeat 20
+"""
+
+import argparse
+import os
+import random
+import signal
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+QUERIES = [
+    "SELECT region, SUM(total_amount) FROM sales GROUP BY region",
+    "SELECT id, quantity, total_amount FROM sales WHERE region = '华南' ORDER BY id DESC LIMIT 500",
+    "SELECT COUNT(*) FROM sales WHERE total_amount > 1000",
+]
+
+# 被杀掉时仍在执行的重查询
+_HEAVY_QUERY = "SELECT COUNT(*) FROM sales a, sales b"
+
+# 单次查询的等待上限（秒），超过视为卡死
+_HANG_TIMEOUT = 20
+
+
+def _build_db(db_path: str, rows: int) -> None:
+    rnd = random.Random(42)
+    regions = ["华东", "华南", "华北", "西南"]
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE sales (id INTEGER PRIMARY KEY, quantity INTEGER, total_amount REAL, region TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO sales VALUES (?, ?, ?, ?)",
+        ((i, rnd.randint(1, 50), round(rnd.uniform(10, 5000), 2), rnd.choice(regions)) for i in range(1, rows + 1)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _bench(label: str, query_pool, repeat: int) -> None:
+    timings = []
+    for _ in range(repeat):
+        for sql in QUERIES:
+            start = time.perf_counter()
+            query_pool.run_query(sql)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<10} p50={statistics.median(timings) * 1000:8.2f}ms p95={p95 * 1000:8.2f}ms")
+
+
+def _run_with_deadline(query_pool, sql: str) -> tuple[str, object]:
+    """在线程中执行查询，返回 ("ok", rows) / ("error", code) / ("hung", None)"""
+    from app.services.query_executor import QueryError
+
+    outcome: list = []
+
+    def target():
+        try:
+            outcome.append(("ok", query_pool.run_query(sql)["rows"]))
+        except QueryError as e:
+            outcome.append(("error", e.code))
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(_HANG_TIMEOUT)
+    return outcome[0] if outcome else ("hung", None)
+
+
+def _kill_workers(query_pool) -> None:
+    for pid in list(query_pool._executor._processes):
+        os.kill(pid, signal.SIGKILL)
+
+
+def _check_recovery(query_pool) -> bool:
+    """杀掉工作进程后进程池能否恢复"""
+    ok = True
+    query_pool.run_query("SELECT 1")
+
+    # 查询执行中被杀
+    threading.Timer(0.5, _kill_workers, args=(query_pool,)).start()
+    status, value = _run_with_deadline(query_pool, _HEAVY_QUERY)
+    print(f"执行中被杀: {status} {value}")
+    ok &= (status, value) == ("error", "memory")
+    status, value = _run_with_deadline(query_pool, "SELECT 2")
+    print(f"  之后的查询: {status} {value}")
+    ok &= (status, value) == ("ok", [[2]])
+
+    # 空闲时被杀（下一次提交时才发现进程池已损坏）
+    _kill_workers(query_pool)
+    time.sleep(0.5)
+    for n in (3, 4):
+        status, value = _run_with_deadline(query_pool, f"SELECT {n}")
+        print(f"空闲时被杀后的查询: {status} {value}")
+        ok &= (status, value) == ("ok", [[n]])
+
+    print(f"pool_restarts={query_pool.get_stats()['pool_restarts']}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.services import query_pool
+
+    settings.BUSINESS_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_pool_"), "business.db")
+    _build_db(settings.BUSINESS_DB_PATH, args.rows)
+    settings.SQL_WORKERS = args.workers
+
+    settings.SQL_EXECUTION_BACKEND = "inprocess"
+    _bench("inprocess", query_pool, args.repeat)
+
+    settings.SQL_EXECUTION_BACKEND = "process"
+    query_pool.start()
+    try:
+        query_pool.run_query("SELECT 1")
+        _bench("process", query_pool, args.repeat)
+        print()
+        recovered = _check_recovery(query_pool)
+    finally:
+        query_pool.shutdown()
+
+    print("进程池恢复检查: " + ("通过" if recovered else "失败"))
+    if not recovered:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
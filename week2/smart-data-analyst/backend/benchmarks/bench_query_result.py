@@ -0,0 +1,144 @@
+"""
+查询结果解析基准: str(rows) + ast.literal_eval + 正则取列名 vs 结构化结果
+
+构造一个合成业务库，对同一条 SQL 分别走旧路径（SQLDatabase 返回 repr 文本，
+再用 ast.literal_eval 解析、从 SQL 中猜列名）与 query_executor.run_query，
+报告 10k 行结果的平均耗时与 Python 堆内存峰值 (tracemalloc)。
+
+用法 (在 backend 目录下):
+    python -m benchmarks.bench_query_result --rows 10000
+"""
+
+import argparse
+import ast
+import os
+import random
+import re
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+_SQL = (
+    "SELECT s.id, p.name AS product, s.quantity, s.total_amount, s.sale_date, s.region "
+    "FROM sales s JOIN products p ON p.id = s.product_id ORDER BY s.id"
+)
+
+
+def _build_db(db_path: str, rows: int) -> None:
+    regions = ["华东", "华南", "华北", "西南"]
+    rnd = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany(
+        "INSERT INTO products VALUES (?, ?)",
+        [(i, f"商品{i}") for i in range(1, 9)],
+    )
+    conn.execute(
+        "CREATE TABLE sales (id INTEGER PRIMARY KEY, product_id INTEGER, quantity INTEGER, "
+        "total_amount REAL, sale_date TEXT, region TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO sales VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (
+                i, rnd.randint(1, 8), rnd.randint(1, 200), round(rnd.uniform(50, 60000), 2),
+                f"2026-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+                rnd.choice(regions),
+            )
+            for i in range(1, rows + 1)
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _legacy_columns(sql: str) -> list[str] | None:
+    """旧实现的列名提取（正则截取 SELECT ... FROM 并按逗号切分）"""
+    m = re.search(r"SELECT\s+(.+?)\s+FROM", sql, re.IGNORECASE | re.DOTALL)
+    if not m or m.group(1).strip() == "*":
+        return None
+    columns, depth, current = [], 0, ""
+    for ch in m.group(1):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            columns.append(current.strip())
+            current = ""
+            continue
+        current += ch
+    columns.append(current.strip())
+    result = []
+    for col in columns:
+        alias = re.search(r'\bAS\s+["\']?(\w+)["\']?\s*$', col, re.IGNORECASE)
+        result.append(alias.group(1) if alias else col.split(".")[-1].strip("\"'`"))
+    return result
+
+
+def _legacy(db_path: str) -> dict:
+    """旧路径: 工具返回 str(list[tuple])，事件流再 literal_eval 回来"""
+    conn = sqlite3.connect(db_path)
+    raw = str(conn.execute(_SQL).fetchall())
+    conn.close()
+
+    parsed = ast.literal_eval(raw.strip())
+    columns = _legacy_columns(_SQL) or [f"col_{i}" for i in range(len(parsed[0]))]
+    return {"columns": columns, "rows": [list(row) for row in parsed], "sql": _SQL}
+
+
+def _structured(db_path: str) -> dict:
+    from app.services import query_executor
+
+    # 与旧路径一样需要生成给 LLM 的文本
+    result = query_executor.run_query(_SQL)
+    query_executor.format_for_llm(result)
+    return result
+
+
+def _measure(label: str, fn, db_path: str, repeat: int) -> dict:
+    fn(db_path)  # 预热
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(db_path)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(db_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{label:<11} rows={len(result['rows']):<7} "
+        f"mean={statistics.mean(timings) * 1000:8.1f}ms "
+        f"min={min(timings) * 1000:8.1f}ms peak_mem={peak / 1024 / 1024:6.1f}MB"
+    )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_query_")
+    db_path = os.path.join(tmp_dir, "business.db")
+    _build_db(db_path, args.rows)
+
+    from app.config import settings
+
+    settings.BUSINESS_DB_PATH = db_path
+
+    legacy = _measure("legacy", _legacy, db_path, args.repeat)
+    structured = _measure("structured", _structured, db_path, args.repeat)
+    assert legacy["rows"] == structured["rows"]
+    print(f"columns (legacy):     {legacy['columns']}")
+    print(f"columns (structured): {structured['columns']} {structured['column_types']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+会话数据库微基准: 每次调用新建引擎 vs 进程级连接池
+
+模拟一轮聊天的数据库访问 (get_session + load_memory + save_turn 三次写入)，
+分别统计两种方式下的单轮延迟。
+
+用法 (在 backend 目录下):
+    python -m benchmarks.bench_session_db --turns 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def _setup_env() -> str:
+    """使用临时会话库，避免污染真实数据"""
+    tmp_dir = tempfile.mkdtemp(prefix="bench_session_")
+    db_path = os.path.join(tmp_dir, "session.db")
+    os.environ["SESSION_DB_PATH"] = db_path
+    return db_path
+
+
+def _legacy_session_factory(db_path: str):
+    """旧实现: 每次调用都 create_engine + 注册监听器 + 新建 sessionmaker"""
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+
+    engine = create_engine(f"sqlite:///{db_path}", echo=False)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    return sessionmaker(bind=engine)
+
+
+def _legacy_turn(db_path: str, session_id: str) -> None:
+    """旧实现下的一轮聊天: 1 次读会话 + 1 次读历史 + 2 次写消息 + 1 次更新标题"""
+    from app.models.database import SessionModel, MessageModel
+
+    def make_db():
+        return _legacy_session_factory(db_path)()
+
+    db = make_db()
+    try:
+        db.query(SessionModel).filter(SessionModel.id == session_id).first()
+    finally:
+        db.close()
+
+    db = make_db()
+    try:
+        db.query(MessageModel).filter(MessageModel.session_id == session_id).all()
+    finally:
+        db.close()
+
+    for role in ("user", "assistant"):
+        db = make_db()
+        try:
+            db.add(MessageModel(session_id=session_id, role=role, content="bench"))
+            db.commit()
+        finally:
+            db.close()
+
+    db = make_db()
+    try:
+        session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+        if session:
+            session.title = "bench"
+            db.commit()
+    finally:
+        db.close()
+
+
+async def _pooled_turn(session_id: str) -> None:
+    """当前实现下的一轮聊天（走 session_service / memory_service）"""
+    from app.services import session_service, memory_service
+
+    await session_service.get_session(session_id)
+    await memory_service.load_memory(session_id)
+    await memory_service.save_turn(session_id, "bench", "bench")
+
+
+def _report(label: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<10} turns={len(latencies):<5} "
+        f"mean={statistics.mean(latencies):7.2f}ms "
+        f"p50={statistics.median(latencies):7.2f}ms p95={p95:7.2f}ms"
+    )
+
+
+async def _run(db_path: str, turns: int) -> None:
+    from app.models.database import init_session_db, dispose_session_engine
+    from app.services import session_service
+
+    await init_session_db()
+    session_id = (await session_service.create_session()).id
+
+    # 两种方式使用不同会话，避免历史长度不同影响对比
+    legacy_session_id = (await session_service.create_session()).id
+    before = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        _legacy_turn(db_path, legacy_session_id)
+        before.append((time.perf_counter() - start) * 1000)
+
+    after = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        await _pooled_turn(session_id)
+        after.append((time.perf_counter() - start) * 1000)
+
+    await dispose_session_engine()
+
+    _report("per-call", before)
+    _report("pooled", after)
+    print(f"speedup    x{statistics.mean(before) / statistics.mean(after):.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    db_path = _setup_env()
+    asyncio.run(_run(db_path, args.turns))
+
+
+if __name__ == "__main__":
+    main()
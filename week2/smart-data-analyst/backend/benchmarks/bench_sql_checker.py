@@ -0,0 +1,128 @@
+"""
+SQL 校验基准: SQLDatabaseToolkit 的 LLM 校验 vs 本地 EXPLAIN 校验
+
+Agent 每个问题至少调用一次 sql_db_query_checker（SQL 出错改写后会再调用），
+LLM 校验每次都是一轮模型往返；本地校验只在只读连接上编译语句。
+
+- local: sql_checker.check_query，不需要网络
+- llm:   QuerySQLCheckerTool（需要配置 DASHSCOPE_API_KEY，传 --llm 时运行）
+
+每题校验次数通过实际运行 Agent 统计（sql_agent 的 avg_checker_calls_per_run）:
+默认使用 bench_chat_stages 的确定性 LLM 替身（固定流程，只验证统计链路），
+传 --llm 时用真实模型回答同一批问题。输出每题节省的 LLM 调用数与秒数。
+
+用法 (在 backend 目录下):
+    python -m benchmarks.bench_sql_checker --repeat 20
+    python -m benchmarks.bench_sql_checker --llm --repeat 3
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+# 示例业务库上的典型查询（含 Agent 常见的列名/表名错误）
+QUERIES = [
+    "SELECT p.name, SUM(s.total_amount) AS total FROM sales s "
+    "JOIN products p ON s.product_id = p.id GROUP BY p.name ORDER BY total DESC LIMIT 10",
+    "SELECT region, SUM(total_amount) FROM sales GROUP BY region",
+    "SELECT department, AVG(salary) FROM employees GROUP BY department",
+    "SELECT sale_date, SUM(total_amount) FROM sales GROUP BY sale_date ORDER BY sale_date",
+    "SELECT region, SUM(amount) FROM sales GROUP BY region",
+    "SELECT name FROM product WHERE stock < 200",
+]
+
+
+def _time_calls(check, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            start = time.perf_counter()
+            check(query)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _report(label: str, timings: list[float]) -> float:
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    mean = statistics.mean(timings)
+    print(
+        f"{label:<6} calls={len(timings):<4} p50={statistics.median(timings) * 1000:9.2f}ms "
+        f"p95={p95 * 1000:9.2f}ms mean={mean * 1000:9.2f}ms"
+    )
+    return mean
+
+
+async def _run_questions(questions: list[str]) -> None:
+    from langchain_core.messages import HumanMessage
+
+    from app.services import sql_agent
+
+    for question in questions:
+        await sql_agent.run_agent([HumanMessage(content=question)])
+
+
+def _checks_per_question(use_llm: bool) -> float:
+    """运行 Agent 回答一批问题，返回每题调用 sql_db_query_checker 的平均次数"""
+    from app.services import sql_agent
+    from benchmarks.bench_chat_stages import SCENARIOS, ChatQwen
+
+    if not use_llm:
+        stand_in = ChatQwen()
+        sql_agent.get_llm = lambda streaming=False: stand_in
+    sql_agent.reset_agent()
+    asyncio.run(_run_questions(list(SCENARIOS)))
+    return sql_agent.get_stats()["avg_checker_calls_per_run"] or 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--llm", action="store_true", help="同时测量 LLM 校验（需要 API Key）")
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.models.database import init_business_db
+    from app.services import sql_checker
+
+    init_business_db()
+
+    print("本地校验结果:")
+    for query in QUERIES:
+        result = sql_checker.check_query(query)
+        print(f"  {'OK ' if result['ok'] else 'ERR'} {query[:60]}")
+        if not result["ok"]:
+            print(f"      {sql_checker.format_for_llm(result).replace(chr(10), ' | ')}")
+    print()
+
+    local_mean = _report("local", _time_calls(sql_checker.check_query, args.repeat))
+
+    if args.llm and not settings.DASHSCOPE_API_KEY:
+        sys.exit("需要设置 DASHSCOPE_API_KEY 才能测量 LLM 校验")
+
+    settings.SQL_CHECKER_LOCAL = True
+    checks = _checks_per_question(args.llm)
+    source = "真实模型" if args.llm else "LLM 替身"
+    print(f"\n每题校验次数 {checks:.2f}（{source}运行 Agent 实测）")
+
+    if not args.llm:
+        print(f"每题节省 LLM 调用 {checks:.2f} 次（LLM 校验耗时需 --llm 实测）")
+        return
+
+    from langchain_community.tools.sql_database.tool import QuerySQLCheckerTool
+    from langchain_community.utilities import SQLDatabase
+
+    from app.services.llm_service import get_llm
+
+    db = SQLDatabase.from_uri(f"sqlite:///{settings.BUSINESS_DB_PATH}")
+    tool = QuerySQLCheckerTool(db=db, llm=get_llm(streaming=False))
+    llm_mean = _report("llm", _time_calls(tool.invoke, args.repeat))
+
+    saved = (llm_mean - local_mean) * checks
+    print(f"\n每题节省 LLM 调用 {checks:.2f} 次，节省 {saved:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
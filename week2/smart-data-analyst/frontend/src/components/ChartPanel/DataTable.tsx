@@ -1,5 +1,10 @@
-import { Table2 } from 'lucide-react'
+import { useState } from 'react'
+import { Loader2, Table2 } from 'lucide-react'
 import type { VisualItem } from '../../types'
+import { fetchResultPage } from '../../services/api'
+
+// 每次"加载更多"拉取的行数
+const PAGE_SIZE = 100
 
 interface Props {
   item: VisualItem
@@ -8,6 +13,12 @@ interface Props {
 export default function DataTable({ item }: Props) {
   const data = item.queryData
 
+  // 首页之后通过结果句柄追加的行（每个 VisualItem 的 queryData 创建后不再变化）
+  const [extraRows, setExtraRows] = useState<(string | number | null)[][]>([])
+  const [hasMore, setHasMore] = useState(() => !!data?.has_more && !!data?.result_id)
+  const [loading, setLoading] = useState(false)
+  const [error, setError] = useState<string | null>(null)
+
   if (!data || data.rows.length === 0) {
     return (
       <div className="bg-white rounded-lg border border-slate-200 overflow-hidden shadow-sm">
@@ -23,12 +34,34 @@ export default function DataTable({ item }: Props) {
     )
   }
 
+  const rows = extraRows.length > 0 ? [...data.rows, ...extraRows] : data.rows
+  const total = data.row_count ?? rows.length
+
+  const handleLoadMore = async () => {
+    if (!data.result_id || loading) return
+    setLoading(true)
+    setError(null)
+    try {
+      const page = await fetchResultPage(data.result_id, rows.length, PAGE_SIZE)
+      setExtraRows((prev) => [...prev, ...page.rows])
+      setHasMore(!!page.has_more)
+    } catch {
+      // 结果句柄过期（服务端只保留一段时间）后无法继续分页
+      setError('加载失败，查询结果可能已过期，请重新提问')
+      setHasMore(false)
+    } finally {
+      setLoading(false)
+    }
+  }
+
   return (
     <div className="bg-white rounded-lg border border-slate-200 overflow-hidden shadow-sm">
       {/* 标题 */}
       <div className="px-3 py-2 border-b border-slate-100 flex items-center justify-between">
         <h3 className="text-sm font-medium text-slate-700">{item.title}</h3>
-        <span className="text-xs text-slate-400">{data.rows.length} 行</span>
+        <span className="text-xs text-slate-400">
+          {rows.length < total ? `${rows.length} / ${total} 行` : `${rows.length} 行`}
+        </span>
       </div>
 
       {/* 表格 */}
@@ -50,7 +83,7 @@ export default function DataTable({ item }: Props) {
             </tr>
           </thead>
           <tbody>
-            {data.rows.map((row, rowIdx) => (
+            {rows.map((row, rowIdx) => (
               <tr
                 key={rowIdx}
                 className={`${rowIdx % 2 === 0 ? 'bg-white' : 'bg-slate-50/50'} hover:bg-indigo-50/30 transition-colors`}
@@ -71,6 +104,24 @@ export default function DataTable({ item }: Props) {
           </tbody>
         </table>
       </div>
+
+      {/* 加载更多 */}
+      {(hasMore || error) && (
+        <div className="px-3 py-2 border-t border-slate-100 flex items-center justify-center">
+          {error ? (
+            <span className="text-xs text-slate-400">{error}</span>
+          ) : (
+            <button
+              onClick={handleLoadMore}
+              disabled={loading}
+              className="flex items-center gap-1 px-2 py-1 rounded-md text-xs text-indigo-600 hover:bg-indigo-50 transition-all cursor-pointer disabled:cursor-not-allowed disabled:opacity-60"
+            >
+              {loading && <Loader2 size={12} className="animate-spin" />}
+              {loading ? '加载中...' : `加载更多（剩余 ${total - rows.length} 行）`}
+            </button>
+          )}
+        </div>
+      )}
     </div>
   )
 }
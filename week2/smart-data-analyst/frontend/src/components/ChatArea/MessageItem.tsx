@@ -66,6 +66,11 @@ export default function MessageItem({ message }: Props) {
         {/* SQL 代码块 */}
         {message.sql_query && <SqlBlock sql={message.sql_query} />}
 
+        {/* 回答被中断（生成过程中断开了连接） */}
+        {message.status === 'cancelled' && (
+          <div className="mt-1.5 text-xs text-slate-400">回答已中断</div>
+        )}
+
         {/* 图表指示 */}
         {message.chart_config && (
           <div className="flex items-center gap-1 mt-1.5 text-xs text-indigo-500">
@@ -3,7 +3,7 @@
  * 对接后端真实接口，字段与后端 snake_case 保持一致
  */
 
-import type { Session, Message, ChartConfig, SSEEvent, TableInfo } from '../types'
+import type { Session, Message, ChartConfig, SSEEvent, TableInfo, QueryData } from '../types'
 import { fetchEventSource } from '@microsoft/fetch-event-source'
 
 const API_BASE = '/api'
@@ -166,6 +166,28 @@ export async function uploadCSV(
   return resp.json()
 }
 
+// ========== 查询结果 ==========
+
+/**
+ * 拉取查询结果的一页（可按列排序）
+ * GET /api/results/{result_id}?offset=0&limit=100&sort_by=col&order=asc
+ */
+export async function fetchResultPage(
+  resultId: string,
+  offset = 0,
+  limit = 100,
+  sortBy?: string,
+  order: 'asc' | 'desc' = 'asc'
+): Promise<QueryData> {
+  const params = new URLSearchParams({ offset: String(offset), limit: String(limit), order })
+  if (sortBy) {
+    params.append('sort_by', sortBy)
+  }
+  const resp = await fetch(`${API_BASE}/results/${resultId}?${params}`)
+  if (!resp.ok) throw new Error('获取查询结果失败')
+  return resp.json()
+}
+
 // ========== 工具函数 ==========
 
 /**
@@ -20,6 +20,7 @@ export interface Message {
   content: string
   sql_query?: string | null
   chart_config?: string | null
+  status?: 'complete' | 'cancelled'   // cancelled: 生成过程中断开，只保存了部分回答
   created_at: string
 }
 
@@ -44,6 +45,12 @@ export interface QueryData {
   columns: string[]
   rows: (string | number | null)[][]
   sql: string
+  column_types?: string[]
+  row_count?: number      // 完整结果行数（rows 只是首页）
+  result_id?: string      // 服务端结果句柄，用于拉取后续分页
+  offset?: number
+  has_more?: boolean
+  truncated?: boolean     // 超过服务端行数上限，只保留了前 SQL_MAX_ROWS 行
 }
 
 /**